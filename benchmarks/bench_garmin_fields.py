@@ -0,0 +1,102 @@
+'''
+Benchmark Garmin record decoding (gar._walkRecords) with the full record
+body against the PING-Mapper field projection (fields='pingmapper') and the
+fields the ping table always needs (fields=[]), on a synthetic RSD with
+sidescan beam info on half the pings.
+
+    python benchmarks/bench_garmin_fields.py --pings 50000
+
+Only the record walk is timed, as unit conversion and CSV export do not
+depend on the projection. Projected rows are checked against the matching
+columns of the full decode.
+'''
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pingverter.garmin_class import gar
+
+# Records are built by the test suite's synthetic RSD writer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+from synthetic import _garmin_record
+
+
+def make_rsd(path: str, pings: int, seed: int=0):
+    '''
+    Sonar records only, the file header is not needed to walk them.
+    '''
+
+    rng = np.random.default_rng(seed)
+    magic = gar(path).magicNum
+    with open(path, 'wb') as f:
+        for k in range(pings):
+            seq = k // 4
+            f.write(_garmin_record(rng, magic, seq, seq * 25, k % 4, 2, 417566037 + seq * 50, -954437177 + seq * 40)[0])
+
+
+def walk(path: str, fields):
+    sonObj = gar(path, fields=fields)
+    sonObj.file_len = os.path.getsize(path)
+    sonObj.parse_stats = {}
+
+    buf = memoryview(np.memmap(path, dtype=np.uint8, mode='r'))
+    # Rows kept from earlier runs would slow down the garbage collector
+    gc.disable()
+    start = time.perf_counter()
+    rows, _ = sonObj._walkRecords(buf, 0, sonObj.file_len)
+    secs = time.perf_counter() - start
+    gc.enable()
+    del buf
+
+    return rows, secs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pings', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.RSD')
+        make_rsd(path, args.pings)
+        mb = os.path.getsize(path) / 1e6
+
+        # Runs are interleaved so drift in machine load affects each alike
+        best = {}
+        for _ in range(args.repeat):
+            for fields in [None, 'pingmapper', []]:
+                rows, secs = walk(path, fields)
+                key = str(fields)
+                if key not in best or secs < best[key][1]:
+                    best[key] = (rows, secs)
+
+        full, full_secs = best['None']
+        proj, proj_secs = best['pingmapper']
+        req, req_secs = best['[]']
+
+    assert len(full) == len(proj), 'projection changed the number of pings'
+    for f, p, r in zip(full, proj, req):
+        assert p == {k: f[k] for k in p}, 'projected values differ from the full decode'
+        assert r == {k: f[k] for k in r}, 'required values differ from the full decode'
+
+    print('full decode: {} pings ({:.0f} MB) in {:.3f} s, {} columns'.format(
+        len(full), mb, full_secs, len(set().union(*full))))
+    print('pingmapper:  {} pings in {:.3f} s, {} columns (identical values)'.format(
+        len(proj), proj_secs, len(set().union(*proj))))
+    print('required:    {} pings in {:.3f} s, {} columns'.format(
+        len(req), req_secs, len(set().union(*req))))
+
+    for name, secs in [('pingmapper', proj_secs), ('required', req_secs)]:
+        print('{:<12} saves {:.0f}% of the record walk ({:.2f} us per ping)'.format(
+            name + ':', 100 * (1 - secs / max(full_secs, 1e-9)), 1e6 * (full_secs - secs) / max(len(full), 1)))
+
+
+if __name__ == '__main__':
+    main()
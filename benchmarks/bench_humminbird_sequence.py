@@ -0,0 +1,134 @@
+'''
+Benchmark Humminbird SonarDataPlayer frame clustering
+(converter._humminbird_sequence_from_time) against the previous
+row-by-row implementation, on a synthetic multi-beam recording.
+
+    python benchmarks/bench_humminbird_sequence.py --rows 1000000 --beams 4
+
+The reference implementation indexes pandas once per ping and is slow, so
+it is only run on the first --ref-rows rows, and its time is also
+extrapolated to the full table.
+'''
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pingverter.converter import _humminbird_sequence_from_time
+
+
+def _reference_sequence_from_time(df: pd.DataFrame):
+    times = pd.to_numeric(df.get('time_s'), errors='coerce')
+    if times is None or times.notna().sum() == 0:
+        return pd.Series(np.arange(len(df)), index=df.index, dtype='int64')
+
+    # Estimate ping period from within-channel deltas when available.
+    period_candidates = []
+    if 'channel_id' in df.columns:
+        for _, g in df.groupby('channel_id'):
+            t = pd.to_numeric(g.get('time_s'), errors='coerce').dropna().sort_values()
+            if len(t) < 2:
+                continue
+            dt = np.diff(t.to_numpy())
+            dt = dt[dt > 0]
+            if len(dt) > 0:
+                period_candidates.append(float(np.median(dt)))
+
+    if period_candidates:
+        period = float(np.median(period_candidates))
+    else:
+        all_t = np.sort(times.dropna().to_numpy())
+        if len(all_t) < 2:
+            return pd.Series(np.arange(len(df)), index=df.index, dtype='int64')
+        dt_all = np.diff(all_t)
+        dt_all = dt_all[dt_all > 0]
+        if len(dt_all) == 0:
+            return pd.Series(np.arange(len(df)), index=df.index, dtype='int64')
+        period = float(np.percentile(dt_all, 75))
+
+    # Keep threshold above timestamp jitter but well below ping period.
+    threshold = max(0.003, period * 0.2)
+
+    # Stable sort by time, then by record_num when present.
+    work = pd.DataFrame(index=df.index)
+    work['_time'] = times
+    if 'record_num' in df.columns:
+        work['_rn'] = pd.to_numeric(df['record_num'], errors='coerce')
+    else:
+        work['_rn'] = np.arange(len(df))
+    order = work.sort_values(['_time', '_rn'], na_position='last', kind='mergesort').index
+
+    seq = pd.Series(index=df.index, dtype='float64')
+    current_seq = -1
+    prev_time = None
+    for idx in order:
+        t = times.loc[idx]
+        if not np.isfinite(t):
+            continue
+        if prev_time is None or (t - prev_time) > threshold:
+            current_seq += 1
+        seq.loc[idx] = current_seq
+        prev_time = t
+
+    # Fill any NaN sequence ids deterministically.
+    if seq.notna().any():
+        fill_value = int(seq.dropna().max()) + 1
+    else:
+        fill_value = 0
+    seq = seq.fillna(fill_value).astype('int64')
+    return seq
+
+
+
+def make_recording(rows: int, beams: int, seed: int=0):
+    '''
+    Interleaved beams pinging every ~60 ms with a few ms of jitter between
+    beams of the same ping, plus a few missing times.
+    '''
+
+    rng = np.random.default_rng(seed)
+    pings = rows // beams
+
+    t = np.cumsum(rng.uniform(0.05, 0.07, pings))
+    time_s = (t[:, None] + rng.uniform(0, 0.002, (pings, beams))).ravel()
+    time_s[rng.choice(len(time_s), max(len(time_s) // 10000, 1), replace=False)] = np.nan
+
+    return pd.DataFrame({
+        'time_s': time_s,
+        'channel_id': np.tile(np.arange(beams), pings),
+        'record_num': np.arange(len(time_s)),
+    })
+
+
+def timed(func, df: pd.DataFrame):
+    start = time.perf_counter()
+    out = func(df)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--beams', type=int, default=4)
+    parser.add_argument('--ref-rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    df = make_recording(args.rows, args.beams)
+
+    seq, secs = timed(_humminbird_sequence_from_time, df)
+    print('vectorized: {} rows in {:.3f} s ({} frames)'.format(len(df), secs, seq.max() + 1))
+
+    sub = df.iloc[:args.ref_rows]
+    ref, ref_secs = timed(_reference_sequence_from_time, sub)
+    new, new_secs = timed(_humminbird_sequence_from_time, sub)
+    assert ref.equals(new), 'sequence ids differ from the reference implementation'
+
+    print('reference:  {} rows in {:.3f} s (vectorized {:.3f} s, identical ids)'.format(len(sub), ref_secs, new_secs))
+    print('speedup:    {:.0f}x, reference on {} rows ~{:.0f} s'.format(
+        ref_secs / max(new_secs, 1e-9), len(df), ref_secs * len(df) / max(len(sub), 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,5 +6,5 @@ from .garmin_class import gar
 from .cerulean_class import cerul
 from .jsf_class import jsf
 from .xtf_class import xtf
-from .converter import hum2pingmapper, low2pingmapper, low2hum, cerul2pingmapper, gar2pingmapper, jsf2pingmapper, xtf2pingmapper, export_sonar_data_player_project, SUPPORTED_SONAR_EXTENSIONS
+from .converter import hum2pingmapper, low2pingmapper, lowSession2pingmapper, low2hum, cerul2pingmapper, gar2pingmapper, jsf2pingmapper, xtf2pingmapper, export_sonar_data_player_project, SUPPORTED_SONAR_EXTENSIONS
 from .version import __version__
@@ -47,6 +47,7 @@ import time
 import numpy as np
 import pandas as pd
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from joblib import Parallel, delayed, cpu_count
 
@@ -58,15 +59,40 @@ def _identity_transform(lon, lat):
 # Humminbird to PINGMapper
 # =========================================================
 
-def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False):
+def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                   keepCaltime: bool=False, n_jobs: int=None, backend: str='threading', parallel: Parallel=None,
+                   keepPings: bool=False, writeCSV: bool=True, headCheck: str='report'):
     '''
-    
+    keepCaltime : export ping times as a single datetime64 'caltime' column
+    instead of 'date' and 'time' columns.
+
+    n_jobs : number of beams to parse at once, defaults to one per beam up to
+    the number of cores.
+
+    backend : joblib backend for the beam parse. 'threading' parses the
+    memory-mapped SON files in threads; 'loky' uses processes, which only
+    receive the small parse plan of the recording.
+
+    parallel : an open joblib Parallel to run the beam parse in, to share a
+    bounded pool of workers across many recordings. Overrides n_jobs and
+    backend.
+
+    keepPings : keep each beam's ping table in memory, in
+    humminbird.beamPings keyed by beam (B000, B001, ..).
+
+    writeCSV : save each beam's ping table to its metadata csv. When False,
+    beamMeta[beam]['metaCSV'] is None.
+
+    headCheck : validate every ping header against the header structure.
+    'report' keeps the pings before the first mismatch, 'resync' searches
+    for the next valid header and carries on, 'off' skips the check.
     '''
     # Make sure input exists
     assert os.path.isfile(input), "{} does not exist.".format(input)
 
     # Create the class
-    humminbird = hum(humFile=input, nchunk=nchunk, exportUnknown=exportUnknown)
+    humminbird = hum(humFile=input, nchunk=nchunk, exportUnknown=exportUnknown, keepCaltime=keepCaltime,
+                     headCheck=headCheck)
 
     # Store temperatue
     humminbird.tempC = float(tempC)/10
@@ -128,9 +154,9 @@ def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
         beamMeta[chan]['beam'] = chan
         beamMeta[chan]['sonFile'] = file
 
-        # Output csv name
+        # Output csv name, None when the csv is not written
         csv = '{}_{}_{}'.format(chan, beamMeta[chan]['beamName'], 'meta.csv')
-        beamMeta[chan]['metaCSV'] = os.path.join(metaDir, csv)
+        beamMeta[chan]['metaCSV'] = os.path.join(metaDir, csv) if writeCSV else None
 
 
     ##############################################################
@@ -147,8 +173,8 @@ def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
         # Get SON file
         son = meta['sonFile']
 
-        # Count headbytes
-        headbytes = humminbird._cntHead(son)
+        # Look up header structure from the first ping header
+        headbytes = humminbird._lookupHeadStruct(son)
 
         if headbytes > 0: # Header length found
             print("Header Length: {}".format(headbytes))
@@ -157,61 +183,34 @@ def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
             # Add headbytes to humminbird object
             humminbird.frame_header_size = headbytes
 
-            auto_decode = False
-
             break
 
-        else:
-            auto_decode = True
-
-            gotHeader = False
-
-    
-    # Consider adding decodeHeadStruct() function back into PINGVerter....
-    if not gotHeader:
-        # sys.exit("\n#####\nERROR: Out of SON files... \n"+
-        #         "Unable to determine header length.")
-        print("\n#####\nERROR: Out of SON files... \n\n"+
-                "Trying to automatically determine header length...")
-        for beam, meta in beamMeta.items():
-        
-            # Get SON file
-            son = meta['sonFile']
-
-            # Autodecode
-            headbytes = humminbird._decodeHeadStruct(son)
-
-            if headbytes > 0:
-                print("\n######################\nSLAMMA-JAMMA-DING-DONG \n"+
-                      "Header Length Determined: {}\n\n".format(headbytes))
-                print("As you were....\n\n")
-                gotHeader = True
-
-                # Add headbytes to humminbird object
-                humminbird.frame_header_size = headbytes
-                break
     if not gotHeader:
         sys.exit("\n#####\nERROR: Out of SON files... \n"+
                 "Unable to automatically decode sonar header.")
-        
-    
-    #############################################
-    # Get the SON header structure and attributes
-    #############################################
-    if not auto_decode:
-        humminbird._getHeadStruct()
 
     ##################
     # Parse son header
     ##################
 
-    r = Parallel(n_jobs = len(beamMeta), verbose=10 )(delayed(humminbird._parsePingHeader)(meta['sonFile'], meta['metaCSV']) for beam, meta in beamMeta.items())
+    # Only the parse plan is sent to workers, not the humminbird object
+    plan = humminbird._getParsePlan()
+
+    if parallel is None:
+        if n_jobs is None:
+            n_jobs = min(len(beamMeta), cpu_count())
+        parallel = Parallel(n_jobs=n_jobs, backend=backend, verbose=10)
+
+    r = parallel(delayed(_parseHumBeam)(plan, meta['sonFile'], meta['metaCSV'], keepPings) for beam, meta in beamMeta.items())
+
+    # Keep ping tables in memory
+    if keepPings:
+        humminbird.beamPings = {beam: pings for beam, (humdat, pings) in zip(beamMeta, r)}
+        r = [humdat for humdat, pings in r]
 
-    # Store spatial transformation
-    for (trans, humdat) in r:
-        humminbird.trans = trans
-        humminbird.humDat = humdat
-        break
+    # Store spatial transformation from the first beam
+    humminbird.humDat = r[0]
+    humminbird._setTrans()
 
     # Save DAT metadata to file (csv)
     outFile = os.path.join(metaDir, 'DAT_meta.csv') # Specify file directory & name
@@ -225,17 +224,53 @@ def hum2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
     return humminbird
 
 
+def _parseHumBeam(plan: dict, in_file: str, out_file: str=None, return_pings: bool=False):
+    '''
+    Parse the ping headers of one Humminbird beam to csv (parallel worker).
+    Returns the DAT metadata updated with the beam's epsg, and the beam's
+    ping table with return_pings.
+    '''
+
+    humminbird = hum(humFile=plan['humFile'], nchunk=plan['nchunk'],
+                     exportUnknown=plan['exportUnknown'], keepCaltime=plan['keepCaltime'],
+                     headCheck=plan['headCheck'])
+
+    humminbird.frame_header_size = plan['frame_header_size']
+    humminbird.headBytes = plan['headBytes']
+    humminbird.son_struct = plan['son_struct']
+    humminbird.pixM = plan['pixM']
+    humminbird.tempC = plan['tempC']
+    humminbird.humDat = dict(plan['humDat'])
+
+    r = humminbird._parsePingHeader(in_file, out_file, return_pings)
+
+    if return_pings:
+        return r[1], r[2]
+
+    return r[1]
+
 # =========================================================
 # Lowrance to PINGMapper
 # =========================================================
 
-def low2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False):
+def low2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                   beams: list=None, resume: bool=False):
+    '''
+    beams : optional list of PING-Mapper beam numbers (0-4) to export. Only
+    frames of the matching Lowrance surveys are read from the log, so
+    record_num and trk_dist count those frames only.
+
+    resume : for logs still being recorded. Parse only frames written since
+    the checkpoint left in out_dir by the previous call and append them to
+    the existing metadata csv's. A partially written last frame is left for
+    the next call.
+    '''
 
     # Make sure input exists
     assert os.path.isfile(input), "{} does not exist.".format(input)
 
     # Create the class
-    lowrance = low(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown)
+    lowrance = low(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown, beams=beams)
 
     # Store temperature
     lowrance.tempC = float(tempC)/10
@@ -258,12 +293,123 @@ def low2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
     # Get Lowrance file length
     lowrance._getFileLen()
 
+    # Load state from the previous parse of a growing log
+    if resume:
+        lowrance._loadCheckpoint()
+
     # Parse file header ***Probably not needed***
     lowrance._parseFileHeader()
 
     # Parse ping headers (attributes) and do conversions
     lowrance._parsePingHeader()
 
+    # Split beams and save ping metadata
+    _lowBeamsToCSV(lowrance, exportUnknown)
+
+    # Store where parsing stopped for the next resume
+    lowrance._saveCheckpoint()
+
+    # Store headBytes
+    lowrance.headBytes = lowrance.frame_header_size
+
+    # Not Humminbird Onix
+    lowrance.isOnix = 0
+    
+    return lowrance
+
+def lowSession2pingmapper(inputs: list, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                          beams: list=None, n_jobs: int=None):
+    '''
+    Convert one survey that the unit split across several consecutive
+    SL2/SL3 logs. Frame headers of each log are decoded in parallel, merged
+    into a single stream by absolute time (each log's hardware time origin
+    plus its time_s) and id, and converted once, so record_num, trk_dist and
+    chunk_id continue across log boundaries. time_s is counted from the
+    start of the first log.
+
+    inputs : list of logs from the same recording (same extension).
+    n_jobs : number of logs to decode at once, defaults to one per log
+    (capped at the cpu count).
+
+    Each ping's source log is stored as file_num, indexing
+    beamMeta[beam]['sonFiles'] (the returned object's sonFiles) and the
+    hardware time origin of each log in beamMeta[beam]['hardware_time_starts'].
+    '''
+
+    # Make sure inputs exist
+    for input in inputs:
+        assert os.path.isfile(input), "{} does not exist.".format(input)
+
+    extensions = set(os.path.basename(i).split('.')[-1].lower() for i in inputs)
+    assert len(extensions) == 1, "Can't merge {} logs into one session.".format(sorted(extensions))
+
+    # Create the class from the first log, holding every log of the session
+    lowrance = low(inFile=inputs[0], nchunk=nchunk, exportUnknown=exportUnknown, beams=beams)
+    lowrance.sonFiles = list(inputs)
+
+    # Store temperature
+    lowrance.tempC = float(tempC)/10
+
+    ######################
+    # Decode Lowrance File
+    ######################
+
+    if not os.path.exists(out_dir):
+        os.mkdir(out_dir)
+
+    # Create 'meta' directory if it doesn't exist
+    metaDir = os.path.join(out_dir, 'meta')
+    try:
+        os.mkdir(metaDir)
+    except:
+        pass
+    lowrance.metaDir = metaDir # Store metadata directory
+
+    # Get Lowrance file length
+    lowrance._getFileLen()
+
+    # Parse file header ***Probably not needed***
+    lowrance._parseFileHeader()
+
+    # Decode raw frame headers of each log in parallel. Only the headers
+    ## are returned, samples stay on disk
+    if n_jobs is None:
+        n_jobs = min(len(inputs), cpu_count())
+    dfs = Parallel(n_jobs=n_jobs, verbose=10)(delayed(_readLowPingHeaders)(input, beams) for input in inputs)
+
+    # Merge logs by time and convert the session as a single stream
+    df = lowrance._mergePingHeaders(dfs)
+    del dfs
+
+    lowrance._convertPingHeaders(df)
+
+    # Split beams and save ping metadata
+    _lowBeamsToCSV(lowrance, exportUnknown)
+
+    # Store headBytes
+    lowrance.headBytes = lowrance.frame_header_size
+
+    # Not Humminbird Onix
+    lowrance.isOnix = 0
+
+    return lowrance
+
+def _readLowPingHeaders(input: str, beams: list=None):
+    '''
+    Decode raw frame headers of one Lowrance log (parallel worker).
+    '''
+
+    lowrance = low(inFile=input, beams=beams)
+    lowrance._getFileLen()
+
+    return lowrance._readPingHeaders()
+
+def _lowBeamsToCSV(lowrance: low, exportUnknown: bool):
+    '''
+    Shared tail of the Lowrance converters: clean up and split the decoded
+    pings into PING-Mapper beams, then save each beam's metadata csv.
+    '''
+
     # Remove unknown beams
     lowrance._removeUnknownBeams()
 
@@ -274,9 +420,9 @@ def low2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
     beams = lowrance.header_dat['beam'].unique()
     if 5 in beams:
         lowrance._splitLowSS()
-        flip_port = True
-    else:
-        flip_port = False
+
+    # Drop beams that were not requested
+    lowrance._removeUnrequestedBeams()
 
     # Recalculate record number
     lowrance._recalcRecordNum()
@@ -291,25 +437,39 @@ def low2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
     # Save ping metadata to csv based on beam
     lowrance._splitBeamsToCSV()
 
-    # Store headBytes
-    lowrance.headBytes = lowrance.frame_header_size
-
-    # Not Humminbird Onix
-    lowrance.isOnix = 0
-    
-    return lowrance
+    return
 
 # =========================================================
 # Garmin to PINGMapper
 # =========================================================
 
-def gar2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False):
+def gar2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                   n_jobs: int=1, parallel: Parallel=None, verify: str='off', fields: list=None,
+                   verify_jobs: int=-1):
+    '''
+    n_jobs : number of byte ranges of the RSD to decode at once. 1 parses
+    the file sequentially, -1 uses one range per core. Each range is synced
+    to the first record at or after its start, and the ping table equals
+    the sequential one.
+
+    parallel : an open joblib Parallel to decode the ranges in, to share a
+    bounded pool of workers across many recordings.
+
+    verify : check record CRCs, 'off', 'sample' or 'full'. Adds a 'crc_ok'
+    column to the ping tables, see gar.
+
+    verify_jobs : number of threads checking CRCs, -1 uses one per core.
+
+    fields : record body columns to decode, or 'pingmapper' for only those
+    PING-Mapper uses. Other body fields are skipped, see gar.
+    '''
 
     # Make sure input exists
     assert os.path.isfile(input), "{} does not exist.".format(input)
 
     # Create the class
-    garmin = gar(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown)
+    garmin = gar(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown, verify=verify,
+                 fields=fields, verify_jobs=verify_jobs)
     
     # Store temperature
     garmin.tempC = float(tempC)/10
@@ -353,7 +513,7 @@ def gar2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
     del outFile
 
     # Parse ping headers (attributes) and do conversions
-    garmin._parsePingHeader()
+    garmin._parsePingHeader(n_jobs, parallel)
 
     # Drop unknown
     if not exportUnknown:
@@ -442,7 +602,12 @@ def cerul2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10,
 # JSF to PINGMapper
 # =========================================================
 
-def jsf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False):
+def jsf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                   n_jobs: int=1, parallel: Parallel=None):
+    '''
+    n_jobs, parallel : decode byte ranges of the JSF at once, as in
+    gar2pingmapper.
+    '''
     assert os.path.isfile(input), "{} does not exist.".format(input)
 
     jsf_obj = jsf(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown)
@@ -460,7 +625,7 @@ def jsf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
 
     jsf_obj._getFileLen()
     jsf_obj._parseFileHeader()
-    jsf_obj._parsePingHeader()
+    jsf_obj._parsePingHeader(n_jobs, parallel)
     jsf_obj._recalcRecordNum()
     jsf_obj._splitBeamsToCSV()
 
@@ -474,7 +639,12 @@ def jsf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
 # XTF to PINGMapper
 # =========================================================
 
-def xtf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False):
+def xtf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, exportUnknown: bool=False,
+                   n_jobs: int=1, parallel: Parallel=None):
+    '''
+    n_jobs, parallel : decode byte ranges of the XTF at once, as in
+    gar2pingmapper.
+    '''
     assert os.path.isfile(input), "{} does not exist.".format(input)
 
     xtf_obj = xtf(inFile=input, nchunk=nchunk, exportUnknown=exportUnknown)
@@ -492,7 +662,7 @@ def xtf2pingmapper(input: str, out_dir: str, nchunk: int=500, tempC: float=10, e
 
     xtf_obj._getFileLen()
     xtf_obj._parseFileHeader()
-    xtf_obj._parsePingHeader()
+    xtf_obj._parsePingHeader(n_jobs, parallel)
     xtf_obj._recalcRecordNum()
     xtf_obj._splitBeamsToCSV()
 
@@ -586,22 +756,30 @@ def _humminbird_sequence_from_time(df: pd.DataFrame):
     if times is None or times.notna().sum() == 0:
         return pd.Series(np.arange(len(df)), index=df.index, dtype='int64')
 
+    t_all = times.to_numpy(dtype='float64')
+
     # Estimate ping period from within-channel deltas when available.
     period_candidates = []
     if 'channel_id' in df.columns:
-        for _, g in df.groupby('channel_id'):
-            t = pd.to_numeric(g.get('time_s'), errors='coerce').dropna().sort_values()
-            if len(t) < 2:
-                continue
-            dt = np.diff(t.to_numpy())
-            dt = dt[dt > 0]
-            if len(dt) > 0:
-                period_candidates.append(float(np.median(dt)))
+        # Sort once by channel then time; deltas across a channel boundary are dropped.
+        channel = df['channel_id'].to_numpy()
+        ok = ~np.isnan(t_all) & pd.notna(channel)
+        codes = pd.factorize(channel[ok])[0]
+        t = t_all[ok]
+        order = np.lexsort((t, codes))
+        t, codes = t[order], codes[order]
+
+        dt = np.diff(t)
+        keep = (codes[1:] == codes[:-1]) & (dt > 0)
+        dt, codes = dt[keep], codes[1:][keep]
+        if len(dt) > 0:
+            for dt_channel in np.split(dt, np.flatnonzero(np.diff(codes)) + 1):
+                period_candidates.append(float(np.median(dt_channel)))
 
     if period_candidates:
         period = float(np.median(period_candidates))
     else:
-        all_t = np.sort(times.dropna().to_numpy())
+        all_t = np.sort(t_all[~np.isnan(t_all)])
         if len(all_t) < 2:
             return pd.Series(np.arange(len(df)), index=df.index, dtype='int64')
         dt_all = np.diff(all_t)
@@ -613,34 +791,25 @@ def _humminbird_sequence_from_time(df: pd.DataFrame):
     # Keep threshold above timestamp jitter but well below ping period.
     threshold = max(0.003, period * 0.2)
 
-    # Stable sort by time, then by record_num when present.
-    work = pd.DataFrame(index=df.index)
-    work['_time'] = times
-    if 'record_num' in df.columns:
-        work['_rn'] = pd.to_numeric(df['record_num'], errors='coerce')
-    else:
-        work['_rn'] = np.arange(len(df))
-    order = work.sort_values(['_time', '_rn'], na_position='last', kind='mergesort').index
-
-    seq = pd.Series(index=df.index, dtype='float64')
-    current_seq = -1
-    prev_time = None
-    for idx in order:
-        t = times.loc[idx]
-        if not np.isfinite(t):
-            continue
-        if prev_time is None or (t - prev_time) > threshold:
-            current_seq += 1
-        seq.loc[idx] = current_seq
-        prev_time = t
-
-    # Fill any NaN sequence ids deterministically.
-    if seq.notna().any():
-        fill_value = int(seq.dropna().max()) + 1
-    else:
-        fill_value = 0
-    seq = seq.fillna(fill_value).astype('int64')
-    return seq
+    # Walk finite times in order: a new frame starts wherever the gap to the
+    ## previous time exceeds threshold. Equal times share a frame, so the
+    ## record_num tie-break does not change the ids.
+    finite = np.flatnonzero(np.isfinite(t_all))
+    order = finite[np.argsort(t_all[finite], kind='stable')]
+    new_frame = np.empty(len(order), dtype=bool)
+    new_frame[:1] = True
+    np.greater(np.diff(t_all[order]), threshold, out=new_frame[1:])
+
+    seq = np.empty(len(df), dtype='int64')
+    seq[order] = np.cumsum(new_frame) - 1
+
+    # Fill non-finite times with the next sequence id deterministically.
+    fill_value = int(new_frame.sum())
+    is_missing = np.ones(len(df), dtype=bool)
+    is_missing[finite] = False
+    seq[is_missing] = fill_value
+
+    return pd.Series(seq, index=df.index, dtype='int64')
 
 
 def _bytes_per_sample(sonar_obj, row):
@@ -952,30 +1121,38 @@ def export_sonar_data_player_project(input: str, out_dir: str, include_pngs: boo
     parser_work_dir = os.path.join(out_dir, 'meta')
     os.makedirs(parser_work_dir, exist_ok=True)
 
-    sonar_obj = _build_sonar_object(
-        input_path=input,
-        work_dir=parser_work_dir,
-        ext=ext,
-        nchunk=nchunk,
-        tempC=tempC,
-        exportUnknown=exportUnknown,
-    )
+    if ext == '.dat':
+        # Hand Humminbird ping tables over in memory instead of through csv's
+        sonar_obj = hum2pingmapper(input, parser_work_dir, nchunk=nchunk, tempC=tempC, exportUnknown=exportUnknown,
+                                   keepPings=True, writeCSV=False)
+    else:
+        sonar_obj = _build_sonar_object(
+            input_path=input,
+            work_dir=parser_work_dir,
+            ext=ext,
+            nchunk=nchunk,
+            tempC=tempC,
+            exportUnknown=exportUnknown,
+        )
 
     if hasattr(sonar_obj, 'write_sonar_data_player_project'):
         return sonar_obj.write_sonar_data_player_project(out_dir, include_pngs=include_pngs)
 
-    # Humminbird: hum2pingmapper writes per-beam CSVs to disk rather than storing
-    # header_dat in memory.  Reconstruct header_dat here and build a channel→file map
+    # Humminbird: hum2pingmapper keeps per-beam ping tables (or writes per-beam CSVs)
+    # rather than one header_dat.  Combine them here and build a channel→file map
     # so the generic writer reads samples from the correct .SON file for each beam.
     file_map = None
     if ext == '.dat' and hasattr(sonar_obj, 'beamMeta'):
         beam_dfs = []
         file_map = {}
+        beam_pings = getattr(sonar_obj, 'beamPings', {})
         for beam_key, meta in sonar_obj.beamMeta.items():
             csv_path = meta.get('metaCSV')
             son_path = meta.get('sonFile')
-            if csv_path and os.path.isfile(csv_path):
+            beam_df = beam_pings.get(beam_key)
+            if beam_df is None and csv_path and os.path.isfile(csv_path):
                 beam_df = pd.read_csv(csv_path)
+            if beam_df is not None:
                 try:
                     channel_id = int(beam_key[1:])  # 'B000' -> 0, 'B001' -> 1, …
                 except (ValueError, IndexError):
@@ -987,7 +1164,7 @@ def export_sonar_data_player_project(input: str, out_dir: str, include_pngs: boo
         if beam_dfs:
             sonar_obj.header_dat = pd.concat(beam_dfs, ignore_index=True)
         if not beam_dfs or not file_map:
-            raise ValueError("Humminbird: could not load per-beam metadata CSVs from beamMeta.")
+            raise ValueError("Humminbird: could not load per-beam ping metadata from beamMeta.")
         # Build a robust frame key from time clustering. This tolerates non-zero
         # record starts and dropped records while still grouping same-event beams.
         sonar_obj.header_dat['sequence_cnt'] = _humminbird_sequence_from_time(sonar_obj.header_dat)
@@ -1013,7 +1190,12 @@ SUPPORTED_SONAR_EXTENSIONS = (
 # Lowrance to Humminbird
 # =========================================================
 
-def low2hum(input: str, output: str):
+def low2hum(input: str, output: str, workers: int=1):
+    '''
+    workers : number of beams to write at once. Beams are written in
+    threads sharing one read-only mapping of the Lowrance log, and each
+    beam is reported as it finishes.
+    '''
 
     # Make sure input exists
     assert os.path.isfile(input), "{} does not exist.".format(input)
@@ -1035,11 +1217,8 @@ def low2hum(input: str, output: str):
     # Parse file header
     lowrance._parseFileHeader()
 
-    # Parse ping headers (attributes)
-    lowrance._parsePingHeader()
-
-    # Convert ping attributes to known units
-    lowrance._convertPingAttributes()
+    # Parse ping headers (raw attributes)
+    lowrance.header_dat = lowrance._readPingHeaders()
 
     # lowrance.header_dat.to_csv('lowrance_test.csv')
 
@@ -1077,23 +1256,21 @@ def low2hum(input: str, output: str):
     # Write DAT to file
     humminbird._writeDAT()
 
-    # Save b001 and b002
+    # Write each beam to SON/IDX, concurrently if workers > 1
     beams = humminbird.header_dat['beam'].unique()
+    plans = [humminbird._getLowBeamPlan(b, flip_port and b == 2) for b in range(5) if b in beams]
 
-    if 0 in beams:
-        humminbird._writeSonfromLow(0, lowrance.frame_header_size, lowrance.path)
-
-    if 1 in beams:
-        humminbird._writeSonfromLow(1, lowrance.frame_header_size, lowrance.path)
-
-    if 2 in beams:
-        humminbird._writeSonfromLow(2, lowrance.frame_header_size, lowrance.path, flip_port)
+    # Workers share one read-only mapping of the Lowrance log
+    buf = np.memmap(lowrance.sonFile, dtype=np.uint8, mode='r')
 
-    if 3 in beams:
-        humminbird._writeSonfromLow(3, lowrance.frame_header_size, lowrance.path)
+    # Report each beam as soon as it is written
+    with ThreadPoolExecutor(max_workers=min(workers, len(plans)) or 1) as pool:
+        futures = [pool.submit(humminbird._writeLowBeam, plan, buf) for plan in plans]
+        for future in as_completed(futures):
+            beam, pings, son_size, secs = future.result()
+            print("B00{}: {} pings, {} MB, Time (s): {}".format(beam, pings, round(son_size / 1e6, 1), round(secs, ndigits=1)))
 
-    if 4 in beams:
-        humminbird._writeSonfromLow(4, lowrance.frame_header_size, lowrance.path)
+    del buf
 
     # Split b005 (lowrance sidescan) into port (2) and star (3)
 
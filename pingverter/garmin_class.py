@@ -43,11 +43,14 @@ SOFTWARE.
 import json
 import math
 import os, sys
+import struct
+import time
+import zlib
 import numpy as np
 import pandas as pd
 from PIL import Image
 from datetime import datetime, timezone, timedelta
-from io import BytesIO
+from joblib import Parallel, delayed, cpu_count
 
 try:
     import pyproj
@@ -59,7 +62,7 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PACKAGE_DIR = os.path.dirname(SCRIPT_DIR)
 sys.path.append(PACKAGE_DIR)
 
-from pingverter.verter_utils import filterGPS
+from pingverter.verter_utils import filterGPS, raggedToRows, writePalettePNG, parsePartitioned
 
 # # RSD structur
 # rsdStruct = np.dtype([
@@ -76,20 +79,71 @@ garCols2PM = {
     'recording_time_ms': 'time_s',
 }
 
+# Record body field number: (column, decoder). The beam info structure
+# decodes to several columns, named in garBeamInfoCols.
+garBodyFields = {
+    0: ('channel_id_1', '_decode_varuint_field'),
+    1: ('bottom_depth', '_decode_depth_varint'),
+    2: ('drawn_bottom_depth', '_decode_depth_varint'),
+    3: ('first_sample_depth', '_decode_depth_varint'),
+    4: ('last_sample_depth', '_decode_depth_varint'),
+    5: ('gain', '_decode_u8'),
+    6: ('sample_status', '_decode_varuint_field'),
+    7: ('sample_cnt', '_decode_uint_le'),
+    8: ('shade_avail', '_decode_u8'),
+    9: ('scposn_lat', '_decode_int_le'),
+    10: ('scposn_lon', '_decode_int_le'),
+    11: ('water_temp', '_decode_f4'),
+    12: ('beam', '_decode_varuint_field'),
+    13: (None, '_parseBeamInfoPayload'),
+    14: ('interrogation_id', '_decode_varuint_field'),
+}
+
+garBeamInfoCols = ['port_star_beam_angle', 'fore_aft_beam_angle', 'port_star_elem_angle',
+                   'fore_aft_elem_angle', 'port_star_id']
+
+# Body fields the ping table can't be built without
+garRequiredFields = ['sample_cnt', 'scposn_lat', 'scposn_lon', 'first_sample_depth', 'last_sample_depth']
+
+# Body fields used by PING-Mapper, fields='pingmapper'
+garPMFields = garRequiredFields + ['bottom_depth', 'drawn_bottom_depth', 'water_temp', 'beam', 'port_star_id']
+
 class gar(object):
 
     #===========================================================================
-    def __init__(self, inFile: str, nchunk: int=0, exportUnknown: bool=False):
+    def __init__(self, inFile: str, nchunk: int=0, exportUnknown: bool=False, verify: str='off',
+                 fields: list=None, verify_jobs: int=-1):
         
         '''
+        fields : record body columns to decode, or 'pingmapper' for garPMFields.
+        Other body fields are skipped by length. garRequiredFields are always
+        decoded. When None, every body field is decoded.
+
+        verify : check the header and data CRC of each record, 'off', 'sample'
+        (every crcSampleStep-th ping) or 'full'. Results are stored in a
+        'crc_ok' column, NA for unchecked pings, and summarized in
+        parse_stats. 'full' reads the whole file a second time, at about
+        1 GB/s per thread. The header and data CRCs are checked, the record
+        trailer is not as its CRC coverage is unknown.
+
+        verify_jobs : number of threads checking CRCs, -1 uses one per core.
+        At most one thread per 4096 pings, and verify='sample' runs without
+        threads. Independent of the n_jobs of the record parse.
         '''
 
         self.humFile = None
         self.sonFile = inFile
         self.nchunk = nchunk
         self.exportUnknown = exportUnknown
+        self.verify = verify # Record CRC check: 'off', 'sample' or 'full'
+        self.crcSampleStep = 100
+        self.verifyJobs = verify_jobs
+        self.fields = fields
+        self.bodyDecoders = self._getBodyDecoders(fields) # Field number: (column, decoder)
 
         self.magicNum = 3085556358
+        self.magic_offsets = None # Sorted offsets of magicNum, built on first resync
+        self.parse_stats = {}
 
 
 
@@ -209,33 +263,83 @@ class gar(object):
         return
 
     # ======================================================================
-    def _read_varuint(self, file_obj):
-        """Read protobuf-style VarUInt32/VarUInt64 from a file-like object."""
+    def _read_varuint(self, buf, pos: int, end: int=None):
+        """Read protobuf-style VarUInt32/VarUInt64 from buf at pos.
+
+        buf is any indexable byte buffer (bytes, memoryview over a memory-mapped
+        RSD, ...). Returns (value, next_pos); reading stops at end.
+        """
+        if end is None:
+            end = len(buf)
+
+        # Most keys and lengths fit in a single byte
+        if pos < end and buf[pos] < 0x80:
+            return buf[pos], pos + 1
+
         result = 0
         shift = 0
 
         while True:
-            b = file_obj.read(1)
-            if not b:
+            if pos >= end:
                 raise EOFError('Unexpected EOF while reading varuint.')
 
-            byte = b[0]
+            byte = buf[pos]
+            pos += 1
             result |= (byte & 0x7F) << shift
 
             if not (byte & 0x80):
-                return result
+                return result, pos
 
             shift += 7
             if shift > 63:
                 raise ValueError('Invalid varuint: too many continuation bytes.')
 
+    # ======================================================================
+    def _read_var_struct_spans(self, buf, pos: int, end: int=None, field_cnt: int=None, strict: bool=False):
+        """Read a variable-structure from buf at pos without copying field values.
+
+        Returns ([(field_number, start, end), ...], next_pos), where each field
+        value is buf[start:end]. The field count is read from buf unless given.
+        Fields must end before end. A truncated structure raises EOFError or
+        ValueError when strict, otherwise the fields read so far are returned.
+        """
+        end = len(buf) if end is None else min(end, len(buf))
+        spans = []
+
+        try:
+            if field_cnt is None:
+                field_cnt, pos = self._read_varuint(buf, pos, end)
+
+            for _ in range(field_cnt):
+                if pos < end and buf[pos] < 0x80:
+                    key = buf[pos]
+                    pos += 1
+                else:
+                    key, pos = self._read_varuint(buf, pos, end)
+                value_len = key & 0x07
+
+                if value_len == 7:
+                    value_len, pos = self._read_varuint(buf, pos, end)
+
+                if pos + value_len > end:
+                    pos = end
+                    raise EOFError('Unexpected EOF while reading variable structure field.')
+
+                spans.append((key >> 3, pos, pos + value_len))
+                pos += value_len
+
+        except (EOFError, ValueError):
+            if strict:
+                raise
+
+        return spans, pos
+
     # ======================================================================
     def _decode_varuint_bytes(self, data: bytes):
         if len(data) == 0:
             return np.nan
-        stream = BytesIO(data)
         try:
-            return self._read_varuint(stream)
+            return self._read_varuint(data, 0)[0]
         except (EOFError, ValueError):
             return np.nan
 
@@ -286,101 +390,86 @@ class gar(object):
         return min(candidates)
 
     # ======================================================================
-    def _parse_var_struct_payload(self, payload: bytes):
-        """Parse a variable-structure payload into (field_number, raw_value_bytes)."""
-        stream = BytesIO(payload)
-        fields = []
-
-        try:
-            field_cnt = self._read_varuint(stream)
-        except (EOFError, ValueError):
-            return fields
-
-        for _ in range(field_cnt):
-            try:
-                key = self._read_varuint(stream)
-            except (EOFError, ValueError):
-                break
-
-            field_num = key >> 3
-            val_len = key & 0x07
-
-            if val_len == 7:
-                try:
-                    val_len = self._read_varuint(stream)
-                except (EOFError, ValueError):
-                    break
-
-            val = stream.read(val_len)
-            if len(val) < val_len:
-                break
+    def _decode_varuint_field(self, data: bytes):
+        return self._decode_varuint_bytes(data) if len(data) > 0 else None
 
-            fields.append((field_num, val))
-
-        return fields
+    # ======================================================================
+    def _decode_u8(self, data: bytes):
+        return int(data[0]) if len(data) > 0 else None
 
     # ======================================================================
-    def _read_var_struct_fields(self, file_obj, max_end: int=None):
-        """Read a variable-structure from a file and return raw field values."""
-        fields = []
-        field_cnt = self._read_varuint(file_obj)
+    def _decode_uint_le(self, data: bytes):
+        return int.from_bytes(data, 'little', signed=False) if len(data) > 0 else None
 
-        for _ in range(field_cnt):
-            if max_end is not None and file_obj.tell() >= max_end:
-                break
+    # ======================================================================
+    def _decode_int_le(self, data: bytes):
+        return int.from_bytes(data, 'little', signed=True) if len(data) > 0 else None
 
-            key = self._read_varuint(file_obj)
-            field_num = key >> 3
-            value_len = key & 0x07
+    # ======================================================================
+    def _decode_f4(self, data: bytes):
+        return struct.unpack('<f', data)[0] if len(data) == 4 else None
 
-            if value_len == 7:
-                value_len = self._read_varuint(file_obj)
+    # ======================================================================
+    def _getBodyDecoders(self, fields: list=None):
+        """Dispatch table of the record body fields to decode.
 
-            if max_end is not None and file_obj.tell() + value_len > max_end:
-                break
+        Maps field number to (column, bound decoder). Decoders return None
+        when a field can't be decoded, and the beam info decoder returns a
+        dict of columns.
+        """
+        if isinstance(fields, str):
+            if fields != 'pingmapper':
+                raise ValueError("fields must be a list of columns or 'pingmapper', not '{}'.".format(fields))
+            fields = garPMFields
+
+        if fields is not None:
+            known = [c for c, _ in garBodyFields.values() if c is not None] + garBeamInfoCols
+            unknown = [c for c in fields if c not in known]
+            if unknown:
+                raise ValueError('Unknown Garmin record body fields: {}. Expected some of {}.'.format(unknown, known))
+            fields = set(fields) | set(garRequiredFields)
+
+        decoders = {}
+        for field_num, (column, decoder) in garBodyFields.items():
+            cols = garBeamInfoCols if column is None else [column]
+            if fields is None or fields.intersection(cols):
+                decoders[field_num] = (column, getattr(self, decoder))
+
+        return decoders
 
-            raw = file_obj.read(value_len)
-            if len(raw) < value_len:
-                raise EOFError('Unexpected EOF while reading variable structure field.')
+    # ======================================================================
+    def _parse_var_struct_payload(self, payload: bytes):
+        """Parse a variable-structure payload into (field_number, raw_value_bytes).
 
-            fields.append((field_num, raw))
+        Values are memoryview slices of payload, not copies.
+        """
+        buf = memoryview(payload)
+        spans, _ = self._read_var_struct_spans(buf, 0)
 
-        return fields
+        return [(field_num, buf[start:end]) for field_num, start, end in spans]
 
     # ======================================================================
     def _parseChannelInformation(self, chan_info_offset: int):
         """Parse header field 6 channel_information_array for each channel."""
         out = []
 
-        with open(self.sonFile, 'rb') as file:
-            file.seek(chan_info_offset)
-
-            try:
-                key = self._read_varuint(file)
-            except (EOFError, ValueError):
-                return out
+        buf = memoryview(np.memmap(self.sonFile, dtype=np.uint8, mode='r'))
 
+        try:
+            key, pos = self._read_varuint(buf, chan_info_offset)
             if key != 55:  # field 6 with length marker 7 -> 6<<3 + 7
                 return out
 
-            try:
-                payload_len = self._read_varuint(file)
-            except (EOFError, ValueError):
+            payload_len, pos = self._read_varuint(buf, pos)
+            end = pos + payload_len
+            if end > len(buf):
                 return out
 
-            payload = file.read(payload_len)
-            if len(payload) < payload_len:
-                return out
-
-        stream = BytesIO(payload)
-
-        try:
-            chan_cnt = self._read_varuint(stream)
+            chan_cnt, pos = self._read_varuint(buf, pos, end)
         except (EOFError, ValueError):
             return out
 
         for _ in range(chan_cnt):
-            ch_payload = b''
             ch = {
                 'channel_id': np.nan,
                 'first_chunk_offset': np.nan,
@@ -391,63 +480,48 @@ class gar(object):
             }
 
             # Each channel-info element is a variable structure.
-            # Parse directly from stream by reading element field count and fields.
+            # Parse directly from the buffer by reading element field count and fields.
             try:
-                elem_field_cnt = self._read_varuint(stream)
+                elem_field_cnt, pos = self._read_varuint(buf, pos, end)
             except (EOFError, ValueError):
                 break
 
-            for _ in range(elem_field_cnt):
-                try:
-                    fkey = self._read_varuint(stream)
-                except (EOFError, ValueError):
-                    break
-
-                fnum = fkey >> 3
-                flen = fkey & 0x07
-                if flen == 7:
-                    try:
-                        flen = self._read_varuint(stream)
-                    except (EOFError, ValueError):
-                        break
-                fval = stream.read(flen)
-                if len(fval) < flen:
-                    break
+            fields, pos = self._read_var_struct_spans(buf, pos, end, field_cnt=elem_field_cnt)
 
+            for fnum, fstart, fend in fields:
                 if fnum == 0:
                     # data_info: varray of DataInfo structure(s)
-                    info_stream = BytesIO(fval)
                     try:
-                        n = self._read_varuint(info_stream)
+                        n, ipos = self._read_varuint(buf, fstart, fend)
                     except (EOFError, ValueError):
                         n = 0
-                    if n > 0:
-                        for _ in range(n):
-                            try:
-                                item_len = self._read_varuint(info_stream)
-                            except (EOFError, ValueError):
-                                break
-                            item = info_stream.read(item_len)
-                            if item_len > 0:
-                                ch['channel_id'] = self._decode_varuint_bytes(item)
+                    for _ in range(n):
+                        try:
+                            item_len, ipos = self._read_varuint(buf, ipos, fend)
+                        except (EOFError, ValueError):
+                            break
+                        item = buf[ipos:min(ipos + item_len, fend)]
+                        ipos += item_len
+                        if item_len > 0:
+                            ch['channel_id'] = self._decode_varuint_bytes(item)
                 elif fnum == 1:
                     # first_chunk_offset: 8-byte little-endian ulong
-                    if len(fval) == 8:
-                        ch['first_chunk_offset'] = int.from_bytes(fval, 'little', signed=False)
+                    if fend - fstart == 8:
+                        ch['first_chunk_offset'] = struct.unpack_from('<Q', buf, fstart)[0]
                 elif fnum == 2:
                     # prop_chan_info: varray of DpsChannelInformation struct(s)
-                    dps_stream = BytesIO(fval)
                     try:
-                        dps_n = self._read_varuint(dps_stream)
+                        dps_n, dpos = self._read_varuint(buf, fstart, fend)
                     except (EOFError, ValueError):
                         dps_n = 0
 
                     for _ in range(dps_n):
                         try:
-                            dps_len = self._read_varuint(dps_stream)
+                            dps_len, dpos = self._read_varuint(buf, dpos, fend)
                         except (EOFError, ValueError):
                             break
-                        dps_payload = dps_stream.read(dps_len)
+                        dps_payload = buf[dpos:min(dpos + dps_len, fend)]
+                        dpos += dps_len
                         dps_fields = self._parse_var_struct_payload(dps_payload)
 
                         for dnum, dval in dps_fields:
@@ -642,8 +716,12 @@ class gar(object):
     
     ### Ping Header ###
     # ======================================================================
-    def _parsePingHeader(self,):
+    def _parsePingHeader(self, n_jobs: int=1, parallel=None):
         '''
+        n_jobs : number of byte ranges of the RSD to decode at once. 1 walks
+        the file in this process, -1 uses one range per core.
+
+        parallel : an open joblib Parallel to decode the ranges in.
         '''
 
         # Get the header struct
@@ -655,23 +733,40 @@ class gar(object):
         # Initialize offset after file header
         i = self.headBytes
 
-        # Store contents in list
-        header_dat_all = []
-
-        # Decode ping header
-        with open(self.sonFile, 'rb') as file:
-            while i < file_len:
-
-                # Get header data at offset i
-                header_dat, cpos = self._getPingHeader(file, i)
+        # Memory-map the RSD, records are decoded in place
+        buf = memoryview(np.memmap(self.sonFile, dtype=np.uint8, mode='r'))
 
-                if header_dat:
-                    header_dat_all.append(header_dat)
+        # Magic number index is only built if a record must be resynced
+        self.magic_offsets = None
+        self.parse_stats = {'magic_cnt': 0, 'magic_scan_secs': 0.0, 'resync_cnt': 0}
 
-                i = cpos
+        # Decode ping header
+        try:
+            if n_jobs == 1:
+                header_dat_all, _ = self._walkRecords(buf, i, file_len)
+            else:
+                # Byte ranges are synced to records with the magic number index
+                self.magic_offsets = self._getMagicIndex(buf)
+                header_dat_all = parsePartitioned(self, i, n_jobs, parallel)
+
+            # Convert to dataframe
+            df = pd.DataFrame.from_dict(header_dat_all)
+
+            # Check record CRCs
+            if self.verify != 'off' and len(df) > 0:
+                df['crc_ok'] = self._verifyRecordCRC(buf, df, self.verifyJobs)
+        finally:
+            del buf
+
+        stats = self.parse_stats
+        son = os.path.basename(self.sonFile)
+        if stats['resync_cnt']:
+            print("\n{}: resynced {} times with an index of {} magic numbers (scanned in {:.2f} s).".format(
+                son, stats['resync_cnt'], stats['magic_cnt'], stats['magic_scan_secs']))
+        if 'crc_checked' in stats:
+            print("\n{}: {} of {} checked records failed the CRC check ({} MB in {:.2f} s).".format(
+                son, stats['crc_failed'], stats['crc_checked'], round(stats['crc_bytes'] / 1e6), stats['crc_secs']))
 
-        # Convert to dataframe
-        df = pd.DataFrame.from_dict(header_dat_all)
         if len(df) == 0:
             self.header_dat = df
             return
@@ -860,132 +955,180 @@ class gar(object):
         return headStruct, pingHeader, 0
 
     # ======================================================================
-    def _getPingHeader(self, file, i: int):
+    def _verifyRecordCRC(self, buf, df: pd.DataFrame, n_jobs: int=-1, batch: int=4096):
+        """Check the CRC32 of the header and data of the pings in df.
+
+        The header CRC covers the record header up to the CRC itself, the data
+        CRC the record body. Batches of pings are checked in up to n_jobs
+        threads (negative counts back from the number of cores), zlib.crc32
+        releases the GIL on large spans. A sample, or a single batch, is
+        checked in this thread. Returns a boolean column, NA where a ping
+        was not checked.
+        """
+        t0 = time.perf_counter()
+
+        start = df['index'].to_numpy(dtype='int64')
+        head_len = df['ping_header_len'].to_numpy(dtype='int64')
+        data_size = df['data_size'].to_numpy(dtype='int64')
+        record_crc = df['record_crc'].to_numpy(dtype='float64')
+        data_crc = df['data_crc'].to_numpy(dtype='float64') if 'data_crc' in df.columns else np.full(len(df), np.nan)
+
+        if self.verify == 'full':
+            pings = np.arange(len(df))
+        else:
+            pings = np.arange(0, len(df), self.crcSampleStep)
+        pings = pings[~np.isnan(record_crc[pings]) & ~np.isnan(data_crc[pings])]
+
+        def check(sel):
+            ok = np.empty(len(sel), dtype=bool)
+            for k, p in enumerate(sel):
+                s, h, d = start[p], head_len[p], data_size[p]
+                ok[k] = (zlib.crc32(buf[s:s+h-4]) == record_crc[p]
+                         and zlib.crc32(buf[s+h:s+h+d]) == data_crc[p])
+            return ok
+
+        batches = [pings[k:k+batch] for k in range(0, len(pings), batch)]
+
+        # No more threads than batches, starting a pool costs more than a few batches
+        if n_jobs < 0:
+            n_jobs = max(cpu_count() + 1 + n_jobs, 1)
+        n_jobs = min(n_jobs, len(batches))
+
+        if self.verify == 'sample' or n_jobs <= 1:
+            r = [check(sel) for sel in batches]
+        else:
+            r = Parallel(n_jobs=n_jobs, backend='threading')(delayed(check)(sel) for sel in batches)
+
+        crc_ok = pd.array(np.full(len(df), pd.NA), dtype='boolean')
+        if len(pings) > 0:
+            crc_ok[pings] = np.concatenate(r)
+
+        self.parse_stats['crc_checked'] = len(pings)
+        self.parse_stats['crc_failed'] = int((~crc_ok[pings]).sum()) if len(pings) > 0 else 0
+        self.parse_stats['crc_bytes'] = int((head_len[pings] + data_size[pings]).sum())
+        self.parse_stats['crc_secs'] = time.perf_counter() - t0
+
+        return crc_ok
+
+    # ======================================================================
+    def _walkRecords(self, buf, start: int, stop: int):
+        """Decode the records chained from start that begin before stop.
+
+        Returns (ping attributes, offset of the next record at or after stop).
+        """
+        rows = []
+        i = start
+
+        while i < stop and i < self.file_len:
+            header_dat, i = self._getPingHeader(buf, i)
 
-        # print('\n\n\n', i)
+            if header_dat:
+                rows.append(header_dat)
 
-        # Move to offset
-        file.seek(i)
+        return rows, i
+
+    # ======================================================================
+    def _syncRecord(self, buf, pos: int):
+        """Offset of the first record at or after pos, by the magic number index."""
+        if self.magic_offsets is None:
+            self.magic_offsets = self._getMagicIndex(buf)
+
+        offsets = self.magic_offsets
+        for k in range(np.searchsorted(offsets, pos + 2), len(offsets)):
+            if buf[offsets[k] - 2] == 6: # Record header field count
+                return int(offsets[k]) - 2
+
+        return self.file_len
+
+    # ======================================================================
+    def _resetWalkState(self):
+        self.parse_stats = {}
+
+    # ======================================================================
+    def _getWalkState(self):
+        return {'resync_cnt': self.parse_stats.get('resync_cnt', 0)}
+
+    # ======================================================================
+    def _setWalkState(self, state: dict):
+        self.parse_stats['resync_cnt'] = self.parse_stats.get('resync_cnt', 0) + state['resync_cnt']
+
+    # ======================================================================
+    def _getPingHeader(self, buf, i: int):
+        '''
+        Decode the record at offset i from buf, a memoryview over the
+        memory-mapped RSD. Fields are located as spans and decoded in place.
+        Returns (ping attributes or False, offset of the next record).
+        '''
+
+        file_len = self.file_len
 
         try:
-            header_fields = self._read_var_struct_fields(file)
+            header_fields, pos = self._read_var_struct_spans(buf, i, file_len, strict=True)
         except (EOFError, ValueError):
-            return False, self.file_len
+            return False, file_len
 
         out_dict = {}
-        for field_num, raw in header_fields:
-            if field_num == 0 and len(raw) == 4:
-                out_dict['magic_number'] = int.from_bytes(raw, 'little', signed=False)
+        for field_num, start, end in header_fields:
+            size = end - start
+            if field_num == 0 and size == 4:
+                out_dict['magic_number'] = struct.unpack_from('<I', buf, start)[0]
             elif field_num == 1:
-                out_dict.update(self._parseStateDataPayload(raw))
-            elif field_num == 2 and len(raw) == 4:
-                out_dict['sequence_cnt'] = int.from_bytes(raw, 'little', signed=False)
-            elif field_num == 3 and len(raw) == 4:
-                out_dict['data_crc'] = int.from_bytes(raw, 'little', signed=False)
-            elif field_num == 4 and len(raw) == 2:
-                out_dict['data_size'] = int.from_bytes(raw, 'little', signed=False)
-            elif field_num == 5 and len(raw) == 4:
-                out_dict['recording_time_ms'] = int.from_bytes(raw, 'little', signed=False)
+                out_dict.update(self._parseStateDataPayload(buf, start, end))
+            elif field_num == 2 and size == 4:
+                out_dict['sequence_cnt'] = struct.unpack_from('<I', buf, start)[0]
+            elif field_num == 3 and size == 4:
+                out_dict['data_crc'] = struct.unpack_from('<I', buf, start)[0]
+            elif field_num == 4 and size == 2:
+                out_dict['data_size'] = struct.unpack_from('<H', buf, start)[0]
+            elif field_num == 5 and size == 4:
+                out_dict['recording_time_ms'] = struct.unpack_from('<I', buf, start)[0]
 
         if out_dict.get('magic_number') != self.magicNum or 'data_size' not in out_dict:
-            return False, self._find_next_record(file, i + 1)
+            # Resume past this record's magic number so the parse always moves forward
+            return False, self._find_next_record(buf, i + 3)
 
         # Skip record header CRC.
-        header_crc = file.read(4)
-        if len(header_crc) < 4:
-            return False, self.file_len
-        out_dict['record_crc'] = int.from_bytes(header_crc, 'little', signed=False)
-        pingHeaderLen = file.tell() - i
+        if pos + 4 > file_len:
+            return False, file_len
+        out_dict['record_crc'] = struct.unpack_from('<I', buf, pos)[0]
+        pos += 4
+        pingHeaderLen = pos - i
         out_dict['ping_header_len'] = pingHeaderLen
 
         # Check if there is a record body
         if out_dict.get('state') != 2 or out_dict['data_size'] == 0: # no record body
             next_ping = i + pingHeaderLen + 12
-            return False, self._align_next_record(file, next_ping)
-        
-        # # Get record body
-        # # Get the ping header
-        # buffer = file.read(record_body_header_len)
-
-        # # Read the data
-        # header = np.frombuffer(buffer, dtype=np.dtype(head_struct))
-
-        # for name, typ in header.dtype.fields.items():
-        #     out_dict[name] = header[name][0].item()
-
-        # Variable structure so above doesn't work
-        # Must determine structure ping by ping
+            return False, self._align_next_record(buf, next_ping)
 
+        # Variable structure, must determine structure ping by ping
         # Decode variable record body by field key/length instead of fixed count assumptions.
         try:
-            rb_field_cnt = self._read_varuint(file)
+            rb_field_cnt, pos = self._read_varuint(buf, pos, file_len)
         except (EOFError, ValueError):
-            return False, self.file_len
+            return False, file_len
 
         out_dict['record_body_fcnt'] = rb_field_cnt
         record_body_start = i + pingHeaderLen
         record_body_end = record_body_start + out_dict['data_size']
 
-        for _ in range(rb_field_cnt):
-            if file.tell() >= record_body_end:
-                break
+        body_fields, _ = self._read_var_struct_spans(buf, pos, record_body_end, field_cnt=rb_field_cnt)
 
-            try:
-                key = self._read_varuint(file)
-            except (EOFError, ValueError):
-                break
-
-            field_num = key >> 3
-            value_len = key & 0x07
-            if value_len == 7:
-                try:
-                    value_len = self._read_varuint(file)
-                except (EOFError, ValueError):
-                    break
-
-            if value_len < 0 or file.tell() + value_len > record_body_end:
-                break
-
-            raw = file.read(value_len)
-            if len(raw) < value_len:
-                break
-
-            if field_num == 0 and len(raw) > 0:
-                out_dict['channel_id_1'] = self._decode_varuint_bytes(raw)
-            elif field_num == 1:
-                out_dict['bottom_depth'] = self._decode_depth_varint(raw)
-            elif field_num == 2:
-                out_dict['drawn_bottom_depth'] = self._decode_depth_varint(raw)
-            elif field_num == 3:
-                out_dict['first_sample_depth'] = self._decode_depth_varint(raw)
-            elif field_num == 4:
-                out_dict['last_sample_depth'] = self._decode_depth_varint(raw)
-            elif field_num == 5 and len(raw) > 0:
-                out_dict['gain'] = int(raw[0])
-            elif field_num == 6 and len(raw) > 0:
-                out_dict['sample_status'] = self._decode_varuint_bytes(raw)
-            elif field_num == 7 and len(raw) > 0:
-                out_dict['sample_cnt'] = int.from_bytes(raw, 'little', signed=False)
-            elif field_num == 8 and len(raw) > 0:
-                out_dict['shade_avail'] = int(raw[0])
-            elif field_num == 9 and len(raw) > 0:
-                out_dict['scposn_lat'] = int.from_bytes(raw, 'little', signed=True)
-            elif field_num == 10 and len(raw) > 0:
-                out_dict['scposn_lon'] = int.from_bytes(raw, 'little', signed=True)
-            elif field_num == 11 and len(raw) == 4:
-                out_dict['water_temp'] = float(np.frombuffer(raw, dtype='<f4')[0])
-            elif field_num == 12 and len(raw) > 0:
-                out_dict['beam'] = self._decode_varuint_bytes(raw)
-            elif field_num == 13:
-                out_dict.update(self._parseBeamInfoPayload(raw))
-            elif field_num == 14 and len(raw) > 0:
-                out_dict['interrogation_id'] = self._decode_varuint_bytes(raw)
-
-            
+        # Only fields in the dispatch table are decoded, others are skipped by length
+        decoders = self.bodyDecoders
+        for field_num, start, end in body_fields:
+            if field_num not in decoders:
+                continue
 
+            column, decode = decoders[field_num]
+            value = decode(buf[start:end])
+            if value is None:
+                continue
+            if column is None:
+                out_dict.update(value)
+            else:
+                out_dict[column] = value
 
         # Next ping header is from current position + ping_cnt
-        # next_ping = file.tell() + out_dict['packet_size']
         next_ping = i + pingHeaderLen + out_dict['data_size'] + 12 #12 for trailer magic, chunk size & crc
 
         out_dict['index'] = i
@@ -995,69 +1138,100 @@ class gar(object):
             sample_cnt = 0
         out_dict['son_offset'] = (out_dict['data_size']) - (sample_cnt*2) + pingHeaderLen
 
-        # out_dict['son_offset'] = record_body_header_len+1
- 
-        return out_dict, self._align_next_record(file, next_ping)
+        return out_dict, self._align_next_record(buf, next_ping)
 
     # ======================================================================
-    def _parseStateDataPayload(self, payload: bytes):
+    def _parseStateDataPayload(self, buf, start: int=0, end: int=None):
         out = {}
-        fields = self._parse_var_struct_payload(payload)
+        fields, _ = self._read_var_struct_spans(buf, start, end)
 
-        for field_num, raw in fields:
-            if field_num == 0 and len(raw) > 0:
-                out['state'] = self._decode_varuint_bytes(raw)
+        for field_num, fstart, fend in fields:
+            if field_num == 0 and fend > fstart:
+                out['state'] = self._decode_varuint_bytes(buf[fstart:fend])
             elif field_num == 1:
-                values = self._parse_varuint_varray(raw)
+                values = self._parse_varuint_varray(buf, fstart, fend)
                 if values:
                     out['channel_id'] = values[0]
 
         return out
 
     # ======================================================================
-    def _parse_varuint_varray(self, payload: bytes):
-        """Parse Garmin varray[VarUInt32] values."""
-        stream = BytesIO(payload)
+    def _parse_varuint_varray(self, buf, start: int=0, end: int=None):
+        """Parse Garmin varray[VarUInt32] values from buf[start:end]."""
+        end = len(buf) if end is None else end
         values = []
 
         try:
-            count = self._read_varuint(stream)
-            total_len = self._read_varuint(stream)
+            count, pos = self._read_varuint(buf, start, end)
+            total_len, pos = self._read_varuint(buf, pos, end)
         except (EOFError, ValueError):
             return values
 
-        end_pos = min(len(payload), stream.tell() + total_len)
+        end_pos = min(end, pos + total_len)
         for _ in range(count):
-            if stream.tell() >= end_pos:
+            if pos >= end_pos:
                 break
             try:
-                values.append(self._read_varuint(stream))
+                value, pos = self._read_varuint(buf, pos, end)
             except (EOFError, ValueError):
                 break
+            values.append(value)
 
         return values
 
     # ======================================================================
-    def _find_next_record(self, file, start_pos: int):
-        magic = self.magicNum.to_bytes(4, 'little')
-        file.seek(start_pos)
-        data = file.read(max(0, self.file_len - start_pos))
-        pos = data.find(magic)
-        if pos < 0:
+    def _getMagicIndex(self, buf, block: int=1<<24):
+        """Sorted offsets of every magic number in buf, found in one scan.
+
+        The memory-mapped RSD is searched one block at a time, first for the
+        leading magic byte and then for the full pattern at those candidates.
+        """
+        t0 = time.perf_counter()
+
+        data = np.frombuffer(buf, dtype=np.uint8)
+        magic = np.frombuffer(self.magicNum.to_bytes(4, 'little'), dtype=np.uint8)
+        n = len(data) - 3
+
+        offsets = []
+        for s in range(0, max(n, 0), block):
+            b = data[s:min(s + block, n) + 3]
+            cand = np.flatnonzero(b[:-3] == magic[0])
+            cand = cand[(b[cand+1] == magic[1]) & (b[cand+2] == magic[2]) & (b[cand+3] == magic[3])]
+            offsets.append(cand + s)
+
+        offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+
+        self.parse_stats['magic_cnt'] = len(offsets)
+        self.parse_stats['magic_scan_secs'] = time.perf_counter() - t0
+
+        return offsets
+
+    # ======================================================================
+    def _find_next_record(self, buf, start_pos: int):
+        """Offset of the first record whose magic number is at or after start_pos.
+
+        The magic number index is built on the first resync.
+        """
+        if self.magic_offsets is None:
+            self.magic_offsets = self._getMagicIndex(buf)
+
+        self.parse_stats['resync_cnt'] = self.parse_stats.get('resync_cnt', 0) + 1
+
+        k = np.searchsorted(self.magic_offsets, start_pos)
+        if k == len(self.magic_offsets):
             return self.file_len
-        return start_pos + pos - 2
+        return int(self.magic_offsets[k]) - 2
 
     # ======================================================================
-    def _align_next_record(self, file, expected_pos: int):
+    def _align_next_record(self, buf, expected_pos: int):
         if expected_pos >= self.file_len:
             return self.file_len
 
-        file.seek(expected_pos)
-        b = file.read(6)
-        if len(b) >= 6 and b[0] == 6 and int.from_bytes(b[2:6], 'little') == self.magicNum:
+        if (expected_pos + 6 <= self.file_len and buf[expected_pos] == 6
+                and struct.unpack_from('<I', buf, expected_pos + 2)[0] == self.magicNum):
             return expected_pos
 
-        return self._find_next_record(file, max(self.headBytes, expected_pos - 16))
+        return self._find_next_record(buf, max(self.headBytes, expected_pos - 16))
 
     # ======================================================================
     def extract_raw_sample_arrays(self, df: pd.DataFrame=None):
@@ -1104,36 +1278,126 @@ class gar(object):
 
     # ======================================================================
     def write_channel_waterfall_pngs(self, out_dir: str, df: pd.DataFrame=None,
-                                     prefix: str=None, width: int=None):
-        """Write one Garmin-style waterfall PNG per channel and return paths."""
-        
+                                     prefix: str=None, width: int=None, strip_height: int=1024,
+                                     decimate: int=1, tile_height: int=None):
+        """Write one Garmin-style waterfall PNG per channel and return paths.
+
+        Pings are streamed from the memory-mapped RSD in strips of
+        strip_height rows: a first pass builds an intensity histogram for the
+        contrast stretch and a second pass scales and compresses each strip,
+        so memory is bounded by one strip rather than the recording.
+        decimate keeps every n-th ping along track. With tile_height, each
+        channel is instead split into numbered PNG tiles of that many rows
+        and the channel maps to a list of paths.
+        """
 
         os.makedirs(out_dir, exist_ok=True)
-        samples_by_channel = self.extract_raw_sample_arrays(df)
+        if df is None:
+            df = self.header_dat
+
+        ok, channel, count, start = self._get_sample_layout(df)
+
+        stem = prefix or os.path.splitext(os.path.basename(self.sonFile))[0]
+        safe_stem = ''.join(c if c.isalnum() or c in ('-', '_') else '_' for c in stem)
+        palette = self._garmin_waterfall_palette()
+
+        buf = np.memmap(self.sonFile, dtype=np.uint8, mode='r')
         out_paths = {}
+        try:
+            for channel_id in pd.unique(channel[ok]):
+                channel_id = int(channel_id)
+                pings = np.flatnonzero(ok & (channel == channel_id))[::max(int(decimate), 1)]
+
+                max_len = width or int(count[pings].max())
+
+                def strips(rows):
+                    for i in range(0, len(pings), rows):
+                        sel = pings[i:i+rows]
+                        n = np.minimum(count[sel], max_len)
+                        yield raggedToRows(self._gather_samples(buf, start[sel], n), n, max_len)
+
+                # First pass, histogram of the intensities shown in the image
+                hist = np.zeros(65536, dtype=np.int64)
+                for strip in strips(int(strip_height)):
+                    hist += np.bincount(strip.ravel(), minlength=65536)
+                hist[0] = 0
+                scale_range = self._waterfall_scale_range(hist)
+
+                # Second pass, scale and write
+                scaled = (self._scale_waterfall_strip(strip, scale_range) for strip in strips(int(tile_height or strip_height)))
+
+                if tile_height:
+                    out_paths[channel_id] = []
+                    for k, tile in enumerate(scaled):
+                        image = Image.fromarray(tile, mode='P')
+                        image.putpalette(palette)
+                        out_path = os.path.join(out_dir, f'{safe_stem}_channel_{channel_id}_{k:04d}.png')
+                        image.save(out_path)
+                        out_paths[channel_id].append(out_path)
+                else:
+                    out_path = os.path.join(out_dir, f'{safe_stem}_channel_{channel_id}.png')
+                    writePalettePNG(out_path, max_len, len(pings), palette, scaled)
+                    out_paths[channel_id] = out_path
+        finally:
+            del buf
 
-        for channel_id, pings in samples_by_channel.items():
-            if not pings:
-                continue
+        return out_paths
+
+    # ======================================================================
+    def _get_sample_layout(self, df: pd.DataFrame):
+        """Locate the uint16 sample block of every ping in df.
+
+        Returns a mask of pings whose block is complete along with each
+        ping's channel_id, sample count and absolute byte offset, using the
+        same checks as extract_raw_sample_arrays.
+        """
+        n = len(df)
+
+        def column(name):
+            return np.trunc(pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64))
+
+        channel = pd.to_numeric(df['channel_id'], errors='coerce').to_numpy(dtype=np.float64)
+        index = column('index')
+        data_size = column('data_size')
+        sample_cnt = column('sample_cnt' if 'sample_cnt' in df.columns else 'ping_cnt')
+        son_offset = column('son_offset')
+        if 'ping_header_len' in df.columns:
+            header_len = column('ping_header_len')
+        else:
+            header_len = np.full(n, float(self.pingHeaderLen))
 
-            max_len = width or max(len(p) for p in pings)
-            img_arr = np.zeros((len(pings), max_len), dtype=np.uint16)
+        ok = np.isfinite(channel) & np.isfinite(index) & np.isfinite(data_size)
+        ok &= np.isfinite(sample_cnt) & np.isfinite(son_offset) & np.isfinite(header_len)
+        ok &= (index >= 0) & (data_size > 0) & (sample_cnt > 0)
+        ok &= son_offset >= header_len
+        ok &= son_offset + sample_cnt * 2 <= header_len + data_size
 
-            for row_idx, ping in enumerate(pings):
-                n = min(len(ping), max_len)
-                img_arr[row_idx, :n] = ping[:n]
+        start = np.where(ok, index + son_offset, 0).astype(np.int64)
+        count = np.where(ok, sample_cnt, 0).astype(np.int64)
+        ok &= (start >= 0) & (start + count * 2 <= os.path.getsize(self.sonFile))
 
-            scaled = self._scale_samples_for_waterfall(img_arr)
-            image = Image.fromarray(scaled, mode='P')
-            image.putpalette(self._garmin_waterfall_palette())
+        channel = np.where(ok, channel, -1).astype(np.int64)
 
-            stem = prefix or os.path.splitext(os.path.basename(self.sonFile))[0]
-            safe_stem = ''.join(c if c.isalnum() or c in ('-', '_') else '_' for c in stem)
-            out_path = os.path.join(out_dir, f'{safe_stem}_channel_{channel_id}.png')
-            image.save(out_path)
-            out_paths[channel_id] = out_path
+        return ok, channel, count, start
 
-        return out_paths
+    # ======================================================================
+    def _gather_samples(self, buf: np.ndarray, starts: np.ndarray, counts: np.ndarray):
+        """Concatenate the uint16 sample blocks at starts/counts of buf.
+
+        Each ping is copied as one slice into the output, no per-sample
+        index is built.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        nbytes = np.asarray(counts, dtype=np.int64) * 2
+
+        pos = np.zeros(len(nbytes) + 1, dtype=np.int64)
+        np.cumsum(nbytes, out=pos[1:])
+
+        values = np.empty(int(pos[-1]), dtype=np.uint8)
+        for k in range(len(nbytes)):
+            values[pos[k]:pos[k+1]] = buf[starts[k]:starts[k] + nbytes[k]]
+
+        return values.view('<u2')
 
     # ======================================================================
     def write_sonar_data_player_project(self, out_dir: str, include_pngs: bool=True,
@@ -1378,20 +1642,55 @@ class gar(object):
     # ======================================================================
     def _scale_samples_for_waterfall(self, samples: np.ndarray):
         """Compress raw uint16 sonar intensities to an 8-bit palette index."""
-        arr = samples.astype(np.float32)
-        positive = arr[arr > 0]
-        if positive.size == 0:
-            return np.zeros(arr.shape, dtype=np.uint8)
-
-        arr = np.log1p(arr)
-        positive = arr[samples > 0]
-        lo, hi = np.percentile(positive, [1, 99.5])
+        hist = np.bincount(samples[samples > 0].ravel(), minlength=65536)
+        return self._scale_waterfall_strip(samples, self._waterfall_scale_range(hist))
+
+    # ======================================================================
+    def _waterfall_scale_range(self, hist: np.ndarray):
+        """Return the log1p contrast range (1st to 99.5th percentile) of the
+        positive intensities counted in hist, or None if there are none.
+
+        Matches np.percentile over the log1p float32 intensities without
+        materializing them.
+        """
+        values = np.flatnonzero(hist)
+        values = values[values > 0]
+        if values.size == 0:
+            return None
+
+        cum = np.cumsum(hist[values])
+        n = int(cum[-1])
+        logv = np.log1p(values.astype(np.float32))
+
+        def order_stat(k):
+            return logv[np.searchsorted(cum, k, side='right')]
+
+        # Linear interpolation between order statistics as np.percentile
+        q = np.asarray([1, 99.5], dtype=np.float64) / 100
+        virtual = (n - 1) * q
+        prev = np.floor(virtual).astype(np.int64)
+        t = virtual - prev
+        a = order_stat(prev)
+        b = order_stat(np.minimum(prev + 1, n - 1))
+        diff = b - a
+        lo, hi = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
         if hi <= lo:
-            hi = float(positive.max())
-            lo = float(positive.min())
+            hi = float(logv.max())
+            lo = float(logv.min())
         if hi <= lo:
-            return np.zeros(arr.shape, dtype=np.uint8)
+            return None
+
+        return lo, hi
+
+    # ======================================================================
+    def _scale_waterfall_strip(self, samples: np.ndarray, scale_range):
+        """Scale uint16 intensities to palette indices over scale_range."""
+        if scale_range is None:
+            return np.zeros(samples.shape, dtype=np.uint8)
 
+        lo, hi = scale_range
+        arr = np.log1p(samples.astype(np.float32))
         scaled = (arr - lo) * (255.0 / (hi - lo))
         return np.clip(scaled, 0, 255).astype(np.uint8)
 
@@ -1485,40 +1784,42 @@ class gar(object):
         if len(frame_track) == 0:
             return df
 
-        distances = [0.0]
-        speeds = [np.nan]
-        cumulative = [0.0]
+        lat = frame_track['lat'].to_numpy(dtype='float64')
+        lon = frame_track['lon'].to_numpy(dtype='float64')
+        t = frame_track['time_s'].to_numpy(dtype='float64')
 
-        for idx in range(1, len(frame_track)):
-            prev = frame_track.iloc[idx - 1]
-            cur = frame_track.iloc[idx]
-            dist = self._haversineMeters(prev['lat'], prev['lon'], cur['lat'], cur['lon'])
-            dt = float(cur['time_s'] - prev['time_s'])
+        # Distance and speed from each frame to the next
+        dist = np.zeros(len(frame_track))
+        dist[1:] = self._haversineMeters(lat[:-1], lon[:-1], lat[1:], lon[1:])
 
-            distances.append(dist)
-            speeds.append(dist / dt if dt > 0 else np.nan)
-            cumulative.append(cumulative[-1] + dist)
+        dt = np.diff(t)
+        speed = np.full(len(frame_track), np.nan)
+        speed[1:] = np.divide(dist[1:], dt, out=np.full(len(dt), np.nan), where=dt > 0)
 
-        frame_track['dist'] = distances
-        frame_track['speed_ms'] = speeds
-        frame_track['trk_dist'] = cumulative
+        frame_track['dist'] = dist
+        frame_track['speed_ms'] = speed
+        frame_track['trk_dist'] = np.cumsum(dist)
         frame_track['speed_ms'] = frame_track['speed_ms'].interpolate().bfill().ffill().round(2)
 
-        replacements = frame_track.set_index('sequence_cnt')[['dist', 'speed_ms', 'trk_dist']]
-        for column in replacements.columns:
-            df[column] = df['sequence_cnt'].map(replacements[column])
+        # Take each ping's frame values, pings without a frame get NaN
+        frame = pd.Index(frame_track['sequence_cnt']).get_indexer(df['sequence_cnt'])
+        for column in ['dist', 'speed_ms', 'trk_dist']:
+            values = frame_track[column].to_numpy()
+            df[column] = np.where(frame >= 0, values[frame], np.nan)
 
         return df
 
     # ======================================================================
-    def _haversineMeters(self, lat1: float, lon1: float, lat2: float, lon2: float):
+    def _haversineMeters(self, lat1, lon1, lat2, lon2):
+        """Great circle distance in meters, element-wise over arrays."""
         radius_m = 6371000.0
-        p1 = math.radians(float(lat1))
-        p2 = math.radians(float(lat2))
-        dp = math.radians(float(lat2) - float(lat1))
-        dl = math.radians(float(lon2) - float(lon1))
-        a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-        return 2 * radius_m * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        p1 = np.radians(lat1)
+        p2 = np.radians(lat2)
+        dp = np.radians(np.subtract(lat2, lat1))
+        dl = np.radians(np.subtract(lon2, lon1))
+        # float_power rounds like the scalar math.sin(x) ** 2
+        a = np.float_power(np.sin(dp / 2), 2) + np.cos(p1) * np.cos(p2) * np.float_power(np.sin(dl / 2), 2)
+        return 2 * radius_m * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
     
     # ======================================================================
     def _doUnitConversion(self, df: pd.DataFrame):
@@ -1548,7 +1849,9 @@ class gar(object):
         for col in cols_to_convert:
 
             if col in df.columns:
-                df[col] = df[col].apply(lambda x: decode_varint(x) if isinstance(x, bytes) else x)
+                # Depths are decoded while parsing, only raw bytes are left to decode
+                if df[col].dtype == object:
+                    df[col] = df[col].apply(lambda x: decode_varint(x) if isinstance(x, bytes) else x)
                 # Garmin uses sentinel-style out-of-range values in some files.
                 df[col] = df[col].where((df[col] >= 0) & (df[col] < 0xFFFFFF00), np.nan)
                 df[col] = df[col].astype(float) / 1000.0
@@ -1595,8 +1898,8 @@ class gar(object):
         df['lat'] = df['scposn_lat'] * 360 / (1 << 32)
         df['lon'] = df['scposn_lon'] * 360 / (1 << 32)
 
-        df['lat'] = df['lat'].apply(lambda x: x - 360 if x > 180 else x)
-        df['lon'] = df['lon'].apply(lambda x: x - 360 if x > 180 else x)
+        df['lat'] = np.where(df['lat'] > 180, df['lat'] - 360, df['lat'])
+        df['lon'] = np.where(df['lon'] > 180, df['lon'] - 360, df['lon'])
 
         # Do filtering
         df = filterGPS(df)
@@ -41,7 +41,7 @@ SOFTWARE.
 '''
 
 
-import os, sys, struct
+import os, sys, struct, json, time
 import numpy as np
 import pandas as pd
 from array import array as arr
@@ -49,16 +49,67 @@ import pyproj
 import datetime
 
 from .lowrance_class import low
+from .verter_utils import takeSidescanSplit, getCacheDir
+
+# Header structures learned from previously seen SON files, keyed by the
+## spacer byte signature of the ping header
+headRegistryFile = 'Humminbird-Header-Registry.json'
+
+# Bytes read from the start of a SON file to find the first ping header
+headProbeBytes = 200
+
+# Ping header attributes that follow each known spacer byte
+headSpacerFields = {
+    128:[('SP128', '>u1'), ('record_num', '>u4')], #Record Number (Unique for each ping)
+    129:[('SP129', '>u1'), ('time_s', '>u4')], #Time Elapsed milliseconds
+    130:[('SP130', '>u1'), ('utm_e', '>i4')], #UTM X
+    131:[('SP131', '>u1'), ('utm_n', '>i4'),], #UTM Y
+    132:[('SP132', '>u1'), ('gps1', '>u2'), ('instr_heading', '>u2')], #GPS quality flag (?) and heading
+    133:[('SP133', '>u1'), ('gps2', '>u2'), ('speed_ms', '>u2'),], #GPS quality flag (?) & speed in meters/second
+    134:[('SP134', '>u1'), ('unknown_134', '>u4'),], #Unknown
+    135:[('SP135', '>u1'), ('inst_dep_m', '>u4'),], #Depth in centimeters, then converted to meters
+    136:[('SP136', '>u1'), ('unknown_136', '>u4'),], #Unknown
+    137:[('SP137', '>u1'), ('unknown_137', '>u4')], #Unknown
+    138:[('SP138', '>u1'), ('unknown_138', '>u4'),], #Unknown
+    139:[('SP139', '>u1'), ('unknown_139', '>u4'),], #Unkown
+    140:[('SP140', '>u1'), ('unknown_140', '>u4'),], #Unknown
+    141:[('SP141', '>u1'), ('unknown_141', '>u4'),], #Unknown
+    142:[('SP142', '>u1'), ('unknown_142', '>u4'),], #Unknown
+    143:[('SP143', '>u1'), ('unknown_143', '>u4'),], #Unknown
+    80:[('SP80', '>u1'), ('beam', '>u1'),], #Beam number: 0 (50 or 83 kHz), 1 (200 kHz), 2 (SI Poort), 3 (SI Starboard)
+    81:[('SP81', '>u1'), ('volt_scale', '>u1'),], #Volt Scale (?)
+    146:[('SP146', '>u1'), ('f', '>u4'),], #Frequency of beam in hertz
+    83:[('SP83', '>u1'), ('unknown_83', '>u1'),], #Unknown (number of satellites???)
+    84:[('SP84', '>u1'), ('unknown_84', '>u1'),], #Unknown
+    149:[('SP149', '>u1'), ('unknown_149', '>u4'),], #Unknown (magnetic deviation???)
+    86:[('SP86', '>u1'), ('e_err_m', '>u1'),], #Easting variance (+-X error)
+    87:[('SP87', '>u1'), ('n_err_m', '>u1'),], #Northing variance
+    152:[('SP152', '>u1'), ('unknown_152', '>u4'),], #Unknown
+    153:[('SP153', '>u1'), ('unknown_153', '>u4'),], #Unknown
+    154:[('SP154', '>u1'), ('unknown_154', '>u4'),], #Unknown
+    155:[('SP155', '>u1'), ('unknown_155', '>u4'),], #Unknown
+    156:[('SP156', '>u1'), ('unknown_156', '>u4'),], #Unknown
+    157:[('SP157', '>u1'), ('unknown_157', '>u4'),], #Unknown
+    158:[('SP158', '>u1'), ('unknown_158', '>u4'),], #Unknown
+    159:[('SP159', '>u1'), ('unknown_159', '>u4'),], #Unknown
+    160:[('SP160', '>u1'), ('ping_cnt', '>u4'),] #Number of ping values (in bytes)
+    }
+
+# Header registries already loaded in this process, keyed by file path
+_headRegistries = {}
 
 class hum(object):
 
     #===========================================================================
-    def __init__(self, humFile: str, nchunk: int=0, exportUnknown: bool=False):
+    def __init__(self, humFile: str, nchunk: int=0, exportUnknown: bool=False, keepCaltime: bool=False,
+                 headCheck: str='report'):
         
         self.humFile = humFile
         self.sonFile = humFile.split('.DAT')[0]
         self.nchunk = nchunk
         self.exportUnknown = exportUnknown
+        self.keepCaltime = keepCaltime # Single datetime64 'caltime' column instead of 'date' and 'time'
+        self.headCheck = headCheck # Ping header validation: 'off', 'report' or 'resync'
 
         self.head_start_val = 3235818273
         self.head_end_val = 33
@@ -405,6 +456,16 @@ class hum(object):
         self.humDat['wgs'] = "epsg:4326"
 
         # Configure re-projection function
+        self._setTrans()
+
+        return
+
+    def _setTrans(self):
+        '''
+        Set self.trans, the re-projection to the UTM zone in self.humDat['epsg'].
+        Used after the beams were parsed by workers, which only return humDat.
+        '''
+
         self.trans = pyproj.Proj(self.humDat['epsg'])
 
         return
@@ -537,49 +598,164 @@ class hum(object):
         --------------------
         self._getHeadStruct()
         '''
-        
-        # file = open(sonFile, 'rb') # Open sonar file
-        with open(sonFile, 'rb') as file:
-            i = 0 # Counter to track sonar header length
-            foundEnd = False # Flag to track if end of sonar header found
-            while foundEnd is False and i < 200:
-                lastPos = file.tell() # Get current position in file (byte offset from beginning)
-                byte = self._fread_dat(file, 1, 'B') # Decode byte value
-
-                # Check if we found the end of the ping.
-                ## A value of 33 **may** indicate end of ping.
-                ## 67 is the shortest known Humminbird ping header length.
-                if byte[0] == self.head_end_val and lastPos > 65:
-                    # Double check we found the actual end by moving backward -6 bytes
-                    ## to see if value is 160 (spacer preceding number of ping records)
-                    file.seek(-6, 1)
-                    byte = self._fread_dat(file, 1, 'B')
-                    if byte[0] == 160:
-                        foundEnd = True
-                    else:
-                        # Didn't find the end of header
-                        # Move cursor back to lastPos+1
-                        file.seek(lastPos+1)
-                else:
-                    # Haven't found the end
-                    pass
-                i+=1
 
-        # i reaches 200, then we have exceeded known Humminbird header length.
-        ## Set i to 0, then the next sonFile will be checked.
-        if i == 200:
-            i = 0
+        signature, i = self._getHeadSignature(sonFile)
 
-        file.close()
         self.headBytes = i # Store data in class attribute for later use
         return i
-    
-    def _getHeadStruct(self):
+
+    def _getHeadSignature(self, sonFile: str):
+        '''
+        Read the start of the SON file in one buffered read and walk the
+        spacer bytes of the first ping header. Each spacer is followed by the
+        attribute values listed in headSpacerFields, and the header ends with
+        head_end_val right after the ping_cnt attribute (spacer 160).
+
+        -------
+        Returns
+        -------
+        (signature, header_len) where signature is the list of spacer bytes
+        in order. header_len is 0 if the file does not start with a
+        Humminbird ping header or a spacer is not known.
+        '''
+
+        with open(sonFile, 'rb') as file:
+            buf = file.read(headProbeBytes)
+
+        # First four bytes must match known Humminbird ping header
+        if len(buf) < 4 or struct.unpack_from('>I', buf)[0] != self.head_start_val:
+            return [], 0
+
+        signature = []
+        i = 4
+        while i < len(buf):
+            byte = buf[i]
+
+            # End of header follows the ping_cnt attribute
+            if byte == self.head_end_val and signature and signature[-1] == 160:
+                return signature, i + 1
+
+            if byte not in headSpacerFields:
+                print('{} not in sonar header.'.format(byte))
+                print('Offset: {}'.format(i))
+                return signature, 0
+
+            # Skip spacer and its attribute values
+            signature.append(byte)
+            i += np.dtype(headSpacerFields[byte]).itemsize
+
+        return signature, 0
+
+    def _getHeadRegistry(self):
+        '''
+        Load the header structure registry from the user cache directory.
+        Known Humminbird header structures are always included. If the cache
+        directory can't be created, the registry is kept in memory only and
+        the returned path is None.
+        '''
+
+        try:
+            path = os.path.join(getCacheDir(), headRegistryFile)
+        except OSError:
+            path = None
+
+        if path not in _headRegistries:
+            registry = {}
+
+            # Known header structures
+            for header_len in (67, 72, 152):
+                head_struct = self._getHeadStruct(header_len)
+                registry[self._getHeadStructKey(head_struct)] = {
+                    'headBytes': head_struct.itemsize,
+                    'son_struct': head_struct.descr,
+                }
+
+            # Header structures learned from earlier SON files
+            if path is not None and os.path.isfile(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as file:
+                        registry.update(json.load(file))
+                except (OSError, ValueError):
+                    pass
+
+            _headRegistries[path] = registry
+
+        return path, _headRegistries[path]
+
+    def _getHeadStructKey(self, head_struct):
         '''
+        Registry key for a header structure: the spacer bytes in order.
+        '''
+
+        if isinstance(head_struct, np.dtype):
+            head_struct = [int(n[2:]) for n in head_struct.names if n.startswith('SP')]
+
+        return '-'.join(str(b) for b in head_struct)
+
+    def _lookupHeadStruct(self, sonFile: str):
+        '''
+        Determine the ping header structure of a SON file from the spacer
+        byte signature of its first header. Signatures not yet in the
+        registry are decoded with self._decodeHeadStruct() and saved to the
+        registry so later SON files from the same unit are a lookup.
+
+        -------
+        Returns
+        -------
+        Header length in bytes, or 0 if it could not be determined. Sets
+        self.son_struct and self.headBytes.
+        '''
+
+        signature, header_len = self._getHeadSignature(sonFile)
+        if header_len == 0:
+            return 0
+
+        key = self._getHeadStructKey(signature)
+        path, registry = self._getHeadRegistry()
+
+        if key not in registry:
+            head_struct = self._decodeHeadStruct(signature)
+
+            registry[key] = {
+                'headBytes': header_len,
+                'son_struct': head_struct.descr,
+            }
+
+            # Learn the new header structure. Entries written by other
+            ## processes are kept. Only kept in memory without a cache directory.
+            if path is not None:
+                try:
+                    learned = {}
+                    if os.path.isfile(path):
+                        with open(path, 'r', encoding='utf-8') as file:
+                            learned = json.load(file)
+                    learned[key] = registry[key]
+
+                    tmp = '{}.{}.tmp'.format(path, os.getpid())
+                    with open(tmp, 'w', encoding='utf-8') as file:
+                        json.dump(learned, file, indent=2)
+                    os.replace(tmp, path)
+                except (OSError, ValueError):
+                    pass
+
+        entry = registry[key]
+
+        self.son_struct = np.dtype([tuple(f) for f in entry['son_struct']])
+        self.headBytes = entry['headBytes']
+
+        return self.headBytes
+
+    def _getHeadStruct(self, header_len: int=None):
+        '''
+        Known ping header structure for header_len (default
+        self.frame_header_size). Stored in self.son_struct when header_len is
+        not given.
         '''
 
         # Get frame header size
-        header_len = self.frame_header_size
+        store = header_len is None
+        if store:
+            header_len = self.frame_header_size
 
         if header_len == 67:
             headStruct = np.dtype([
@@ -737,178 +913,82 @@ class hum(object):
                 ('head_end', '>u1')
             ])
 
-        self.son_struct = headStruct
+        if store:
+            self.son_struct = headStruct
 
-        return
+        return headStruct
 
-    def _decodeHeadStruct(self, sonFile: str):
+    def _decodeHeadStruct(self, signature: list):
         '''
-        This function attempts to automatically decode the sonar return header
-        structure if self.headValid == FALSE as determined by self._checkHeadStruct().
-        This function will iterate through each byte at the beginning of the
-        sonar file, decode the byte, determine if it matches any known or unknown
-        spacer value (ping attribute 'name') and if it does, store the
-        byte offset.
-
-        ----------
-        Parameters
-        ----------
-        exportUnknown : bool
-            DESCRIPTION - Flag indicating if unknown attributes in ping
-                          should be exported or not.  If a user of PING Mapper
-                          determines what an unkown attribute actually is, please
-                          report using a github issue.
-
-        ----------------------------
-        Required Pre-processing step
-        ----------------------------
-        self._cntHead()
+        Build the sonar return header structure from the spacer byte
+        signature of a ping header (see self._getHeadSignature()). Each
+        spacer value (ping attribute 'name') is expanded to the spacer and
+        attribute fields listed in headSpacerFields.
 
         -------
         Returns
         -------
-        A dictionary with .SON file structure stored in self.headStruct with
-        the following format:
-
-        self.headStruct = {byteVal : [byteIndex, offset, dataLen, name],
-                           ...} where:
-            byteVal == Spacer value (integer) preceding attribute values (i.e. depth);
-            byteIndex == Index indicating position of byteVal;
-            offset == Byte offset for the actual data;
-            dataLen == number of bytes for data (i.e. utm_e is 4 bytes long);
-            name = name of attribute.
-
-        --------------------
-        Next Processing Step
-        --------------------
-        self._checkHeadStruct()
+        Numpy dtype of the ping header, from head_start to head_end.
         '''
 
-        header_len = 0
-        headBytes = 200
-        headStruct = []
-        toCheck = {
-            128:[('SP128', '>u1'), ('record_num', '>u4')], #Record Number (Unique for each ping)
-            129:[('SP129', '>u1'), ('time_s', '>u4')], #Time Elapsed milliseconds
-            130:[('SP130', '>u1'), ('utm_e', '>i4')], #UTM X
-            131:[('SP131', '>u1'), ('utm_n', '>i4'),], #UTM Y
-            132:[('SP132', '>u1'), ('gps1', '>u2'), ('instr_heading', '>u2')], #GPS quality flag (?) and heading
-            133:[('SP133', '>u1'), ('gps2', '>u2'), ('speed_ms', '>u2'),], #GPS quality flag (?) & speed in meters/second
-            134:[('SP134', '>u1'), ('unknown_134', '>u4'),], #Unknown
-            135:[('SP135', '>u1'), ('inst_dep_m', '>u4'),], #Depth in centimeters, then converted to meters
-            136:[('SP136', '>u1'), ('unknown_136', '>u4'),], #Unknown
-            137:[('SP137', '>u1'), ('unknown_137', '>u4')], #Unknown
-            138:[('SP138', '>u1'), ('unknown_138', '>u4'),], #Unknown
-            139:[('SP139', '>u1'), ('unknown_139', '>u4'),], #Unkown
-            140:[('SP140', '>u1'), ('unknown_140', '>u4'),], #Unknown
-            141:[('SP141', '>u1'), ('unknown_141', '>u4'),], #Unknown
-            142:[('SP142', '>u1'), ('unknown_142', '>u4'),], #Unknown
-            143:[('SP143', '>u1'), ('unknown_143', '>u4'),], #Unknown
-            80:[('SP80', '>u1'), ('beam', '>u1'),], #Beam number: 0 (50 or 83 kHz), 1 (200 kHz), 2 (SI Poort), 3 (SI Starboard)
-            81:[('SP81', '>u1'), ('volt_scale', '>u1'),], #Volt Scale (?)
-            146:[('SP146', '>u1'), ('f', '>u4'),], #Frequency of beam in hertz
-            83:[('SP83', '>u1'), ('unknown_83', '>u1'),], #Unknown (number of satellites???)
-            84:[('SP84', '>u1'), ('unknown_84', '>u1'),], #Unknown
-            149:[('SP149', '>u1'), ('unknown_149', '>u4'),], #Unknown (magnetic deviation???)
-            86:[('SP86', '>u1'), ('e_err_m', '>u1'),], #Easting variance (+-X error)
-            87:[('SP87', '>u1'), ('n_err_m', '>u1'),], #Northing variance
-            152:[('SP152', '>u1'), ('unknown_152', '>u4'),], #Unknown
-            153:[('SP153', '>u1'), ('unknown_153', '>u4'),], #Unknown
-            154:[('SP154', '>u1'), ('unknown_154', '>u4'),], #Unknown
-            155:[('SP155', '>u1'), ('unknown_155', '>u4'),], #Unknown
-            156:[('SP156', '>u1'), ('unknown_156', '>u4'),], #Unknown
-            157:[('SP157', '>u1'), ('unknown_157', '>u4'),], #Unknown
-            158:[('SP158', '>u1'), ('unknown_158', '>u4'),], #Unknown
-            159:[('SP159', '>u1'), ('unknown_159', '>u4'),], #Unknown
-            160:[('SP160', '>u1'), ('ping_cnt', '>u4'),] #Number of ping values (in bytes)
-            }
-
-        file = open(sonFile, 'rb') # Open the file
-        lastPos = 0 # Track last position in file
-        head = self._fread_dat(file, 4,'B') # Get first 4 bytes of file
-
-        # If first four bytes match known Humminbird ping header
-        gotHeader = False
-        if head[0] == 192 and head[1] == 222 and head[2] == 171 and head[3] == 33:
-            headStruct.append(('head_start', '>u4'))
-            while lastPos < headBytes - 1:
-                lastPos = file.tell() # Get current position in file
-                byte = self._fread_dat(file, 1, 'B')[0] # Decode the spacer byte
-               
-                if byte == 33:
-                    file.seek(-6, 1)
-                    nextByte = self._fread_dat(file, 1, 'B')[0]
-                    if nextByte == 160:
-                        header_len = lastPos + 1
-                        lastPos = headBytes
-                        headStruct.append(('head_end', '>u1'))
-                
-                else:
-                    if byte in toCheck:
-                        for v in toCheck[byte]:
-                            headStruct.append(v)
-                    else:
-                        print('{} not in sonar header. Terminating.'.format(byte))
-                        print('Offset: {}'.format(file.tell()))
-                        sys.exit()
-                    if byte < 100:
-                        nextByte = 1
-                    else:
-                        nextByte = 4
-                    lastPos = file.tell() + nextByte # Update with current position
-
-                
-                file.seek(lastPos)
-
-        file.close() # Close the file
+        headStruct = [('head_start', '>u4')]
+        for byte in signature:
+            headStruct.extend(headSpacerFields[byte])
+        headStruct.append(('head_end', '>u1'))
 
-        self.son_struct = np.dtype(headStruct) # Store data in class attribute for later use
-        return header_len
+        return np.dtype(headStruct)
 
-    def _parsePingHeader(self, in_file: str, out_file: str):
+    def _getParsePlan(self):
         '''
+        The attributes self._parsePingHeader() needs, so a beam can be parsed
+        by a worker without sending the hum object (and its transformer).
         '''
 
-        # Get file length
-        file_len = os.path.getsize(in_file)
-
-        # Initialize counter
-        i = 0
-        chunk_i = 0
-        chunk = 0
-
-
-        header_dat_all = []
-
-        frame_offset = []
-
-        chunk_id = []
-
-        file = open(in_file, 'rb')
-
-        # Decode ping header
-        while i < file_len:
+        return {
+            'humFile': self.humFile,
+            'nchunk': self.nchunk,
+            'exportUnknown': self.exportUnknown,
+            'keepCaltime': self.keepCaltime,
+            'headCheck': self.headCheck,
+            'frame_header_size': self.frame_header_size,
+            'headBytes': self.headBytes,
+            'son_struct': self.son_struct,
+            'pixM': self.pixM,
+            'tempC': self.tempC,
+            'humDat': dict(self.humDat),
+        }
+
+    def _parsePingHeader(self, in_file: str, out_file: str=None, return_pings: bool=False):
+        '''
+        Decode every ping header in a SON file. Ping offsets are taken from
+        the matching IDX file when it is present and consistent with the
+        SON, otherwise from a walk over the ping_cnt of each header. All
+        headers are then decoded at once from the memory-mapped SON.
 
-            # Get header data at offset i
-            header_dat, cpos = self._getPingHeader(file, i)
+        The ping table is saved to out_file unless it is None. With
+        return_pings, the table is also returned as a third item.
+        '''
 
-            # Add frame offset
-            frame_offset.append(i)
+        # Memory-map the SON file
+        buf = np.memmap(in_file, dtype=np.uint8, mode='r')
 
-            header_dat_all.append(header_dat)
+        # Locate pings with the IDX file, or walk the SON
+        frame_offset = self._getIDXOffsets(in_file, buf)
+        if frame_offset is None:
+            frame_offset = self._getPingOffsets(buf)
 
-            chunk_id.append(chunk)
+        # Make sure every ping header matches the header structure
+        if self.headCheck != 'off':
+            frame_offset = self._validatePingHeaders(in_file, buf, frame_offset)
 
-            # update counter with current position
-            i = cpos
+        # Decode all ping headers at once, without spacers and start/end markers
+        header_dat_all = self._getPingHeaders(buf, frame_offset)
 
-            if chunk_i == self.nchunk:
-                chunk_i = 0
-                chunk += 1
-            else:
-                chunk_i += 1
+        del buf
 
-        header_dat_all = pd.DataFrame.from_dict(header_dat_all)
+        # Chunks of nchunk+1 pings
+        chunk_id = np.arange(len(header_dat_all)) // (self.nchunk + 1)
+        chunk = len(header_dat_all) // (self.nchunk + 1)
 
         # Add in the frame offset
         header_dat_all['index'] = frame_offset
@@ -923,17 +1003,10 @@ class hum(object):
         header_dat_all = self._doUnitConversion(header_dat_all)
         
 
-        # Drop spacer and unknown columns
-        for col in header_dat_all.columns:
-            if 'SP' in col:
-                header_dat_all.drop(col, axis=1, inplace=True)
-
-            if not self.exportUnknown and 'unknown' in col:
-                header_dat_all.drop(col, axis=1, inplace=True)
-
-        # Drop head_start
-        header_dat_all.drop('head_start', axis=1, inplace=True)
-        header_dat_all.drop('head_end', axis=1, inplace=True)
+        # Drop unknown columns
+        if not self.exportUnknown:
+            cols = [c for c in header_dat_all.columns if 'unknown' in c]
+            header_dat_all.drop(columns=cols, inplace=True)
 
         # Update last chunk if too small (for rectification)
         lastChunk = header_dat_all[header_dat_all['chunk_id'] == chunk]
@@ -942,10 +1015,224 @@ class hum(object):
 
 
         # Save to csv
-        header_dat_all.to_csv(out_file, index=False)
+        if out_file is not None:
+            header_dat_all.to_csv(out_file, index=False)
+
+        if return_pings:
+            return self.trans, self.humDat, header_dat_all
 
         return self.trans, self.humDat
     
+    def _getIDXOffsets(self, in_file: str, buf: np.ndarray):
+        '''
+        Load the ping offsets listed in the IDX file next to a SON file.
+        Each IDX record is a big-endian (time, offset) pair. Returns None
+        when there is no IDX or it does not match the SON: offsets must
+        start at 0, each land on a ping header start and each ping must end
+        where the next one starts, the last at the end of the SON.
+        '''
+
+        idx_file = os.path.splitext(in_file)[0] + '.IDX'
+        if not os.path.isfile(idx_file):
+            idx_file = os.path.splitext(in_file)[0] + '.idx'
+            if not os.path.isfile(idx_file):
+                return None
+
+        if os.path.getsize(idx_file) % 8 != 0:
+            return None
+
+        idx = np.fromfile(idx_file, dtype=[('time', '>u4'), ('offset', '>u4')])
+        offsets = idx['offset'].astype(np.int64)
+
+        length = self.frame_header_size
+        if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] + length > len(buf):
+            return None
+        if np.any(np.diff(offsets) <= 0):
+            return None
+
+        # Every offset must be the start of a ping header
+        head_start = self._getHeaderField(buf, offsets, 'head_start')
+        if np.any(head_start != self.head_start_val):
+            return None
+
+        # Pings must be contiguous
+        ends = offsets + length + self._getHeaderField(buf, offsets, 'ping_cnt')
+        if np.any(ends[:-1] != offsets[1:]) or ends[-1] != len(buf):
+            return None
+
+        return offsets
+
+    def _getHeaderField(self, buf: np.ndarray, offsets: np.ndarray, name: str):
+        '''
+        Gather one ping header field at each offset.
+        '''
+
+        dtype, pos = self.son_struct.fields[name][:2]
+
+        idx = offsets[:, None] + (pos + np.arange(dtype.itemsize))
+        field = np.ascontiguousarray(buf[idx]).view(dtype).ravel()
+
+        return field.astype(np.int64)
+
+    def _getPingOffsets(self, buf: np.ndarray, i: int=0):
+        '''
+        Walk the SON from offset i and return the offset of every complete
+        ping header. Only the ping_cnt field of each header is read.
+        '''
+
+        length = self.frame_header_size
+        end = len(buf)
+
+        # Byte position and format of ping_cnt within the header
+        cnt_dtype, cnt_pos = self.son_struct.fields['ping_cnt'][:2]
+        cnt_fmt = '>' + cnt_dtype.char
+
+        offsets = []
+        while i + length <= end:
+            offsets.append(i)
+
+            # Next ping header is after this header and its ping returns
+            i += length + struct.unpack_from(cnt_fmt, buf, i + cnt_pos)[0]
+
+        return np.asarray(offsets, dtype=np.int64)
+
+    def _getHeadSpacers(self):
+        '''
+        Byte position and expected value of head_start, every spacer and
+        head_end in self.son_struct.
+        '''
+
+        pos = []
+        val = []
+        for name in self.son_struct.names:
+            offset = self.son_struct.fields[name][1]
+
+            if name == 'head_start':
+                pos.extend(range(offset, offset + 4))
+                val.extend(struct.pack('>I', self.head_start_val))
+            elif name == 'head_end':
+                pos.append(offset)
+                val.append(self.head_end_val)
+            elif name.startswith('SP'):
+                pos.append(offset)
+                val.append(int(name[2:]))
+
+        return np.asarray(pos, dtype=np.int64), np.asarray(val, dtype=np.uint8)
+
+    def _checkPingHeaders(self, buf: np.ndarray, offsets: np.ndarray, block: int=1<<16):
+        '''
+        Compare the spacer bytes of every ping header at offsets with the
+        values expected from self.son_struct, one array comparison per
+        block of pings. Returns a boolean mask of valid headers.
+        '''
+
+        pos, val = self._getHeadSpacers()
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        ok = offsets + self.frame_header_size <= len(buf)
+        for i in range(0, len(offsets), block):
+            k = np.flatnonzero(ok[i:i+block]) + i
+            ok[k] = (buf[offsets[k, None] + pos] == val).all(axis=1)
+
+        return ok
+
+    def _findPingHeader(self, buf: np.ndarray, i: int, block: int=1<<20):
+        '''
+        Offset of the first valid ping header at or after offset i, or None.
+        Candidates are found by searching for head_start one block at a
+        time, and all candidates in a block are validated at once.
+        '''
+
+        magic = np.frombuffer(struct.pack('>I', self.head_start_val), dtype=np.uint8)
+        end = len(buf) - self.frame_header_size
+
+        while i <= end:
+            b = buf[i:min(i + block, end) + 4]
+            cand = np.flatnonzero((b[:-3] == magic[0]) & (b[1:-2] == magic[1]) & (b[2:-1] == magic[2]) & (b[3:] == magic[3])) + i
+
+            ok = self._checkPingHeaders(buf, cand)
+            if ok.any():
+                return int(cand[np.argmax(ok)])
+
+            i += block
+
+        return None
+
+    def _validatePingHeaders(self, in_file: str, buf: np.ndarray, offsets: np.ndarray):
+        '''
+        Validate the spacer bytes of every ping header and report the first
+        ping that does not match the header structure. With self.headCheck
+        'report', only the pings before it are kept. With 'resync', the SON
+        is searched for the next valid header after the last good ping, the
+        walk resumes from there, and this repeats to the end of the file.
+        '''
+
+        ok = self._checkPingHeaders(buf, offsets)
+        if ok.all():
+            return offsets
+
+        son = os.path.basename(in_file)
+        bad = int(np.argmin(ok))
+        print("\n{}: ping {} at offset {} does not match the {} byte header structure.".format(son, bad, offsets[bad], self.frame_header_size))
+
+        if self.headCheck != 'resync':
+            print("Keeping the first {} pings.".format(bad))
+            return offsets[:bad]
+
+        keep = []
+        while True:
+            keep.append(offsets[:bad])
+            if bad == len(offsets):
+                break
+
+            # Next ping can start right after the last good header
+            if bad > 0:
+                i = int(offsets[bad-1]) + self.frame_header_size
+            else:
+                i = int(offsets[0]) + 1
+
+            i = self._findPingHeader(buf, i)
+            if i is None:
+                print("No valid ping header found after offset {}.".format(offsets[bad]))
+                break
+
+            print("Resynced at offset {}.".format(i))
+
+            # Walk again from the recovered header
+            offsets = self._getPingOffsets(buf, i)
+            ok = self._checkPingHeaders(buf, offsets)
+            bad = len(offsets) if ok.all() else int(np.argmin(ok))
+
+        offsets = np.concatenate(keep)
+        print("Keeping {} pings.".format(len(offsets)))
+
+        return offsets
+
+    def _getPingHeaders(self, buf: np.ndarray, offsets: np.ndarray):
+        '''
+        Decode the ping headers at each offset with one fancy-indexed gather.
+        The bytes are viewed through a projection of self.son_struct without
+        the spacer (SP*) and head_start/head_end fields, so those columns
+        are never built. Columns are widened to int64.
+        '''
+
+        head_struct = self.son_struct
+        length = self.frame_header_size
+
+        # Attribute fields only, at their original offsets
+        names = [n for n in head_struct.names if 'SP' not in n and n not in ('head_start', 'head_end')]
+        head_struct = head_struct[names]
+
+        # Gather header bytes into an (n, length) block and view as structs
+        idx = np.asarray(offsets, dtype=np.int64)[:, None] + np.arange(length)
+        header = np.ascontiguousarray(buf[idx]).view(head_struct).ravel()
+
+        out_dict = {}
+        for name in names:
+            out_dict[name] = header[name].astype(np.int64)
+
+        return pd.DataFrame(out_dict)
+
     def _getPingHeader(self, file, i: int):
 
         # Get necessary attributes
@@ -1024,34 +1311,28 @@ class hum(object):
             df['caltime'] = 0
 
         # Update caltime to timestamp
-        sonTime = []
-        sonDate = []
-        needToFilt = False
-        for t in df['caltime'].to_numpy():
-            try:
-                t = datetime.datetime.fromtimestamp(t)
-                sonDate.append(datetime.datetime.date(t))
-                sonTime.append(datetime.datetime.time(t))
-            except:
-                sonDate.append(-1)
-                sonTime.append(-1)
-                needToFilt = True
-            
+        caltime, valid = self._getLocalTime(df['caltime'].to_numpy(dtype=np.float64))
+
         df = df.drop('caltime', axis=1)
-        df['date'] = sonDate
-        df['time'] = sonTime
+        if self.keepCaltime:
+            df['caltime'] = caltime
+        else:
+            caltime = pd.Series(caltime, index=df.index)
+            df['date'] = caltime.dt.date
+            df['time'] = caltime.dt.time
 
-        if needToFilt:
-            df = df[df['date'] != -1]
-            df = df[df['time'] != -1]
+        if not valid.all():
+            df = df[valid]
 
             df = df.dropna()
 
-        df = df[df['e'] != np.inf]
-        df = df[df['record_num'] >= 0]
+        keep = (df['e'] != np.inf).to_numpy() & (df['record_num'] >= 0).to_numpy()
+
+        lastIdx = df['index'].to_numpy()[keep][-1]
+        keep &= (df['index'] <= lastIdx).to_numpy()
 
-        lastIdx = df['index'].iloc[-1]
-        df = df[df['index'] <= lastIdx]
+        if not keep.all():
+            df = df[keep]
 
         # Calculate along-track distance from 'time's and 'speed_ms'. Approximate distance estimate
         df = self._calcTrkDistTS(df)
@@ -1072,6 +1353,50 @@ class hum(object):
 
         return df
     
+    def _getLocalTime(self, caltime: np.ndarray):
+        '''
+        Convert unix times in seconds to local date/times, as
+        datetime.datetime.fromtimestamp() does for each value. The local
+        UTC offset is looked up once per 15 minutes spanned by the times.
+
+        -------
+        Returns
+        -------
+        (local, valid) where local is datetime64[us] and valid masks times
+        that could be converted. Invalid times are NaT.
+        '''
+
+        # Whole seconds and rounded microseconds, as in fromtimestamp()
+        frac, sec = np.modf(caltime)
+        us = np.round(frac * 1e6)
+
+        valid = np.isfinite(caltime) & (np.abs(caltime) < 1e12)
+
+        local = np.full(len(caltime), np.datetime64('NaT'), dtype='datetime64[us]')
+        if not valid.any():
+            return local, valid
+
+        sec = sec.astype(np.int64, copy=False) if valid.all() else np.where(valid, sec, 0).astype(np.int64)
+
+        # Local UTC offset of each 15 minute bucket (offsets change on these boundaries)
+        bucket, inv = np.unique(sec // 900, return_inverse=True)
+        offset = np.zeros(len(bucket), dtype=np.int64)
+        bucket_ok = np.ones(len(bucket), dtype=bool)
+        for j, b in enumerate(bucket):
+            try:
+                t = datetime.datetime.fromtimestamp(int(b) * 900)
+            except (OSError, OverflowError, ValueError):
+                bucket_ok[j] = False
+                continue
+            offset[j] = (t - datetime.datetime(1970, 1, 1)) // datetime.timedelta(seconds=1) - int(b) * 900
+
+        valid &= bucket_ok[inv]
+
+        usec = (sec + offset[inv]) * 1000000 + np.where(valid, us, 0).astype(np.int64)
+        local[valid] = usec[valid].astype('datetime64[us]')
+
+        return local, valid
+
     def _calcTrkDistTS(self,
                        df: pd.DataFrame):
         '''
@@ -1149,6 +1474,9 @@ class hum(object):
         For unknown attributes, simply adding default value
         from a sample sonar recording...
 
+        Lowrance attributes are the raw frame headers from
+        lowrance._readPingHeaders().
+
         Using the latest (2024) file format.
         frame_header_size == headBytes == 152
         '''
@@ -1166,8 +1494,8 @@ class hum(object):
         df['record_num'] = dfLow.index
 
         # Get time as ms
-        ## Lowrance time in seconds
-        df['time_s'] = ( dfLow['time'] * 1000 ).astype(int)
+        ## Lowrance time in milliseconds
+        df['time_s'] = dfLow['time_s'].astype(int)
 
         # # UTM Easting
         # df['utm_e'] = dfLow['utm_e']
@@ -1190,14 +1518,14 @@ class hum(object):
         # Add gps2 (flag of some sort, unknown.)
         df['gps2'] = 1
 
-        # Speed [m/s to decimeters/second]
-        df['speed_ms'] = ( (dfLow['gps_speed']) * 10 ).astype(int)
+        # Speed [knots to decimeters/second]
+        df['speed_ms'] = ( (dfLow['gps_speed'] * 0.514444) * 10 ).astype(int)
 
         # Unknown 134
         df['unknown_134'] = 0
 
-        # Instrument depth
-        df['inst_dep_m'] = ( ( dfLow['depth_ft'] ) * 10 ).astype(int)
+        # Instrument depth [feet to decimeters]
+        df['inst_dep_m'] = ( ( dfLow['depth_ft'] / 3.2808399 ) * 10 ).astype(int)
 
         # unknown_136
         df['unknown_136'] = 1814532
@@ -1230,7 +1558,7 @@ class hum(object):
         df['volt_scale'] = 0#36
 
         # Frequency
-        df = self._convertLowFrequency(df, dfLow)
+        df = self._convertLowFrequency(df, dfLow, lowrance.frequency_dict)
 
         # unknown_83
         df['unknown_83'] = 18
@@ -1322,11 +1650,11 @@ class hum(object):
         ## and star (3) later..
         beam_xwalk = {0: 0, 1: 1, 2:4, 3:2, 4:3, 5:5}
 
-        dfHum['beam'] = [beam_xwalk.get(i, "unknown") for i in dfLow['channel_type']]
+        dfHum['beam'] = [beam_xwalk.get(i, "unknown") for i in dfLow['survey_type']]
 
         return dfHum
     
-    def _convertLowFrequency(self, dfHum: pd.DataFrame, dfLow: pd.DataFrame):
+    def _convertLowFrequency(self, dfHum: pd.DataFrame, dfLow: pd.DataFrame, frequency_dict: dict):
 
         '''
         Crosswalk Lowrance frequency to Humminbird.
@@ -1345,9 +1673,11 @@ class hum(object):
         frequency_min = {200: 200, 50: 50, 83: 83, 455: 455, 800: 800, 38: 38,
                          28: 28, 170: 130, 120:90, 50: 40, 35: 25}
         
-        dfHum['f'] = [frequency_xwalk[i][0] for i in dfLow['frequency']]
-        dfHum['f_min'] = [frequency_xwalk[i][1] for i in dfLow['frequency']]
-        dfHum['f_max'] = [frequency_xwalk[i][2] for i in dfLow['frequency']]
+        frequency = [frequency_dict.get(i, "unknown") for i in dfLow['frequency_type']]
+
+        dfHum['f'] = [frequency_xwalk[i][0] for i in frequency]
+        dfHum['f_min'] = [frequency_xwalk[i][1] for i in frequency]
+        dfHum['f_max'] = [frequency_xwalk[i][2] for i in frequency]
 
         return dfHum
 
@@ -1365,37 +1695,15 @@ class hum(object):
         '''
         If beam 5 present in lowrance, then port and starboard ss are merged.
         Must be split to export into their own files.
-        '''
-
-        # Get dataframe
-        dfAll = self.header_dat
-
-        # Get beam 5
-        df = dfAll[dfAll['beam'] == 5]
-
-        # Make copies, one for port, other for star
-        port = df.copy()
-        star = df.copy()
 
-        # Re-label beam numbers
-        port['beam'] = 2
-        star['beam'] = 3
-
-        # Divide ping_cnt in half
-        port['ping_cnt'] = (port['ping_cnt'] / 2).astype(int)
-        star['ping_cnt'] = (star['ping_cnt'] / 2).astype(int)
-
-        # Assume left half are port returns and right are starboard
-        # Add additional offset to star the account for this
-        star['son_offset'] += star['ping_cnt']
-
-        # Remove beam 5 from dfAll
-        dfAll = dfAll[dfAll['beam'] != 5]
-
-        # Concatenate df's
-        dfAll = pd.concat([dfAll, port, star], ignore_index=True)
+        Port and star rows are taken from the original table in one pass
+        (see splitSidescanIndex) rather than copied, concatenated and
+        re-sorted.
+        '''
 
-        dfAll.sort_values(by=['time_s', 'beam'], inplace=True)
+        # Take port and star rows in time order, halving ping_cnt
+        ## and moving star past the port half
+        dfAll, _ = takeSidescanSplit(self.header_dat)
 
         self.header_dat = dfAll
 
@@ -1451,7 +1759,7 @@ class hum(object):
         dat['unknown_4'] = 0
 
         # unix_time
-        dat['unix_time'] = dfLow['creation_date_time'][0].item()
+        dat['unix_time'] = dfLow['hardware_time'].iloc[0].item()
 
         # utm_e
         dat['utm_e'] = dfHum['utm_e'][0].item()
@@ -1554,7 +1862,7 @@ class hum(object):
                 ('unix_time', '<u4'),
                 ('utm_e', '<i4'),
                 ('utm_n', '<i4'),
-                ('filename', 12),
+                ('filename', 'S12'),
                 ('numrecords', '<u4'),
                 ('recordlens_ms', '<u4'), 
                 ('linesize', '<u4'),
@@ -1570,29 +1878,20 @@ class hum(object):
                 ('unknown_14', '<i4'),
             ])
             
-        for i in dat_dtype:
-            name = i[0]
-            dtype = i[1]
-
+        # Pack all fields into one record; filename is padded with spaces
+        dat = np.zeros(1, dtype=dat_dtype)
+        for name in dat.dtype.names:
             if name != 'filename':
-                val = np.array(self.dat[name], dtype=dtype)
-
-                with open(self.humFile, 'ab') as file:
-                    file.write(val)
+                dat[name] = self.dat[name]
             else:
-                val = self.dat[name]
-                topad = dtype - len(val)
-                s = 0
-                while s < topad:
-                    val += ' '
-                    s += 1
-                
-                with open(self.humFile, 'a') as f:
-                    f.write(val)
+                dat[name] = self.dat[name].ljust(12).encode()
+
+        with open(self.humFile, 'wb') as file:
+            file.write(dat.tobytes())
 
         return
     
-    def _writeSonfromLow(self, beam: int, header_size: int, lowrance_path: str, flip_port: bool = False):
+    def _getLowSonStruct(self):
 
         '''
         Each ping attribute in the header of a Humminbird SON file
@@ -1602,6 +1901,10 @@ class hum(object):
 
         son_dtype: ([('attribute_name', tag value, attribute_dtype)])
 
+        Attributes with a float tag share the tag of the previous
+        attribute. Returns the header as a structured dtype with the
+        tags as SP fields, and the value of each tag.
+
         *** Big Endian > ***
         '''
 
@@ -1644,7 +1947,44 @@ class hum(object):
             ('ping_cnt', 160, '>u4'),
             ('head_end', 33, '>u1')
             ])
-        
+
+        headStruct = []
+        tags = {}
+        for name, tag_val, dtype in son_dtype:
+            if name == 'head_start' or name == 'head_end':
+                tags[name] = tag_val
+            elif not isinstance(tag_val, float):
+                spacer = 'SP{}'.format(tag_val)
+                headStruct.append((spacer, '>u1'))
+                tags[spacer] = tag_val
+            headStruct.append((name, dtype))
+
+        return np.dtype(headStruct), tags
+
+    def _writeSonfromLow(self, beam: int, header_size: int, lowrance_path: str, flip_port: bool = False):
+
+        '''
+        Write the pings of one beam to its SON and IDX files. See
+        self._getLowBeamPlan() and self._writeLowBeam().
+        '''
+
+        plan = self._getLowBeamPlan(beam, flip_port)
+
+        buf = np.memmap(lowrance_path, dtype=np.uint8, mode='r')
+        result = self._writeLowBeam(plan, buf)
+        del buf
+
+        return result
+
+    def _getLowBeamPlan(self, beam: int, flip_port: bool = False):
+
+        '''
+        Everything needed to write one beam to SON/IDX: the output paths,
+        all ping headers packed at once into the structured dtype from
+        self._getLowSonStruct(), and the location of each ping's returns
+        in the Lowrance log.
+        '''
+
         if beam == 0:
             file_name = self.b000
         elif beam == 1:
@@ -1664,90 +2004,76 @@ class hum(object):
         # Filter df based off beam
         df = df[df['beam'] == beam]
 
-        # Track ping offset
-        offset = 0
-
-        # Get IDX file path
-        idx_file = file_name.replace('SON', 'IDX')
-
-        # Iterate df rows
-        for i, row in df.iterrows():
-
-            # # For IDX
-            # idx = []
-
-            # Convert row to a dictionary
-            row = row.to_dict()
+        # Pack ping headers with tags
+        head_struct, tags = self._getLowSonStruct()
+        header = np.zeros(len(df), dtype=head_struct)
+        for name in head_struct.names:
+            if name in tags:
+                header[name] = tags[name]
+            else:
+                header[name] = np.asarray(df[name].to_numpy()).astype(head_struct[name])
 
-            with open(file_name, 'ab') as file:
-                # Iterate son_dtype
-                for i in son_dtype:
+        return {
+            'beam': beam,
+            'son': file_name,
+            'idx': file_name.replace('SON', 'IDX'),
+            'header': header.view(np.uint8).reshape(len(df), head_struct.itemsize),
+            'start': (df['frame_offset'].to_numpy() + df['son_offset'].to_numpy()).astype(np.int64),
+            'ping_cnt': df['ping_cnt'].to_numpy().astype(np.int64),
+            'time_s': df['time_s'].to_numpy().astype(np.int64),
+            'flip_port': flip_port,
+        }
 
-                    buffer = []
+    def _writeLowBeam(self, plan: dict, buf: np.ndarray):
 
-                    name = i[0]
-                    tag_val = i[1]
-                    dtype = i[2]
+        '''
+        Write a beam plan from self._getLowBeamPlan() to its SON and IDX
+        files. Ping returns are sliced from buf, the memory-mapped Lowrance
+        log, and the SON is written through a single buffered handle. IDX
+        offsets are the running sum of ping lengths. Only uses plan and buf,
+        so beams can be written concurrently.
 
-                    if name == 'head_start' or name == 'head_end':
-                        spacer = np.array(tag_val, dtype=dtype)
-                        val = -9999
-                        a = 0
-                    elif isinstance(tag_val, float):
-                        spacer = -9999
-                        val = np.array(row[name], dtype=dtype)
-                        a = 1
-                    else:
-                        spacer = np.array(tag_val, '>u1')
-                        val = np.array(row[name], dtype=dtype)
-                        a = 2
+        -------
+        Returns
+        -------
+        (beam, number of pings, SON size in bytes, seconds)
+        '''
 
-                    if spacer != -9999:
-                        file.write(spacer)
-                        buffer.append(spacer)
+        start_time = time.time()
 
-                    if val != -9999:
-                        file.write(val)
-                        buffer.append(val)
+        header = plan['header']
+        start = plan['start']
+        ping_cnt = plan['ping_cnt']
+        flip_port = plan['flip_port']
 
-                    del spacer, val
+        # Offset of each ping in the SON file
+        offset = np.zeros(len(header), dtype=np.int64)
+        np.cumsum(header.shape[1] + ping_cnt[:-1], out=offset[1:])
 
-                # Get the ping returns
-                ping_returns = self._getLowPingReturns(lowrance_path, row['frame_offset'], row['son_offset'], row['ping_cnt'])
+        def pings():
+            for k in range(len(header)):
+                yield header[k]
 
+                ping_returns = buf[start[k]:start[k]+ping_cnt[k]]
                 if flip_port:
-                    ping_returns = ping_returns[::-1]
+                    ping_returns = ping_returns[::-1].copy()
 
-                # Write returns to file
-                file.write(ping_returns)
+                yield ping_returns
 
-            # Write time and offset to IDX
-            with open(idx_file, 'ab') as file:
+        with open(plan['son'], 'wb') as file:
+            file.writelines(pings())
 
-                time = np.array(row['time_s'], '>u4')
-                offset = np.array(offset, '>u4')
+        # Write time and offset to IDX
+        idx = np.empty(len(header), dtype=[('time', '>u4'), ('offset', '>u4')])
+        idx['time'] = plan['time_s']
+        idx['offset'] = offset
 
-                file.write(time)
-                file.write(offset)
+        with open(plan['idx'], 'wb') as file:
+            file.write(idx.tobytes())
 
-            # Update offset
-            # Offset just size of IDX?????
-            offset = os.path.getsize(file_name)
-
-    def _getLowPingReturns(self, file: str, offset: int, son_offset: int, length: int):
-
-        # Open file
-        f = open(file, 'rb')
-
-        # Move to position
-        f.seek(offset + son_offset)
-
-        # Get the data
-        buffer = f.read(length)
-
-        f.close()
+        son_size = int(header.size + ping_cnt.sum())
 
-        return buffer
+        return plan['beam'], len(header), son_size, time.time() - start_time
 
     #===========================================================================
     # END Lowrance file to Humminbird
@@ -5,6 +5,8 @@ import numpy as np
 import pandas as pd
 import pyproj
 
+from pingverter.verter_utils import iterPattern, parsePartitioned
+
 
 class jsf(object):
 
@@ -41,44 +43,21 @@ class jsf(object):
         self.datMetaFile = out_file
         return
 
-    def _parsePingHeader(self):
-        rows = []
-
-        with open(self.sonFile, 'rb') as file:
-            file_len = self.file_len
-            i = self.file_header_size
-
-            while i + self.msg_header_size <= file_len:
-                file.seek(i)
-                msg_head = file.read(self.msg_header_size)
-                if len(msg_head) < self.msg_header_size:
-                    break
-
-                marker = struct.unpack_from('<H', msg_head, 0)[0]
-                if marker != 0x1601:
-                    i += 1
-                    continue
-
-                protocol_version = msg_head[2]
-                message_type = struct.unpack_from('<H', msg_head, 4)[0]
-                subsystem_number = msg_head[7]
-                channel = msg_head[8]
-                msg_size = struct.unpack_from('<i', msg_head, 12)[0]
-
-                if msg_size <= 0:
-                    i += 1
-                    continue
-
-                next_i = i + self.msg_header_size + msg_size
-                if next_i > file_len:
-                    break
-
-                if message_type == 80 and msg_size >= self.msg80_header_size:
-                    file.seek(i + self.msg_header_size)
-                    msg80 = file.read(self.msg80_header_size)
-                    rows.append(self._decode_msg80(i, protocol_version, subsystem_number, channel, msg80, msg_size))
-
-                i = next_i
+    def _parsePingHeader(self, n_jobs: int = 1, parallel=None):
+        '''
+        n_jobs : number of byte ranges of the JSF to decode at once. 1 walks
+        the file in this process, -1 uses one range per core.
+
+        parallel : an open joblib Parallel to decode the ranges in.
+        '''
+        if n_jobs == 1:
+            buf = memoryview(np.memmap(self.sonFile, dtype=np.uint8, mode='r'))
+            try:
+                rows, _ = self._walkRecords(buf, self.file_header_size, self.file_len)
+            finally:
+                del buf
+        else:
+            rows = parsePartitioned(self, self.file_header_size, n_jobs, parallel)
 
         df = pd.DataFrame.from_dict(rows)
 
@@ -97,6 +76,84 @@ class jsf(object):
         self.header_dat = df
         return
 
+    def _walkRecords(self, buf, start: int, stop: int):
+        '''
+        Decode the Message Type 80 records chained from start that begin
+        before stop. Returns (rows, offset of the next message at or after
+        stop), or the file length once the chain ends.
+        '''
+        rows = []
+        file_len = self.file_len
+        i = start
+
+        while i < stop and i + self.msg_header_size <= file_len:
+            msg_head = buf[i:i + self.msg_header_size]
+
+            marker = struct.unpack_from('<H', msg_head, 0)[0]
+            if marker != 0x1601:
+                i += 1
+                continue
+
+            protocol_version = msg_head[2]
+            message_type = struct.unpack_from('<H', msg_head, 4)[0]
+            subsystem_number = msg_head[7]
+            channel = msg_head[8]
+            msg_size = struct.unpack_from('<i', msg_head, 12)[0]
+
+            if msg_size <= 0:
+                i += 1
+                continue
+
+            next_i = i + self.msg_header_size + msg_size
+            if next_i > file_len:
+                return rows, file_len
+
+            if message_type == 80 and msg_size >= self.msg80_header_size:
+                msg80 = buf[i + self.msg_header_size:i + self.msg_header_size + self.msg80_header_size]
+                rows.append(self._decode_msg80(i, protocol_version, subsystem_number, channel, msg80, msg_size))
+
+            i = next_i
+
+        return rows, i if i >= stop else file_len
+
+    def _syncRecord(self, buf, pos: int):
+        '''
+        Offset of the first message at or after pos that is followed by
+        another message or the end of the file.
+        '''
+        file_len = self.file_len
+
+        for i in iterPattern(buf, struct.pack('<H', 0x1601), pos):
+            if i + self.msg_header_size > file_len:
+                break
+
+            msg_size = struct.unpack_from('<i', buf, i + 12)[0]
+            next_i = i + self.msg_header_size + msg_size
+            if msg_size <= 0 or next_i > file_len:
+                continue
+
+            if next_i == file_len or (next_i + 2 <= file_len and struct.unpack_from('<H', buf, next_i)[0] == 0x1601):
+                return i
+
+        return file_len
+
+    def _resetWalkState(self):
+        self.humDat = {}
+
+    def _getWalkState(self):
+        return dict(self.humDat)
+
+    def _setWalkState(self, state: dict):
+        # Projection of the last decoded position
+        if 'epsg' not in state:
+            return
+
+        self.humDat.update(state)
+        if state['epsg'] == 'UNKNOWN':
+            self.trans = lambda lon, lat: (lon, lat)
+        else:
+            self.trans = pyproj.Proj(state['epsg'])
+
     def _decode_msg80(self, record_start, protocol_version, subsystem_number, channel, msg80, msg_size):
         time_since_1970 = struct.unpack_from('<i', msg80, 0)[0]
         ping_number = struct.unpack_from('<I', msg80, 8)[0]
@@ -44,9 +44,12 @@ SOFTWARE.
 import json
 import math
 import os
+import struct
 import numpy as np
 import pandas as pd
 
+from pingverter.verter_utils import raggedToRows, writePalettePNG, takeSidescanSplit
+
 try:
     import pyproj
 except ImportError:
@@ -244,17 +247,67 @@ lowCols2PM = {
 
 }
 
+# Tail-follow checkpoint written next to the ping metadata
+checkpointFile = 'Lowrance-Checkpoint.json'
+
+# Sparse time/id index written next to the ping metadata
+sparseIndexFile = 'Lowrance-Sparse-Index.npz'
+
+# Lowrance survey types that feed each PING-Mapper beam
+beamSurveys = {0: [0], 1: [1], 2: [3, 5], 3: [4, 5], 4: [2]}
+
+# Frame header field pointing to the previous frame of each survey type
+surveyPrevOffset = {0: 'prev_primary_offset', 1: 'prev_secondary_offset',
+                    2: 'prev_downscan_offset', 3: 'prev_left_sidescan_offset',
+                    4: 'prev_right_sidescan_offset', 5: 'prev_sidescan_offset'}
+
+class raggedSamples(object):
+    '''
+    Pings of one beam stored as a contiguous values buffer and offsets
+    (CSR layout): ping i is values[offsets[i]:offsets[i+1]]. With
+    expand_to_uint16, uint8 samples are scaled to the full uint16 range
+    only when a ping (or the whole buffer) is requested.
+    '''
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray, expand_to_uint16: bool=False):
+        self.values = values
+        self.offsets = offsets
+        self.expand_to_uint16 = expand_to_uint16
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        ping = self.values[self.offsets[i]:self.offsets[i+1]]
+        if self.expand_to_uint16:
+            ping = ping.astype('<u2') * 257
+        return ping
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def to_uint16(self):
+        return self.values.astype('<u2') * 257
+
 class low(object):
 
-    def __init__(self, inFile: str, nchunk: int=0, exportUnknown: bool=False):
+    def __init__(self, inFile: str, nchunk: int=0, exportUnknown: bool=False, beams: list=None):
 
         '''
+        beams : list of PING-Mapper beam numbers (0-4) to decode. When None,
+        every frame in the log is decoded.
         '''
 
         self.humFile = None
         self.sonFile = inFile
+        self.sonFiles = [inFile] # Consecutive logs of a merged session
         self.nchunk = nchunk
         self.exportUnknown = exportUnknown
+        self.beams = beams
 
         self.file_header_size = 8
 
@@ -277,6 +330,15 @@ class low(object):
                                9: "40kHz_60kHz", 10: "25kHz_45kHz"}
         
         self.son8bit = True
+
+        # Derived state carried across incremental parses
+        self.checkpoint = None
+        self.hardware_time_start = None
+        self.hardware_time_starts = None # Hardware time origin of each log of a merged session
+        self.record_num_start = 0
+
+        # Keep every n-th frame in the sparse time/id index
+        self.index_every = 1000
         
         return
     
@@ -356,43 +418,87 @@ class low(object):
     
     def _parsePingHeader(self):
         '''
+        Decode every frame header in the sonar log.
+
+        The file is memory-mapped, the frame_size chain is walked to locate
+        each frame, and all headers are decoded at once with a single
+        structured view over self.son_struct.
+        '''
+
+        df = self._readPingHeaders()
+
+        self._convertPingHeaders(df)
+
+        return
+
+    def _readPingHeaders(self):
+        '''
+        Locate and decode the raw frame headers of this log without any
+        conversion to PING-Mapper units.
         '''
 
-        # Get the file length
-        file_len = self.file_len
+        # Memory-map the sonar log
+        buf = np.memmap(self.sonFile, dtype=np.uint8, mode='r')
+
+        # Resume after the last frame parsed previously, if checkpointed
+        if self.checkpoint is not None:
+            start = self.checkpoint['next_offset']
+        else:
+            start = self.file_header_size
 
-        # Initialize offset after file header
-        i = self.file_header_size
+        # Locate frames after the file header, only following the requested
+        ## surveys' back-pointer chains when beams were specified
+        if self.beams is not None:
+            offsets, self.next_offset = self._getBeamFrameOffsets(buf, self.beams, start)
+        else:
+            offsets, self.next_offset = self._getFrameOffsets(buf, start)
 
-        # Open the file
-        file = open(self.sonFile, 'rb')
+        # Decode all frame headers at once
+        df = self._getPingHeaders(buf, offsets)
 
-        # Store contents in list
-        header_dat_all = []
+        del buf
 
-        # # counter for testing
-        # test_cnt = 0
+        return df
 
-        # Decode ping header
-        while i < file_len:
+    def _mergePingHeaders(self, dfs: list):
+        '''
+        Combine raw frame headers from consecutive logs of one survey into a
+        single stream. time_s restarts in each log, so frames are ordered by
+        absolute time, each log's hardware time origin plus its time_s, then
+        id. Each table is tagged with the position of its log in
+        self.sonFiles as file_num.
+
+        time_s is rebased to the origin of the first log, so caltime of every
+        log is taken from its own origin and along-track distance continues
+        across logs. Each log's origin is stored in self.hardware_time_starts.
+        '''
 
-            # Get header data at offset i
-            header_dat, cpos = self._getPingHeader(file, i)
+        self.hardware_time_starts = []
+        for file_num, df in enumerate(dfs):
+            df['file_num'] = file_num
+            origin = int(df['hardware_time'].iloc[0]) if len(df) > 0 else None
+            self.hardware_time_starts.append(origin)
 
-            # Store the data
-            header_dat_all.append(header_dat)
+            # Absolute time [ms] of each frame
+            df['time_s'] = df['time_s'].astype(np.int64) + (origin or 0) * 1000
 
-            # Update counter
-            i = cpos
+        df = pd.concat(dfs, ignore_index=True)
 
+        df.sort_values(by=['time_s', 'id', 'file_num'], kind='stable', inplace=True, ignore_index=True)
 
-            # test_cnt += 1
+        # Time since the start of the session [ms]
+        if len(df) > 0:
+            origins = [o for o in self.hardware_time_starts if o is not None]
+            self.hardware_time_start = min(origins)
+            df['time_s'] -= self.hardware_time_start * 1000
 
-            # if test_cnt == 50:
-            #     break
+        return df
 
-        # Convert to dataframe
-        df = pd.DataFrame.from_dict(header_dat_all)
+    def _convertPingHeaders(self, df: pd.DataFrame):
+        '''
+        Convert raw frame headers to PING-Mapper attributes and store them
+        in self.header_dat.
+        '''
 
         # Do unit conversions to PING-Mapper units
         df = self._doUnitConversion(df)
@@ -403,6 +509,21 @@ class low(object):
         # Calculate along-track distance from 'time's and 'speed_ms'. Approximate distance estimate
         df = self._calcTrkDistTS(df)
 
+        # Continue along-track distance from the last checkpointed frame
+        if self.checkpoint is not None and len(df) > 0:
+            ckpt = self.checkpoint
+            df['trk_dist'] += ckpt['trk_dist'] + (df['time_s'].iloc[0] - ckpt['time_s']) * df['speed_ms'].iloc[0]
+
+        # Store last frame time and distance for the next checkpoint
+        if len(df) > 0:
+            self.trk_state = (float(df['time_s'].iloc[-1]), float(df['trk_dist'].iloc[-1]))
+        elif self.checkpoint is not None:
+            self.trk_state = (self.checkpoint['time_s'], self.checkpoint['trk_dist'])
+
+        # Persist a sparse time/id index of a complete parse for windowed reads
+        if self.checkpoint is None and len(self.sonFiles) == 1 and len(df) > 0:
+            self._saveSparseIndex(df)
+
         # Determine beams present
         df = self._convertBeam(df)
 
@@ -414,12 +535,328 @@ class low(object):
 
         # Test file to see outputs
         out_test = os.path.join(self.metaDir, 'All-Lowrance-Sonar-MetaData.csv')
-        df.to_csv(out_test, index=False)
+        if self.checkpoint is not None and os.path.isfile(out_test):
+            df.to_csv(out_test, index=False, mode='a', header=False)
+        else:
+            df.to_csv(out_test, index=False)
 
         self.header_dat = df
 
         return
     
+    def _saveSparseIndex(self, df: pd.DataFrame):
+        '''
+        Save every self.index_every-th frame's offset, time_s, id and
+        along-track distance, plus the per-log state _doUnitConversion
+        derives from the first frame, so read_window can later decode a
+        window of the log without a full parse.
+        '''
+
+        rows = np.arange(0, len(df), max(int(self.index_every), 1))
+
+        beams = self._beamsKey()
+
+        self.sparse_index = sparse_index = {
+            'sonFile': os.path.abspath(self.sonFile),
+            'file_len': os.path.getsize(self.sonFile),
+            'has_beams': beams is not None,
+            'beams': np.asarray(beams or [], dtype=np.int64),
+            'hardware_time_start': self.hardware_time_start,
+            'epsg': self.humDat['epsg'],
+            'index': df['index'].to_numpy()[rows],
+            'time_s': df['time_s'].to_numpy()[rows],
+            'id': df['id'].to_numpy()[rows],
+            'trk_dist': df['trk_dist'].to_numpy()[rows],
+        }
+
+        np.savez(os.path.join(self.metaDir, sparseIndexFile), **sparse_index)
+
+        return
+
+    def _loadSparseIndex(self):
+        '''
+        Load the sparse index saved by a previous parse of this log. Returns
+        None if there is none or it was written for another file, other
+        beams, or the log has since been truncated.
+        '''
+
+        if getattr(self, 'sparse_index', None) is not None:
+            return self.sparse_index
+
+        path = os.path.join(self.metaDir, sparseIndexFile)
+        if not os.path.isfile(path):
+            return None
+
+        with np.load(path) as data:
+            sparse_index = {k: data[k] for k in data.files}
+
+        for k in ('sonFile', 'epsg'):
+            sparse_index[k] = str(sparse_index[k])
+        for k in ('file_len', 'hardware_time_start'):
+            sparse_index[k] = int(sparse_index[k])
+
+        beams = sorted(sparse_index['beams'].tolist()) if bool(sparse_index['has_beams']) else None
+
+        if sparse_index['sonFile'] != os.path.abspath(self.sonFile) or beams != self._beamsKey():
+            return None
+        if sparse_index['file_len'] > os.path.getsize(self.sonFile):
+            return None
+
+        self.sparse_index = sparse_index
+
+        return sparse_index
+
+    def read_window(self, t0: float=None, t1: float=None, id_range: tuple=None):
+        """Decode only the pings with t0 <= time_s <= t1 (seconds) or, with
+        id_range=(id0, id1), with id0 <= id <= id1.
+
+        The sparse index saved next to the ping metadata by the first parse
+        is binary-searched for the frames bracketing the window, and only the
+        frames in between are walked and decoded. Rows match the
+        corresponding rows of a full parse (before beams are split and
+        record_num is assigned). Assumes time_s and id increase along the
+        log. Raises FileNotFoundError if there is no index for this log in
+        self.metaDir, run low2pingmapper first.
+        """
+
+        if getattr(self, 'sparse_index', None) is None and getattr(self, 'metaDir', None) is None:
+            raise ValueError("Set metaDir to the 'meta' directory of a low2pingmapper project before reading a window.")
+
+        sparse_index = self._loadSparseIndex()
+        if sparse_index is None:
+            raise FileNotFoundError("No sparse index for {} in {}. Run low2pingmapper on this log (with the same "
+                                    "beams) to build it.".format(self.sonFile, self.metaDir))
+
+        if id_range is not None:
+            key, col = sparse_index['id'], 'id'
+            lo, hi = id_range
+        else:
+            key, col = sparse_index['time_s'], 'time_s'
+            lo, hi = t0, t1
+        lo = -np.inf if lo is None else lo
+        hi = np.inf if hi is None else hi
+
+        # Indexed frames bracketing the window
+        k0 = max(int(np.searchsorted(key, lo, side='left')) - 1, 0)
+        k1 = int(np.searchsorted(key, hi, side='right'))
+
+        buf = np.memmap(self.sonFile, dtype=np.uint8, mode='r')
+
+        start = int(sparse_index['index'][k0])
+        end = int(sparse_index['index'][k1]) if k1 < len(key) else len(buf)
+
+        # Walk and decode the frames in between
+        offsets, _ = self._getFrameOffsets(buf, start, end)
+        if self.beams is not None:
+            surveys = sorted(set(s for b in self.beams for s in beamSurveys.get(int(b), [])))
+            survey_type = self._getHeaderField(buf, offsets, 'survey_type')
+            offsets = offsets[np.isin(survey_type, surveys)]
+
+        df = self._getPingHeaders(buf, offsets)
+
+        del buf
+
+        # Convert with the state of the full parse
+        self.hardware_time_start = sparse_index['hardware_time_start']
+        self.humDat['epsg'] = sparse_index['epsg']
+
+        df = self._doUnitConversion(df)
+
+        df.rename(columns=self.lowCols2PM, inplace=True)
+
+        df = self._calcTrkDistTS(df, sparse_index['trk_dist'][k0])
+
+        # Keep the window
+        df = df[(df[col] >= lo) & (df[col] <= hi)].reset_index(drop=True)
+
+        df = self._convertBeam(df)
+
+        df = self._convertLowFrequency(df)
+
+        df['son_offset'] = self.frame_header_size
+
+        return df
+
+    def _getFrameOffsets(self, buf: np.ndarray, i: int, end: int=None):
+        '''
+        Walk the frame_size chain starting at offset i and return the offset
+        of every complete frame along with the offset where the walk stopped.
+        Only the frame_size field of each frame is read. A partially written
+        trailing frame is not returned and the walk stops at its offset.
+        '''
+
+        if end is None:
+            end = len(buf)
+
+        length = self.frame_header_size
+
+        # Byte position and format of frame_size within the frame header
+        size_dtype, size_pos = self.son_struct.fields['frame_size'][:2]
+        size_fmt = '<' + size_dtype.char
+
+        offsets = []
+        while i + length <= end:
+            frame_size = struct.unpack_from(size_fmt, buf, i + size_pos)[0]
+
+            # Corrupt or zero-length frame, can't continue the walk
+            if frame_size == 0:
+                break
+
+            # Frame not completely written yet
+            if i + frame_size > end:
+                break
+
+            offsets.append(i)
+            i += frame_size
+
+        return np.asarray(offsets, dtype=np.int64), i
+
+    def _getBeamFrameOffsets(self, buf: np.ndarray, beams: list, start: int=None):
+        '''
+        Return sorted offsets of the frames at or after start feeding the
+        requested PING-Mapper beams, along with the offset following the last
+        complete frame. Starting from the last frame in the log, each
+        requested survey's prev_*_offset chain is followed backward so only
+        frames of those surveys are touched. Falls back to the full
+        frame_size walk when a pointer fails validation.
+        '''
+
+        if start is None:
+            start = self.file_header_size
+
+        surveys = sorted(set(s for b in beams for s in beamSurveys.get(int(b), [])))
+
+        last = self._getLastFrameOffset(buf)
+
+        offsets = []
+        if last is not None and last >= start:
+            for survey in surveys:
+                chain = self._walkSurveyChain(buf, last, survey, start)
+                if chain is None:
+                    offsets = None
+                    break
+                offsets.extend(chain)
+
+        if last is None or offsets is None:
+            # Back-pointers not usable, walk every frame and keep requested surveys
+            offsets, stop = self._getFrameOffsets(buf, start)
+            survey_type = self._getHeaderField(buf, offsets, 'survey_type')
+            return offsets[np.isin(survey_type, surveys)], stop
+
+        if last < start:
+            return np.asarray([], dtype=np.int64), start
+
+        stop = last + self._getHeaderField(buf, [last], 'frame_size')[0]
+
+        return np.unique(np.asarray(offsets, dtype=np.int64)), int(stop)
+
+    def _getLastFrameOffset(self, buf: np.ndarray):
+        '''
+        Find the last complete frame by searching the tail of the log for a
+        position whose frame_offset field equals the position itself.
+        '''
+
+        end = len(buf)
+        length = self.frame_header_size
+
+        # Last complete frame plus a trailing partial frame (frame_size is u2)
+        start = max(self.file_header_size, end - 2*65536 - length)
+        if end - start < length:
+            return None
+
+        # Little-endian u4 at every byte position in the tail
+        w = np.asarray(buf[start:end], dtype=np.int64)
+        vals = w[:-3] | (w[1:-2] << 8) | (w[2:-1] << 16) | (w[3:] << 24)
+        cand = np.nonzero(vals == np.arange(start, end-3))[0] + start
+
+        for i in cand[::-1]:
+            i = int(i)
+            if i + length > end:
+                continue
+            frame_size = self._getHeaderField(buf, [i], 'frame_size')[0]
+            if 0 < frame_size and i + frame_size <= end:
+                return i
+
+        return None
+
+    def _walkSurveyChain(self, buf: np.ndarray, last: int, survey: int, start: int=None):
+        '''
+        Follow the back-pointer chain of one survey type from the last frame
+        down to offset start. Returns None if a pointer does not land on a
+        frame of that survey or does not point backward.
+        '''
+
+        if start is None:
+            start = self.file_header_size
+
+        length = self.frame_header_size
+        end = len(buf)
+
+        fields = self.son_struct.fields
+        ptr_pos = fields[surveyPrevOffset[survey]][1]
+        off_pos = fields['frame_offset'][1]
+        typ_pos = fields['survey_type'][1]
+
+        # Last frame of this survey is either the last frame or its pointer
+        i = last
+        if struct.unpack_from('<H', buf, i + typ_pos)[0] != survey:
+            i = struct.unpack_from('<I', buf, i + ptr_pos)[0]
+
+        offsets = []
+        while start <= i and i + length <= end:
+            # Validate the frame before trusting its pointer
+            if struct.unpack_from('<I', buf, i + off_pos)[0] != i:
+                return None
+            if struct.unpack_from('<H', buf, i + typ_pos)[0] != survey:
+                return None
+
+            offsets.append(i)
+
+            prev = struct.unpack_from('<I', buf, i + ptr_pos)[0]
+            if prev >= i:
+                return None
+            i = prev
+
+        # Pointer past the end of the log, e.g. carried over from another log
+        if i + length > end:
+            return None
+
+        return offsets
+
+    def _getHeaderField(self, buf: np.ndarray, offsets, name: str):
+        '''
+        Gather a single frame header field at each offset.
+        '''
+
+        dtype, pos = self.son_struct.fields[name][:2]
+        idx = np.asarray(offsets, dtype=np.int64)[:, None] + pos + np.arange(dtype.itemsize)
+        return np.ascontiguousarray(buf[idx]).view(dtype).ravel().astype(np.int64)
+
+    def _getPingHeaders(self, buf: np.ndarray, offsets: np.ndarray):
+        '''
+        Decode the frame headers at each offset with one fancy-indexed gather
+        viewed as self.son_struct. Columns are widened to int64 / float64 to
+        match decoding one header at a time.
+        '''
+
+        head_struct = self.son_struct
+        length = self.frame_header_size
+
+        # Gather header bytes into an (n, length) block and view as structs
+        idx = np.asarray(offsets, dtype=np.int64)[:, None] + np.arange(length)
+        header = np.ascontiguousarray(buf[idx]).view(head_struct).ravel()
+
+        out_dict = {}
+        for name in head_struct.names:
+            col = header[name]
+            if col.dtype.kind in 'ui':
+                col = col.astype(np.int64)
+            elif col.dtype.kind == 'f':
+                col = col.astype(np.float64)
+            out_dict[name] = col
+
+        return pd.DataFrame(out_dict)
+
     def _getPingHeader(self, file, i: int):
 
         # Get necessary attributes
@@ -459,9 +896,10 @@ class low(object):
         # Convert speed [knots] to m/s
         df['gps_speed'] *= 0.514444
 
-        # Calculate caltime
-        hardware_time_start = df["hardware_time"][0]
-        df['caltime'] = pd.to_datetime(hardware_time_start + df['time_s'], unit='s')
+        # Calculate caltime, keeping the origin of a previous parse when resuming
+        if self.hardware_time_start is None:
+            self.hardware_time_start = int(df["hardware_time"][0])
+        df['caltime'] = pd.to_datetime(self.hardware_time_start + df['time_s'], unit='s')
 
         df['date'] = df['caltime'].dt.date
         df['time'] = df['caltime'].dt.time
@@ -473,9 +911,13 @@ class low(object):
 
         self.humDat['wgs'] = "EPSG:4326"
 
-        if pyproj is not None and len(df) > 0:
+        # Keep the epsg code of a previous parse (resume or windowed read)
+        known_epsg = self.humDat.get('epsg', self.humDat['wgs']) != self.humDat['wgs']
+
+        if pyproj is not None and (len(df) > 0 or known_epsg):
             # Determine epsg code
-            self.humDat['epsg'] = "EPSG:"+str(int(float(self._convert_wgs_to_utm(df['lon'].iloc[0], df['lat'].iloc[0]))))
+            if not known_epsg:
+                self.humDat['epsg'] = "EPSG:"+str(int(float(self._convert_wgs_to_utm(df['lon'].iloc[0], df['lat'].iloc[0]))))
 
             # Configure re-projection function
             self.trans = pyproj.Proj(self.humDat['epsg'])
@@ -533,14 +975,18 @@ class low(object):
         return epsg_code
 
     def _calcTrkDistTS(self,
-                       df: pd.DataFrame):
+                       df: pd.DataFrame,
+                       trk_dist_start: float=0):
         '''
         Calculate along track distance based on time ellapsed and gps speed.
+        trk_dist_start is the distance of the first ping when df continues
+        a longer stream.
         '''
 
         ts = df['time_s'].to_numpy()
         ss = df['speed_ms'].to_numpy()
         ds = np.zeros((len(ts)))
+        ds[:1] = trk_dist_start
 
         # Offset arrays for faster calculation
         ts1 = ts[1:]
@@ -613,6 +1059,21 @@ class low(object):
         self.header_dat = df
         return
     
+    def _removeUnrequestedBeams(self):
+        '''
+        Keep only the beams requested with self.beams. Needed after
+        _splitLowSS since the combined sidescan feeds both port and star.
+        '''
+
+        if self.beams is None:
+            return
+
+        df = self.header_dat
+        df = df[df['beam'].isin([int(b) for b in self.beams])]
+
+        self.header_dat = df
+        return
+    
     def _removeDownBeams(self):
         '''
         PING-Mapper expects low-frequency (83kHz) stored as beam 0
@@ -643,41 +1104,18 @@ class low(object):
         '''
         If beam 5 present in lowrance, then port and starboard ss are merged.
         Must be split to export into their own files.
-        '''
-
-        # Get dataframe
-        dfAll = self.header_dat
-
-        # Get beam 5
-        df = dfAll[dfAll['beam'] == 5]
-
-        # Make copies, one for port, other for star
-        port = df.copy()
-        star = df.copy()
-
-        # Re-label beam numbers
-        port['beam'] = 2
-        star['beam'] = 3
 
-        # Divide ping_cnt in half
-        port['ping_cnt'] = (port['ping_cnt'] / 2).astype(int)
-        star['ping_cnt'] = (star['ping_cnt'] / 2).astype(int)
-
-        # Assume left half are port returns and right are starboard
-        # Add additional offset to star the account for this
-        star['son_offset'] += star['ping_cnt']
+        Port and star rows are taken from the original table in one pass
+        (see splitSidescanIndex) rather than copied, concatenated and
+        re-sorted.
+        '''
 
-        # Remove beam 5 from dfAll
-        dfAll = dfAll[dfAll['beam'] != 5]
+        # Take port and star rows in time order, halving ping_cnt
+        ## and moving star past the port half
+        dfAll, split = takeSidescanSplit(self.header_dat)
 
         # set min_range to 0
-        port['min_range'] = 0
-        star['min_range'] = 0
-
-        # Concatenate df's
-        dfAll = pd.concat([dfAll, port, star], ignore_index=True)
-
-        dfAll.sort_values(by=['time_s', 'beam'], inplace=True)
+        dfAll['min_range'] = np.where(split, 0, dfAll['min_range'])
 
         self.header_dat = dfAll
 
@@ -695,7 +1133,8 @@ class low(object):
 
         samples_by_channel = {}
 
-        with open(self.sonFile, 'rb') as file:
+        files = [open(f, 'rb') for f in self.sonFiles]
+        try:
             for _, row in df.iterrows():
                 try:
                     channel_id = int(row['beam'])
@@ -703,7 +1142,8 @@ class low(object):
                     sample_count = int(row['ping_cnt'])
                     son_offset = int(row['son_offset'])
                     frame_size = int(row['frame_size'])
-                except (KeyError, TypeError, ValueError):
+                    file = files[int(row.get('file_num', 0))]
+                except (KeyError, TypeError, ValueError, IndexError):
                     continue
 
                 if sample_count <= 0 or son_offset < self.frame_header_size:
@@ -723,37 +1163,98 @@ class low(object):
                     arr = arr.copy()
 
                 samples_by_channel.setdefault(channel_id, []).append(arr)
+        finally:
+            for file in files:
+                file.close()
+
+        return samples_by_channel
+
+    def extract_raw_sample_csr(self, df: pd.DataFrame=None, expand_to_uint16: bool=False):
+        """Return raw Lowrance samples per beam in a ragged (CSR) layout.
+
+        Same pings and order as extract_raw_sample_arrays, but each beam's
+        samples are one contiguous values buffer gathered from the
+        memory-mapped log(s) in a single pass, with ping i spanning
+        values[offsets[i]:offsets[i+1]]. When expand_to_uint16 is True the
+        uint16 scaling is applied per ping on access or all at once with
+        raggedSamples.to_uint16().
+        """
+        if df is None:
+            df = self.header_dat
+
+        ok, count, start, fnum = self._getSampleLayout(df)
+        beam = df['beam'].to_numpy()
+
+        sources = [np.memmap(f, dtype=np.uint8, mode='r') for f in self.sonFiles]
+        samples_by_channel = {}
+        try:
+            for channel_id in pd.unique(beam[ok]):
+                sel = ok & (beam == channel_id)
+                values = self._gatherSamples(sources, start[sel], count[sel], fnum[sel])
+
+                offsets = np.zeros(sel.sum() + 1, dtype=np.int64)
+                np.cumsum(count[sel], out=offsets[1:])
+
+                samples_by_channel[int(channel_id)] = raggedSamples(values, offsets, expand_to_uint16)
+        finally:
+            del sources
 
         return samples_by_channel
 
     def write_channel_waterfall_pngs(self, out_dir: str, df: pd.DataFrame=None,
-                                     prefix: str=None, width: int=None):
-        """Write one Lowrance waterfall PNG per beam and return paths."""
+                                     prefix: str=None, width: int=None, strip_height: int=1024,
+                                     decimate: int=1, tile_height: int=None):
+        """Write one Lowrance waterfall PNG per beam and return paths.
+
+        Pings are gathered from the memory-mapped log strip_height rows at a
+        time and compressed as they arrive, so memory is bounded by one strip
+        rather than the recording. decimate keeps every n-th ping along
+        track. With tile_height, each beam is instead split into numbered
+        PNG tiles of that many rows and the beam maps to a list of paths.
+        """
         from PIL import Image
 
         os.makedirs(out_dir, exist_ok=True)
-        samples_by_channel = self.extract_raw_sample_arrays(df)
-        out_paths = {}
-
-        for channel_id, pings in samples_by_channel.items():
-            if not pings:
-                continue
-
-            max_len = width or max(len(p) for p in pings)
-            img_arr = np.zeros((len(pings), max_len), dtype=np.uint8)
+        if df is None:
+            df = self.header_dat
 
-            for row_idx, ping in enumerate(pings):
-                n = min(len(ping), max_len)
-                img_arr[row_idx, :n] = ping[:n]
+        ok, count, start, fnum = self._getSampleLayout(df)
+        beam = df['beam'].to_numpy()
 
-            image = Image.fromarray(img_arr, mode='P')
-            image.putpalette(self._lowrance_waterfall_palette())
+        stem = prefix or os.path.splitext(os.path.basename(self.sonFile))[0]
+        safe_stem = ''.join(c if c.isalnum() or c in ('-', '_') else '_' for c in stem)
+        palette = self._lowrance_waterfall_palette()
 
-            stem = prefix or os.path.splitext(os.path.basename(self.sonFile))[0]
-            safe_stem = ''.join(c if c.isalnum() or c in ('-', '_') else '_' for c in stem)
-            out_path = os.path.join(out_dir, '{}_channel_{}.png'.format(safe_stem, channel_id))
-            image.save(out_path)
-            out_paths[channel_id] = out_path
+        sources = [np.memmap(f, dtype=np.uint8, mode='r') for f in self.sonFiles]
+        out_paths = {}
+        try:
+            for channel_id in pd.unique(beam[ok]):
+                channel_id = int(channel_id)
+                pings = np.flatnonzero(ok & (beam == channel_id))[::max(int(decimate), 1)]
+
+                max_len = width or int(count[pings].max())
+
+                def strips(rows):
+                    for i in range(0, len(pings), rows):
+                        sel = pings[i:i+rows]
+                        n = np.minimum(count[sel], max_len)
+                        values = self._gatherSamples(sources, start[sel], n, fnum[sel])
+                        yield raggedToRows(values, n, max_len)
+
+                if tile_height:
+                    out_paths[channel_id] = []
+                    for k, tile in enumerate(strips(int(tile_height))):
+                        image = Image.fromarray(tile, mode='P')
+                        image.putpalette(palette)
+                        out_path = os.path.join(out_dir, '{}_channel_{}_{:04d}.png'.format(safe_stem, channel_id, k))
+                        image.save(out_path)
+                        out_paths[channel_id].append(out_path)
+                else:
+                    out_path = os.path.join(out_dir, '{}_channel_{}.png'.format(safe_stem, channel_id))
+                    writePalettePNG(out_path, max_len, len(pings), palette, strips(int(strip_height)))
+                    out_paths[channel_id] = out_path
+        finally:
+            del sources
 
         return out_paths
 
@@ -825,87 +1326,207 @@ class low(object):
         return manifest_path
 
     def write_sonar_data_player_frames(self, samples_path: str, frames_path: str,
-                                       df: pd.DataFrame=None):
-        """Write synchronized frame metadata and uint16-expanded Lowrance samples."""
+                                       df: pd.DataFrame=None, block_samples: int=1<<22):
+        """Write synchronized frame metadata and uint16-expanded Lowrance samples.
+
+        Channel offsets, counts and telemetry are gathered into arrays once,
+        frame means are array reductions across channels and samples are
+        gathered from a memory-mapped log in blocks of about block_samples
+        samples.
+        """
         if df is None:
             df = self.header_dat
 
-        frame_count = 0
-        offset = 0
-
         channel_groups = {
             int(channel_id): group.sort_values('time_s').reset_index(drop=True)
             for channel_id, group in df.groupby('beam', sort=True)
         }
+        channel_ids = list(channel_groups)
         max_frames = max((len(group) for group in channel_groups.values()), default=0)
 
-        with open(self.sonFile, 'rb') as source, open(samples_path, 'wb') as samples, open(frames_path, 'w', encoding='utf-8') as frames:
-            for frame_idx in range(max_frames):
-                channels = []
-                rows = []
-
-                for channel_id, group in channel_groups.items():
-                    if frame_idx >= len(group):
-                        continue
-
-                    row = group.iloc[frame_idx]
-                    try:
-                        sample_count = int(row['ping_cnt'])
-                        frame_size = int(row['frame_size'])
-                        son_offset = int(row['son_offset'])
-                        record_index = int(row['index'])
-                    except (TypeError, ValueError):
-                        continue
-
-                    if sample_count <= 0:
-                        continue
-                    if son_offset < self.frame_header_size:
-                        continue
-                    if son_offset + sample_count > frame_size:
-                        continue
-
-                    source.seek(record_index + son_offset)
-                    raw = source.read(sample_count)
-                    if len(raw) != sample_count:
-                        continue
-
-                    expanded = (np.frombuffer(raw, dtype=np.uint8).astype('<u2') * 257).tobytes()
-                    byte_count = len(expanded)
-                    samples.write(expanded)
+        # (channel, frame) arrays, frame_idx is the position in the channel's time order
+        shape = (len(channel_ids), max_frames)
+        valid = np.zeros(shape, dtype=bool)
+        sample_count = np.zeros(shape, dtype=np.int64)
+        sample_start = np.zeros(shape, dtype=np.int64)
+        file_num = np.zeros(shape, dtype=np.int64)
+        ranges = {key: np.full(shape, None, dtype=object) for key in ('min_range', 'max_range', 'inst_dep_m')}
+
+        telemetry_cols = {'timeSeconds': 'time_s', 'lat': 'lat', 'lon': 'lon',
+                          'speedMetersPerSecond': 'speed_ms', 'trackDistanceMeters': 'trk_dist',
+                          'headingDegrees': 'instr_heading', 'temperatureCelsius': 'tempC'}
+        telemetry_cols = {k: v for k, v in telemetry_cols.items() if v in df.columns}
+        telemetry = {k: np.full(shape, np.nan) for k in telemetry_cols}
+
+        for c, group in enumerate(channel_groups.values()):
+            n = len(group)
+
+            ok, count, start, fnum = self._getSampleLayout(group)
+
+            valid[c, :n] = ok
+            sample_count[c, :n] = count
+            sample_start[c, :n] = start
+            file_num[c, :n] = fnum
+
+            for key in ranges:
+                if key in group.columns:
+                    ranges[key][c, :n] = group[key].to_numpy(dtype=object)
+
+            for key, col in telemetry_cols.items():
+                telemetry[key][c, :n] = pd.to_numeric(group[col], errors='coerce').to_numpy(dtype=np.float64)
+
+        # Frame means over the channels written in each frame, summed in
+        ## channel order to match averaging the rows one frame at a time
+        frame_stats = {}
+        for key, values in telemetry.items():
+            values = np.where(valid & ~np.isnan(values), values, 0.0)
+            n = (valid & ~np.isnan(telemetry[key])).sum(axis=0)
+            total = values[0].copy() if len(values) else np.zeros(max_frames)
+            for c in range(1, len(values)):
+                total += values[c]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                frame_stats[key] = np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+        # Written channels in frame-major order with their sample offsets
+        frame_idx, channel_idx = np.nonzero(valid.T)
+        counts = sample_count[channel_idx, frame_idx]
+        starts = sample_start[channel_idx, frame_idx]
+        files = file_num[channel_idx, frame_idx]
+        byte_offsets = np.zeros(len(counts), dtype=np.int64)
+        np.cumsum(counts[:-1] * 2, out=byte_offsets[1:])
+
+        sources = [np.memmap(f, dtype=np.uint8, mode='r') for f in self.sonFiles]
+        try:
+            with open(samples_path, 'wb') as samples:
+                self._writeExpandedSamples(samples, sources, starts, counts, files, block_samples)
+        finally:
+            del sources
 
-                    channels.append({
-                        'channelId': channel_id,
-                        'sampleOffset': offset,
-                        'sampleCount': sample_count,
-                        'byteLength': byte_count,
-                        'minRangeMeters': self._none_if_nan(row.get('min_range')),
-                        'maxRangeMeters': self._none_if_nan(row.get('max_range')),
-                        'bottomDepthMeters': self._none_if_nan(row.get('inst_dep_m')),
-                    })
-                    offset += byte_count
-                    rows.append(row)
+        frame_count = 0
+        bounds = np.searchsorted(frame_idx, np.arange(max_frames + 1))
 
-                if not channels:
+        with open(frames_path, 'w', encoding='utf-8') as frames:
+            for f in range(max_frames):
+                lo, hi = bounds[f], bounds[f + 1]
+                if lo == hi:
                     continue
 
-                frame_df = pd.DataFrame(rows)
+                channels = []
+                for k in range(lo, hi):
+                    c = channel_idx[k]
+                    channels.append({
+                        'channelId': channel_ids[c],
+                        'sampleOffset': int(byte_offsets[k]),
+                        'sampleCount': int(counts[k]),
+                        'byteLength': int(counts[k]) * 2,
+                        'minRangeMeters': self._none_if_nan(ranges['min_range'][c, f]),
+                        'maxRangeMeters': self._none_if_nan(ranges['max_range'][c, f]),
+                        'bottomDepthMeters': self._none_if_nan(ranges['inst_dep_m'][c, f]),
+                    })
+
                 frame = {
                     'frameIndex': frame_count,
-                    'sequenceCount': frame_idx,
-                    'timeSeconds': self._none_if_nan(frame_df['time_s'].mean()) if 'time_s' in frame_df else None,
-                    'lat': self._none_if_nan(frame_df['lat'].mean()) if 'lat' in frame_df else None,
-                    'lon': self._none_if_nan(frame_df['lon'].mean()) if 'lon' in frame_df else None,
-                    'speedMetersPerSecond': self._none_if_nan(frame_df['speed_ms'].mean()) if 'speed_ms' in frame_df else None,
-                    'trackDistanceMeters': self._none_if_nan(frame_df['trk_dist'].mean()) if 'trk_dist' in frame_df else None,
-                    'headingDegrees': self._none_if_nan(frame_df['instr_heading'].mean()) if 'instr_heading' in frame_df else None,
-                    'temperatureCelsius': self._none_if_nan(frame_df['tempC'].mean()) if 'tempC' in frame_df else None,
-                    'channels': channels,
+                    'sequenceCount': f,
                 }
+                for key in ('timeSeconds', 'lat', 'lon', 'speedMetersPerSecond', 'trackDistanceMeters',
+                            'headingDegrees', 'temperatureCelsius'):
+                    frame[key] = self._none_if_nan(frame_stats[key][f]) if key in frame_stats else None
+                frame['channels'] = channels
+
                 frames.write(json.dumps(frame, separators=(',', ':')) + '\n')
                 frame_count += 1
 
         return frame_count
 
+    def _writeExpandedSamples(self, out, sources: list, starts: np.ndarray, counts: np.ndarray,
+                              files: np.ndarray, block_samples: int):
+        '''
+        Gather uint8 samples at starts/counts from the memory-mapped logs and
+        write them expanded to uint16-le, one contiguous block at a time.
+        '''
+
+        ends = np.cumsum(counts)
+        i = 0
+        while i < len(counts):
+            # Take pings until the block holds about block_samples samples
+            base = ends[i] - counts[i]
+            j = max(int(np.searchsorted(ends, base + block_samples, side='right')), i + 1)
+
+            block = self._gatherSamples(sources, starts[i:j], counts[i:j], files[i:j])
+
+            out.write((block.astype('<u2') * 257).tobytes())
+            i = j
+
+        return
+
+    def _getSampleLayout(self, df: pd.DataFrame):
+        '''
+        Locate the sample payload of every ping in df. Returns a mask of
+        pings whose payload is readable along with each ping's sample count,
+        absolute byte offset and log (file_num). Non-numeric fields, empty
+        payloads, payloads outside the frame and truncated logs are masked.
+        '''
+
+        n = len(df)
+        file_lens = np.asarray([os.path.getsize(f) for f in self.sonFiles], dtype=np.int64)
+
+        def column(name):
+            return np.trunc(pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64))
+
+        count = column('ping_cnt')
+        frame_size = column('frame_size')
+        son_offset = column('son_offset')
+        record_index = column('index')
+        fnum = column('file_num') if 'file_num' in df.columns else np.zeros(n)
+
+        ok = np.isfinite(count) & np.isfinite(frame_size) & np.isfinite(son_offset) & np.isfinite(record_index) & np.isfinite(fnum)
+        ok &= (fnum >= 0) & (fnum < len(file_lens))
+
+        count = np.where(ok, count, 0).astype(np.int64)
+        start = np.where(ok, record_index + son_offset, 0).astype(np.int64)
+        fnum = np.where(ok, fnum, 0).astype(np.int64)
+        son_offset = np.where(ok, son_offset, 0)
+        frame_size = np.where(ok, frame_size, 0)
+
+        ok &= count > 0
+        ok &= son_offset >= self.frame_header_size
+        ok &= son_offset + count <= frame_size
+        ok &= (start >= 0) & (start + count <= file_lens[fnum])
+
+        return ok, count, start, fnum
+
+    def _gatherSamples(self, sources: list, starts: np.ndarray, counts: np.ndarray, files: np.ndarray):
+        '''
+        Concatenate the uint8 payloads at starts/counts of the memory-mapped
+        logs in sources. Each run of pings stored back to back in one log is
+        copied as a single slice into the output, so no per-sample index
+        is built.
+        '''
+
+        starts = np.asarray(starts, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        files = np.asarray(files, dtype=np.int64)
+
+        # Position of each ping in the output
+        pos = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=pos[1:])
+
+        values = np.empty(int(pos[-1]), dtype=np.uint8)
+        if len(counts) == 0:
+            return values
+
+        # A run continues while a ping starts where the previous one ended
+        ends = starts + counts
+        new_run = np.ones(len(counts), dtype=bool)
+        new_run[1:] = (starts[1:] != ends[:-1]) | (files[1:] != files[:-1])
+        first = np.flatnonzero(new_run)
+        last = np.append(first[1:], len(counts)) - 1
+
+        for a, b in zip(first, last):
+            values[pos[a]:pos[b+1]] = sources[files[a]][starts[a]:ends[b]]
+
+        return values
+
     def describe_channel(self, channel_id: int, group: pd.DataFrame=None):
         """Return display metadata for a Lowrance beam."""
         mode_by_beam = {
@@ -1011,11 +1632,74 @@ class low(object):
         # Reset index and recalculate record num
         ## Record num is unique for each ping across all sonar beams
         df = df.reset_index(drop=True)
-        df['record_num'] = df.index
+        df['record_num'] = df.index + self.record_num_start
 
         self.header_dat = df
         return
     
+    def _loadCheckpoint(self):
+        '''
+        Load the tail-follow checkpoint written by a previous parse of this
+        log. The checkpoint is ignored if it was written for another file,
+        other parse options, or if the log has since been truncated.
+        '''
+
+        self.checkpoint = None
+
+        path = os.path.join(self.metaDir, checkpointFile)
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'r', encoding='utf-8') as file:
+            ckpt = json.load(file)
+
+        if ckpt.get('sonFile') != os.path.abspath(self.sonFile):
+            return
+        if ckpt.get('beams') != self._beamsKey() or ckpt.get('exportUnknown') != self.exportUnknown:
+            return
+        if ckpt.get('nchunk') != self.nchunk or ckpt.get('next_offset', 0) > self.file_len:
+            return
+
+        self.checkpoint = ckpt
+        self.hardware_time_start = ckpt['hardware_time_start']
+        self.humDat['epsg'] = ckpt['epsg']
+        self.record_num_start = ckpt['record_cnt']
+
+        return
+
+    def _saveCheckpoint(self):
+        '''
+        Persist the offset after the last fully parsed frame and the state
+        derived from earlier frames so the next parse can pick up from there.
+        '''
+
+        time_s, trk_dist = getattr(self, 'trk_state', (0.0, 0.0))
+
+        ckpt = {
+            'sonFile': os.path.abspath(self.sonFile),
+            'beams': self._beamsKey(),
+            'exportUnknown': self.exportUnknown,
+            'nchunk': self.nchunk,
+            'next_offset': int(self.next_offset),
+            'hardware_time_start': self.hardware_time_start,
+            'epsg': self.humDat.get('epsg'),
+            'time_s': time_s,
+            'trk_dist': trk_dist,
+            'record_cnt': int(self.record_num_start + len(self.header_dat)),
+            'beam_rows': getattr(self, 'beam_rows', {}),
+        }
+
+        path = os.path.join(self.metaDir, checkpointFile)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(ckpt, file, indent=2)
+
+        return
+
+    def _beamsKey(self):
+        if self.beams is None:
+            return None
+        return sorted(int(b) for b in self.beams)
+
     def _splitBeamsToCSV(self):
 
         '''
@@ -1027,6 +1711,10 @@ class low(object):
         # Get df
         df = self.header_dat
 
+        # Rows already written per beam by a previous parse
+        beam_rows = self.checkpoint['beam_rows'] if self.checkpoint is not None else {}
+        self.beam_rows = dict(beam_rows)
+
         # Iterate each beam
         for beam, group in df.groupby('beam'):
             meta = {}
@@ -1042,23 +1730,39 @@ class low(object):
 
             # Store sonFile
             meta['sonFile'] = self.sonFile
+            meta['sonFiles'] = list(self.sonFiles)
+            meta['hardware_time_starts'] = list(self.hardware_time_starts or [self.hardware_time_start])
 
             # Drop columns
             group.drop(columns=['survey_type', 'frequency_type', 'survey', 'frequency'], inplace=True)
 
-            # Add chunk_id
-            group = self._getChunkID(group)
+            # Add chunk_id, continuing from rows already written
+            start = self.beam_rows.get(beam, 0)
+            group = self._getChunkID(group, start)
 
-            # Save csv
+            # Save csv, appending to the output of a previous parse
             outCSV = '{}_{}_meta.csv'.format(beam, meta['beamName'])
             outCSV = os.path.join(self.metaDir, outCSV)
-            group.to_csv(outCSV, index=False)
+            if start > 0 and os.path.isfile(outCSV):
+                group.to_csv(outCSV, index=False, mode='a', header=False)
+            else:
+                group.to_csv(outCSV, index=False)
 
             meta['metaCSV'] = outCSV
 
+            self.beam_rows[beam] = start + len(group)
+
             # Store the beams metadata
             beamMeta[beam] = meta
 
+        # Beams without new pings still point to their existing csv
+        for beam in beam_rows:
+            if beam not in beamMeta:
+                beamName = self._getBeamName(beam)
+                outCSV = os.path.join(self.metaDir, '{}_{}_meta.csv'.format(beam, beamName))
+                beamMeta[beam] = {'beamName': beamName, 'sonFile': self.sonFile, 'sonFiles': list(self.sonFiles),
+                                  'metaCSV': outCSV}
+
 
         return
     
@@ -1081,10 +1785,16 @@ class low(object):
             beamName = 'unknown'
         return beamName
 
-    def _getChunkID(self, df: pd.DataFrame):
+    def _getChunkID(self, df: pd.DataFrame, start: int=0):
 
         df.reset_index(drop=True, inplace=True)
 
+        # Continue chunks after rows written by a previous parse. Earlier
+        ## chunks are already on disk so the last chunk is left as is.
+        if start > 0:
+            df['chunk_id'] = (start + np.arange(len(df))) // self.nchunk
+            return df
+
         df['chunk_id'] = int(-1)
 
         chunk = 0
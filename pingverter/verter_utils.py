@@ -1,7 +1,34 @@
 
 import sys, os
+import copy
+import struct
+import zlib
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+
+def getCacheDir():
+    '''
+    User cache directory for pingverter, created if missing. Set the
+    PINGVERTER_CACHE_DIR environment variable to use another directory.
+    '''
+
+    path = os.environ.get('PINGVERTER_CACHE_DIR')
+
+    if not path:
+        if os.name == 'nt':
+            base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        elif sys.platform == 'darwin':
+            base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'pingverter')
+
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
 
 def filterGPS(df: pd.DataFrame, 
               jump_thresh: float=1):
@@ -49,4 +76,238 @@ def filterGPS(df: pd.DataFrame,
     df.drop(['gps_bad', 'gps_jump_m'], axis=1, inplace=True)
 
 
-    return df
\ No newline at end of file
+    return df
+
+
+def raggedToRows(values: np.ndarray,
+                 lengths: np.ndarray,
+                 width: int):
+    '''
+    Scatter consecutive pings (values split by lengths) into a zero padded
+    (n_pings, width) array. Pings longer than width must already be clipped.
+    '''
+
+    rows = np.zeros((len(lengths), width), dtype=values.dtype)
+
+    row_idx = np.repeat(np.arange(len(lengths)), lengths)
+    col_idx = np.arange(len(values)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows[row_idx, col_idx] = values
+
+    return rows
+
+
+def writePalettePNG(out_path: str,
+                    width: int,
+                    height: int,
+                    palette: list,
+                    strips):
+    '''
+    Write an 8-bit palette PNG from an iterable of uint8 row strips, each
+    (rows, width). Rows are compressed as they arrive so only one strip is
+    held in memory, however tall the image.
+    '''
+
+    def chunk(file, tag, data):
+        file.write(struct.pack('>I', len(data)))
+        file.write(tag)
+        file.write(data)
+        file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xffffffff))
+
+    palette = bytes(bytearray(palette))
+
+    with open(out_path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+
+        # 8-bit depth, color type 3 (palette), no interlace
+        chunk(file, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0))
+        chunk(file, b'PLTE', palette[:len(palette) - len(palette) % 3])
+
+        compressor = zlib.compressobj(6)
+        written = 0
+        for strip in strips:
+            strip = np.ascontiguousarray(strip, dtype=np.uint8)
+
+            # Each scanline starts with filter type 0 (none)
+            lines = np.zeros((strip.shape[0], width + 1), dtype=np.uint8)
+            lines[:, 1:] = strip
+            written += strip.shape[0]
+
+            data = compressor.compress(lines.tobytes())
+            if data:
+                chunk(file, b'IDAT', data)
+
+        if written != height:
+            raise ValueError("Wrote {} of {} PNG rows.".format(written, height))
+
+        chunk(file, b'IDAT', compressor.flush())
+        chunk(file, b'IEND', b'')
+
+    return out_path
+
+
+def splitSidescanIndex(df: pd.DataFrame,
+                       ss_beam: int=5,
+                       port_beam: int=2,
+                       star_beam: int=3):
+    '''
+    Describe the split of a combined sidescan beam into port and starboard
+    as index arrays over df, without copying any rows.
+
+    Returns the rows of df making up the split table in (time_s, beam)
+    order, the beam number of each, the position of each in the table
+    built by concatenating [other beams, port, star] (the split table's
+    index), and a mask of port and star rows. Port and star share the
+    same df row; port keeps the left half of the samples and star the
+    right half.
+    '''
+
+    beam = df['beam'].to_numpy()
+    is_ss = beam == ss_beam
+
+    rest = np.flatnonzero(~is_ss)
+    ss = np.flatnonzero(is_ss)
+
+    rows = np.concatenate([rest, ss, ss])
+    new_beam = np.concatenate([beam[rest],
+                               np.full(len(ss), port_beam, dtype=np.int64),
+                               np.full(len(ss), star_beam, dtype=np.int64)])
+
+    # Sort only the keys to find the row order
+    keys = pd.DataFrame({'time_s': df['time_s'].to_numpy()[rows], 'beam': new_beam})
+    order = keys.sort_values(by=['time_s', 'beam']).index.to_numpy()
+
+    is_port = np.zeros(len(rows), dtype=bool)
+    is_port[len(rest):len(rest)+len(ss)] = True
+    is_star = np.zeros(len(rows), dtype=bool)
+    is_star[len(rest)+len(ss):] = True
+
+    return rows[order], new_beam[order], order, is_port[order], is_star[order]
+
+
+def takeSidescanSplit(df: pd.DataFrame,
+                      ss_beam: int=5):
+    '''
+    Materialize the port/starboard split described by splitSidescanIndex
+    with a single take over df. ping_cnt is halved and star's son_offset
+    moves past the port half.
+    '''
+
+    rows, beam, order, is_port, is_star = splitSidescanIndex(df, ss_beam)
+
+    out = df.take(rows)
+    out.index = order
+
+    split = is_port | is_star
+
+    out['beam'] = beam
+
+    ping_cnt = out['ping_cnt'].to_numpy()
+    half = (ping_cnt / 2).astype(int)
+    out['ping_cnt'] = np.where(split, half, ping_cnt)
+    out['son_offset'] = out['son_offset'].to_numpy() + np.where(is_star, half, 0)
+
+    return out, split
+
+
+def iterPattern(buf,
+                pattern: bytes,
+                start: int=0,
+                block: int=1<<20):
+    '''
+    Yield every offset at or after start where pattern occurs in buf, in
+    order. buf is searched one block at a time, so stopping early only
+    touches the blocks read so far.
+    '''
+
+    data = np.frombuffer(buf, dtype=np.uint8)
+    pat = np.frombuffer(pattern, dtype=np.uint8)
+    n = len(data) - len(pat) + 1
+
+    for s in range(max(start, 0), max(n, 0), block):
+        b = data[s:min(s + block, n) + len(pat) - 1]
+        cand = np.flatnonzero(b[:len(b) - len(pat) + 1] == pat[0])
+        for k in range(1, len(pat)):
+            cand = cand[b[cand + k] == pat[k]]
+        for c in cand:
+            yield s + int(c)
+
+
+def parsePartitioned(sonObj,
+                     first: int,
+                     n_jobs: int=-1,
+                     parallel: Parallel=None):
+    '''
+    Decode the ping records of sonObj.sonFile with the file split into
+    n_jobs byte ranges decoded at once, by default one per core.
+
+    sonObj walks its chain of records with _walkRecords(buf, start, stop)
+    and finds a record boundary from any offset with _syncRecord(buf, pos).
+    Each range after the first is walked from the first record found at or
+    after its start, and keeps the records starting inside the range. The
+    walk of a range must meet the offset the previous walk left its range
+    at. Where it does not, that range is walked again here, so the rows
+    always equal a single walk of the file from first.
+
+    What the walk leaves on sonObj is carried back from the workers with
+    _resetWalkState, _getWalkState and _setWalkState.
+
+    parallel : an open joblib Parallel to run the ranges in, defaults to
+    processes.
+    '''
+
+    n = effective_n_jobs(n_jobs)
+    bounds = [int(b) for b in np.linspace(first, sonObj.file_len, n + 1)]
+
+    if parallel is None:
+        parallel = Parallel(n_jobs=n, backend='loky')
+
+    parts = parallel(delayed(_walkPartition)(sonObj, bounds[k], bounds[k+1], k > 0) for k in range(n))
+
+    buf = memoryview(np.memmap(sonObj.sonFile, dtype=np.uint8, mode='r'))
+
+    rows = []
+    pos = first
+    try:
+        for (sync, part_rows, exit, state), stop in zip(parts, bounds[1:]):
+            if pos != sync:
+                # Follow the chain from where the previous range was left
+                walk_rows, pos = sonObj._walkRecords(buf, pos, min(sync, stop))
+                rows.extend(walk_rows)
+
+                if pos != sync:
+                    # Chain does not pass through this range's walk, redo it
+                    walk_rows, pos = sonObj._walkRecords(buf, pos, stop)
+                    rows.extend(walk_rows)
+                    continue
+
+            rows.extend(part_rows)
+            sonObj._setWalkState(state)
+            pos = exit
+    finally:
+        del buf
+
+    return rows
+
+
+def _walkPartition(sonObj,
+                   start: int,
+                   stop: int,
+                   sync: bool=True):
+    '''
+    Walk the records of one byte range on a copy of sonObj. Returns the
+    offset walked from, the rows, the offset the walk left the range at and
+    the walk state.
+    '''
+
+    sonObj = copy.copy(sonObj)
+    sonObj._resetWalkState()
+
+    buf = memoryview(np.memmap(sonObj.sonFile, dtype=np.uint8, mode='r'))
+    try:
+        if sync:
+            start = sonObj._syncRecord(buf, start)
+        rows, exit = sonObj._walkRecords(buf, start, stop)
+    finally:
+        del buf
+
+    return start, rows, exit, sonObj._getWalkState()
@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 import pyproj
 
+from pingverter.verter_utils import iterPattern, parsePartitioned
+
 
 class xtf(object):
 
@@ -94,39 +96,21 @@ class xtf(object):
 
         return chaninfo
 
-    def _parsePingHeader(self):
-        with open(self.sonFile, 'rb') as file:
-            file_len = self.file_len
-            i = self.file_header_size
-            rows = []
-
-            while i + self.ping_header_size <= file_len:
-                file.seek(i)
-                header = file.read(self.ping_header_size)
-
-                if len(header) < self.ping_header_size:
-                    break
-
-                magic = struct.unpack_from('<H', header, 0)[0]
-                if magic != 0xFACE:
-                    i += 1
-                    continue
-
-                header_type = header[2]
-                num_chans_to_follow = struct.unpack_from('<H', header, 4)[0]
-                num_bytes_this_record = struct.unpack_from('<I', header, 10)[0]
-
-                if num_bytes_this_record <= 0:
-                    i += 1
-                    continue
-
-                if i + num_bytes_this_record > file_len:
-                    break
-
-                if header_type == 0 and num_chans_to_follow > 0:
-                    rows.extend(self._parse_sonar_record(i, header, num_chans_to_follow, num_bytes_this_record, file))
+    def _parsePingHeader(self, n_jobs: int = 1, parallel=None):
+        '''
+        n_jobs : number of byte ranges of the XTF to decode at once. 1 walks
+        the file in this process, -1 uses one range per core.
 
-                i += num_bytes_this_record
+        parallel : an open joblib Parallel to decode the ranges in.
+        '''
+        if n_jobs == 1:
+            buf = memoryview(np.memmap(self.sonFile, dtype=np.uint8, mode='r'))
+            try:
+                rows, _ = self._walkRecords(buf, self.file_header_size, self.file_len)
+            finally:
+                del buf
+        else:
+            rows = parsePartitioned(self, self.file_header_size, n_jobs, parallel)
 
         df = pd.DataFrame.from_dict(rows)
 
@@ -150,6 +134,83 @@ class xtf(object):
         self.header_dat = df
         return
 
+    def _walkRecords(self, buf, start: int, stop: int):
+        '''
+        Decode the sonar packets chained from start that begin before stop.
+        Returns (rows, offset of the next packet at or after stop), or the
+        file length once the chain ends.
+        '''
+        rows = []
+        file_len = self.file_len
+        i = start
+
+        while i < stop and i + self.ping_header_size <= file_len:
+            header = buf[i:i + self.ping_header_size]
+
+            magic = struct.unpack_from('<H', header, 0)[0]
+            if magic != 0xFACE:
+                i += 1
+                continue
+
+            header_type = header[2]
+            num_chans_to_follow = struct.unpack_from('<H', header, 4)[0]
+            num_bytes_this_record = struct.unpack_from('<I', header, 10)[0]
+
+            if num_bytes_this_record <= 0:
+                i += 1
+                continue
+
+            if i + num_bytes_this_record > file_len:
+                return rows, file_len
+
+            if header_type == 0 and num_chans_to_follow > 0:
+                rows.extend(self._parse_sonar_record(i, header, num_chans_to_follow, num_bytes_this_record, buf))
+
+            i += num_bytes_this_record
+
+        return rows, i if i >= stop else file_len
+
+    def _syncRecord(self, buf, pos: int):
+        '''
+        Offset of the first packet at or after pos that is followed by
+        another packet or the end of the file.
+        '''
+        file_len = self.file_len
+
+        for i in iterPattern(buf, struct.pack('<H', 0xFACE), pos):
+            if i + self.ping_header_size > file_len:
+                break
+
+            next_i = i + struct.unpack_from('<I', buf, i + 10)[0]
+            if next_i == i or next_i > file_len:
+                continue
+
+            if next_i == file_len or (next_i + 2 <= file_len and struct.unpack_from('<H', buf, next_i)[0] == 0xFACE):
+                return i
+
+        return file_len
+
+    def _resetWalkState(self):
+        self.humDat = {}
+        self.sample_dtype = None
+
+    def _getWalkState(self):
+        return {'humDat': dict(self.humDat), 'sample_dtype': self.sample_dtype}
+
+    def _setWalkState(self, state: dict):
+        # Projection of the last decoded position
+        if 'epsg' in state['humDat']:
+            self.humDat.update(state['humDat'])
+            if state['humDat']['epsg'] == 'UNKNOWN':
+                self.trans = lambda lon, lat: (lon, lat)
+            else:
+                self.trans = pyproj.Proj(state['humDat']['epsg'])
+
+        # Sample type of the last decoded channel
+        if state['sample_dtype'] is not None:
+            self.sample_dtype = state['sample_dtype']
+            self.son8bit = self.sample_dtype == '>u1'
+
     def _split_combined_sidescan(self, df: pd.DataFrame):
         return self._split_combined_sidescan_group(df)
 
@@ -361,7 +422,7 @@ class xtf(object):
 
         return None
 
-    def _parse_sonar_record(self, record_start: int, header: bytes, num_chans_to_follow: int, record_bytes: int, file):
+    def _parse_sonar_record(self, record_start: int, header: bytes, num_chans_to_follow: int, record_bytes: int, buf):
         year = struct.unpack_from('<H', header, 14)[0]
         month = header[16]
         day = header[17]
@@ -400,8 +461,7 @@ class xtf(object):
                 break
 
             chan_off = self.ping_header_size + (chan_idx * self.ping_chan_header_size)
-            file.seek(record_start + chan_off)
-            chan_header = file.read(self.ping_chan_header_size)
+            chan_header = buf[record_start + chan_off:record_start + chan_off + self.ping_chan_header_size]
 
             if len(chan_header) < self.ping_chan_header_size:
                 break
@@ -0,0 +1,343 @@
+'''
+Writers for small synthetic sonar logs, used by the tests to round-trip the
+parsers. Values are random but reproducible from the seed.
+'''
+
+import os
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from pingverter import low2hum
+from pingverter.lowrance_class import sl2Struct, sl3Struct
+
+
+#===========================================================================
+def make_lowrance(path: str, pings: int=200, seed: int=0, hardware_time: int=1700000000,
+                  surveys: tuple=(0, 1, 2, 5)):
+    '''
+    SL2/SL3 log (by extension) cycling through the given surveys. time_s
+    starts near 0 and hardware_time counts from the given origin.
+    '''
+
+    ext = path.rsplit('.', 1)[-1].lower()
+    dtype = sl3Struct if ext == 'sl3' else sl2Struct
+    rng = np.random.default_rng(seed)
+
+    prev_keys = {0: 'prev_primary_offset', 1: 'prev_secondary_offset', 2: 'prev_downscan_offset',
+                 3: 'prev_left_sidescan_offset', 4: 'prev_right_sidescan_offset', 5: 'prev_sidescan_offset'}
+    freqs = {0: 2, 1: 0, 2: 3, 3: 3, 4: 3, 5: 3}
+
+    out = bytearray(b'\x02\x00\x01\x00\x00\x0c\x00\x00')
+    last = {}
+    t = 0
+    for k in range(pings):
+        survey = surveys[k % len(surveys)]
+        packet_size = int(rng.integers(50, 120)) * 2
+        t += int(rng.integers(10, 40))
+
+        h = np.zeros(1, dtype=dtype)
+        h['frame_offset'] = len(out)
+        for s, name in prev_keys.items():
+            h[name] = last.get(s, 0)
+        h['frame_size'] = dtype.itemsize + packet_size
+        h['survey_type'] = survey
+        h['packet_size'] = packet_size
+        h['id'] = k // len(surveys)
+        h['max_range'] = 100 + rng.random()
+        h['frequency_type'] = freqs[survey]
+        h['hardware_time'] = hardware_time + t // 1000
+        h['depth_ft'] = 10 + rng.random()
+        h['gps_speed'] = 3 + rng.random()
+        h['water_temperature'] = 15 + rng.random()
+        h['utm_e'] = -9000000 + k
+        h['utm_n'] = 4000000 + k
+        h['track_cog'] = rng.random()
+        h['heading'] = rng.random()
+        h['time_s'] = t
+
+        last[survey] = len(out)
+        out += h.tobytes() + rng.integers(0, 256, packet_size, dtype=np.uint8).tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+    return path
+
+
+#===========================================================================
+def read_lowrance_frames(path: str):
+    '''
+    Reference decode of the frame headers of an SL2/SL3 log, reading one
+    frame at a time along the frame_size chain. A partly written trailing
+    frame is left out.
+    '''
+
+    ext = path.rsplit('.', 1)[-1].lower()
+    dtype = sl3Struct if ext == 'sl3' else sl2Struct
+    data = open(path, 'rb').read()
+
+    rows = []
+    i = 8
+    while i + dtype.itemsize <= len(data):
+        h = np.frombuffer(data, dtype=dtype, count=1, offset=i)[0]
+        if i + int(h['frame_size']) > len(data):
+            break
+        rows.append({name: h[name].item() for name in dtype.names})
+        i += int(h['frame_size'])
+
+    return pd.DataFrame(rows)
+
+
+#===========================================================================
+def make_humminbird(out_dir: str, pings: int=400, seed: int=0):
+    '''
+    Humminbird recording (DAT and SON/IDX files) converted from a synthetic
+    SL2 log. Returns the DAT path.
+    '''
+
+    os.makedirs(out_dir, exist_ok=True)
+    sl2 = make_lowrance(os.path.join(out_dir, 'Log.sl2'), pings=pings, seed=seed)
+
+    # low2hum saves its ping table to the working directory
+    humFile = os.path.join(out_dir, 'R00001.DAT')
+    cwd = os.getcwd()
+    os.chdir(out_dir)
+    try:
+        low2hum(sl2, humFile)
+    finally:
+        os.chdir(cwd)
+
+    return humFile
+
+
+#===========================================================================
+def _varuint(v: int):
+    out = bytearray()
+    while True:
+        b = v & 0x7F
+        v >>= 7
+        if not v:
+            out.append(b)
+            return bytes(out)
+        out.append(b | 0x80)
+
+
+def _var_struct(fields: list):
+    out = _varuint(len(fields))
+    for num, raw in fields:
+        if len(raw) < 7:
+            out += _varuint((num << 3) | len(raw)) + raw
+        else:
+            out += _varuint((num << 3) | 7) + _varuint(len(raw)) + raw
+    return out
+
+
+def _garmin_file_header(channels: list, magic: int):
+    h = bytearray([6]) + b'\x04' + struct.pack('<I', magic) + b'\x0a' + struct.pack('<H', 20)
+    h += b'\x14' + struct.pack('<I', len(channels)) + b'\x19' + bytes([8])
+    info = (bytes([4]) + b'\x02' + struct.pack('<H', 510) + b'\x0c' + struct.pack('<I', 123)
+            + b'\x12' + struct.pack('<H', 2345) + b'\x1c' + struct.pack('<I', 1000000000))
+    h += b'\x2f' + bytes([len(info)]) + info
+
+    chan_info = _varuint(len(channels))
+    for ch in channels:
+        data_info = _varuint(1) + _varuint(len(_varuint(ch))) + _varuint(ch)
+        freq = _var_struct([(1, _varuint(455000)), (2, _varuint(800000 + ch))])
+        props = _var_struct([(0, _varuint(ch % 3)), (1, freq), (2, _varuint(7))])
+        chan_info += _var_struct([(0, data_info), (1, struct.pack('<Q', 20480)),
+                                  (2, _varuint(1) + _varuint(len(props)) + props)])
+    h += _varuint((6 << 3) | 7) + _varuint(len(chan_info)) + chan_info
+
+    return bytes(h) + bytes(20480 - len(h))
+
+
+def _garmin_record(rng, magic: int, seq: int, t: int, ch: int, state: int, lat: int, lon: int):
+    body = b''
+    values = None
+    if state == 2:
+        cnt = int(rng.integers(20, 200))
+        depth = int(rng.integers(500, 20000))
+        last = int(rng.integers(20000, 60000))
+        gain = int(rng.integers(0, 100))
+        temp = float(np.float32(rng.uniform(5, 25)))
+        fields = [(0, _varuint(ch)), (1, _varuint(depth << 1)),
+                  (2, _varuint(int(rng.integers(500, 20000)))), (3, _varuint(0)),
+                  (4, _varuint(last << 1)), (5, bytes([gain])),
+                  (6, _varuint(1)), (7, struct.pack('<I', cnt)), (8, b'\x01'),
+                  (9, struct.pack('<i', lat)), (10, struct.pack('<i', lon)),
+                  (11, struct.pack('<f', temp)), (12, _varuint(ch % 4 + 1))]
+        # Decoded values, depths in meters and times in seconds
+        values = {'channel_id': ch, 'sequence_cnt': seq, 'time_s': t / 1000, 'ping_cnt': cnt,
+                  'inst_dep_m': depth / 1000, 'min_range': 0.0, 'max_range': last / 1000, 'gain': gain,
+                  'scposn_lat': lat, 'scposn_lon': lon, 'tempC': temp, 'beam': ch % 4 + 1,
+                  'interrogation_id': seq * 37 if seq % 5 == 0 else np.nan}
+        if ch % 2:
+            su2 = _var_struct([(0, struct.pack('<f', -1.0 if ch % 4 == 1 else 1.0))])
+            fields.append((13, _var_struct([(0, b'\x10'), (1, b'\x20'), (2, b'\x05'), (3, b'\x06'), (5, su2)])))
+        if seq % 5 == 0:
+            fields.append((14, _varuint(seq * 37)))
+        body = _var_struct(fields) + rng.integers(0, 256, cnt * 2, dtype=np.uint8).tobytes()
+
+    chan = _varuint(ch)
+    state_data = _var_struct([(0, _varuint(state)), (1, _varuint(1) + _varuint(len(chan)) + chan)])
+    header = _var_struct([(0, struct.pack('<I', magic)), (1, state_data), (2, struct.pack('<I', seq)),
+                          (3, struct.pack('<I', zlib.crc32(body))), (4, struct.pack('<H', len(body))),
+                          (5, struct.pack('<I', t))])
+
+    record = header + struct.pack('<I', zlib.crc32(header)) + body + struct.pack('<III', 0xF98EACBC, len(body), 0)
+
+    return record, values
+
+
+def make_garmin(path: str, pings: int=400, seed: int=0, junk: bool=False, values: list=None):
+    '''
+    RSD with four interleaved channels and valid header and data CRCs.
+    With junk, garbage bytes and state 1 records are inserted between
+    records so the parser has to resync. The decoded values of each ping
+    are appended to values, if given.
+    '''
+
+    from pingverter import gar
+
+    rng = np.random.default_rng(seed)
+    magic = gar(path).magicNum
+    channels = [0, 1, 2, 3]
+    lat0 = int(35.0 / 360 * (1 << 32))
+    lon0 = int(-80.0 / 360 * (1 << 32))
+
+    out = bytearray(_garmin_file_header(channels, magic))
+    out += _garmin_record(rng, magic, 0, 0, 0, 1, 0, 0)[0]
+    t = 0
+    for k in range(pings):
+        seq = k // len(channels)
+        t += int(rng.integers(10, 40))
+        record, ping = _garmin_record(rng, magic, seq, t, channels[k % len(channels)], 2,
+                                      lat0 + seq * 50 + int(rng.integers(-3, 3)), lon0 + seq * 40)
+        out += record
+        if values is not None:
+            values.append(ping)
+        if junk and k % 97 == 50:
+            out += rng.integers(0, 256, int(rng.integers(1, 300)), dtype=np.uint8).tobytes()
+        if junk and k % 211 == 7:
+            out += _garmin_record(rng, magic, seq, t, 0, 1, 0, 0)[0]
+    out += _garmin_record(rng, magic, pings, t, 0, 1, 0, 0)[0]
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+    return path
+
+
+#===========================================================================
+def make_jsf(path: str, pings: int=2000, seed: int=0, junk: bool=False):
+    '''
+    JSF with sonar data messages (type 80) on two channels, alternating low
+    and high frequency subsystems. With junk, messages of another type and
+    garbage bytes are inserted between pings.
+    '''
+
+    rng = np.random.default_rng(seed)
+    header = '<HBBHBBBBHi'
+
+    out = bytearray()
+    for k in range(pings):
+        samples = int(rng.integers(100, 400))
+
+        m = bytearray(240)
+        struct.pack_into('<i', m, 0, 1600000000 + k // 4)
+        struct.pack_into('<I', m, 8, k)
+        struct.pack_into('<H', m, 30, (1 << 9) | (1 << 6))
+        struct.pack_into('<i', m, 80, int(-80.0 * 600000 + k * 3))
+        struct.pack_into('<i', m, 84, int(35.0 * 600000 + k * 2))
+        struct.pack_into('<h', m, 88, 2 if k % 50 else 1)
+        struct.pack_into('<H', m, 114, samples)
+        struct.pack_into('<I', m, 116, 20000)
+        struct.pack_into('<H', m, 126, 40000)
+        struct.pack_into('<H', m, 128, 42000)
+        struct.pack_into('<i', m, 136, int(rng.integers(1000, 9000)))
+        struct.pack_into('<i', m, 144, int(rng.integers(1000, 9000)))
+        struct.pack_into('<f', m, 148, 1490.0)
+        struct.pack_into('<H', m, 172, int(rng.integers(0, 36000)))
+        struct.pack_into('<I', m, 200, int(rng.integers(0, 86400000)))
+        body = bytes(m) + rng.integers(0, 256, samples * 2, dtype=np.uint8).tobytes()
+
+        subsystem = 20 if k % 3 else 0
+        out += struct.pack(header, 0x1601, 8, 0, 80, 0, subsystem, k % 2, 0, 0, len(body)) + body
+
+        if junk and k % 37 == 5:
+            out += struct.pack(header, 0x1601, 8, 0, 2002, 0, 0, 0, 0, 0, 30) + bytes(30)
+        if junk and k % 113 == 9:
+            out += rng.integers(0, 256, int(rng.integers(1, 200)), dtype=np.uint8).tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+    return path
+
+
+#===========================================================================
+def make_xtf(path: str, pings: int=2000, seed: int=0, bps: int=2, junk: bool=False):
+    '''
+    XTF with two sidescan channels of bps bytes per sample. With junk,
+    packets of another type and garbage bytes are inserted between pings.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    fh = bytearray(1024)
+    struct.pack_into('<H', fh, 164, 3)
+    struct.pack_into('<H', fh, 166, 2)
+    for c in range(2):
+        o = 256 + c * 128
+        fh[o] = c + 1
+        struct.pack_into('<H', fh, o + 6, bps)
+        struct.pack_into('<f', fh, o + 32, 455.0)
+
+    out = bytearray(fh)
+    for k in range(pings):
+        samples = int(rng.integers(100, 400))
+
+        h = bytearray(256)
+        struct.pack_into('<H', h, 0, 0xFACE)
+        struct.pack_into('<H', h, 4, 2)
+        struct.pack_into('<HBBBBBB', h, 14, 2021, 6, 1, 12, (k // 60) % 60, k % 60, k % 100)
+        struct.pack_into('<I', h, 28, k)
+        struct.pack_into('<f', h, 152, 4.0)
+        struct.pack_into('<d', h, 160, 35.0 + k * 1e-5)
+        struct.pack_into('<d', h, 168, -80.0 + k * 1e-5)
+        struct.pack_into('<f', h, 192, float(rng.uniform(1, 10)))
+        struct.pack_into('<f', h, 196, float(rng.uniform(1, 10)))
+        struct.pack_into('<f', h, 212, float(rng.uniform(0, 360)))
+
+        chans = b''
+        data = b''
+        for c in range(2):
+            ch = bytearray(64)
+            struct.pack_into('<H', ch, 0, c)
+            struct.pack_into('<f', ch, 4, 50.0)
+            struct.pack_into('<f', ch, 20, 0.1)
+            struct.pack_into('<H', ch, 26, 455)
+            struct.pack_into('<I', ch, 42, samples)
+            chans += bytes(ch)
+            data += rng.integers(0, 256, samples * bps, dtype=np.uint8).tobytes()
+
+        rec = bytearray(bytes(h) + chans + data)
+        struct.pack_into('<I', rec, 10, len(rec))
+        out += rec
+
+        if junk and k % 41 == 3:
+            other = bytearray(64)
+            struct.pack_into('<H', other, 0, 0xFACE)
+            other[2] = 3
+            struct.pack_into('<I', other, 10, 64)
+            out += other
+        if junk and k % 97 == 11:
+            out += rng.integers(0, 256, int(rng.integers(1, 300)), dtype=np.uint8).tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+    return path
@@ -0,0 +1,204 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Parallel
+
+from pingverter import gar, gar2pingmapper
+from synthetic import _var_struct, _varuint, make_garmin
+
+
+def parse(path, out_dir, **kwargs):
+    return gar2pingmapper(path, str(out_dir), **kwargs).header_dat
+
+
+@pytest.mark.parametrize('n_jobs', [2, 4, 7])
+def test_partitioned_walk_matches_sequential(tmp_path, n_jobs):
+    rsd = make_garmin(str(tmp_path / 'Log.RSD'), pings=800, junk=True)
+
+    expected = parse(rsd, tmp_path / 'seq')
+    with Parallel(n_jobs=n_jobs, backend='threading') as parallel:
+        got = parse(rsd, tmp_path / 'par', n_jobs=n_jobs, parallel=parallel)
+
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_varints_round_trip(tmp_path):
+    sonObj = gar(str(tmp_path / 'Log.RSD'))
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2**32 - 1, 2**63 - 1]
+
+    buf = memoryview(b''.join(_varuint(v) for v in values))
+    pos = 0
+    for v in values:
+        got, pos = sonObj._read_varuint(buf, pos)
+        assert got == v
+    assert pos == len(buf)
+
+    with pytest.raises(EOFError):
+        sonObj._read_varuint(b'\x80\x80', 0)
+
+    # Short and long fields, a truncated structure keeps the fields read
+    fields = [(0, b'\x05'), (3, b'abcdef'), (17, bytes(range(200)))]
+    data = _var_struct(fields)
+    spans, pos = sonObj._read_var_struct_spans(memoryview(data), 0)
+    assert [(n, data[a:b]) for n, a, b in spans] == fields and pos == len(data)
+
+    spans, _ = sonObj._read_var_struct_spans(memoryview(data[:-1]), 0)
+    assert [n for n, a, b in spans] == [0, 3]
+    with pytest.raises(EOFError):
+        sonObj._read_var_struct_spans(memoryview(data[:-1]), 0, strict=True)
+
+
+def test_records_decode_written_values(tmp_path):
+    values = []
+    rsd = make_garmin(str(tmp_path / 'Log.RSD'), values=values)
+
+    expected = pd.DataFrame(values)
+    got = parse(rsd, tmp_path / 'out')[expected.columns]
+
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_resync_over_junk(tmp_path):
+    clean = make_garmin(str(tmp_path / 'Clean.RSD'), pings=800)
+    sonObj = gar2pingmapper(clean, str(tmp_path / 'clean'))
+    assert sonObj.parse_stats['resync_cnt'] == 0
+
+    # Garbage bytes and state 1 records between pings
+    values = []
+    junk = make_garmin(str(tmp_path / 'Junk.RSD'), pings=800, junk=True, values=values)
+    sonObj = gar2pingmapper(junk, str(tmp_path / 'junk'))
+    assert sonObj.parse_stats['resync_cnt'] > 0
+
+    expected = pd.DataFrame(values)
+    got = sonObj.header_dat
+    assert got['index'].is_monotonic_increasing
+    pd.testing.assert_frame_equal(got[expected.columns], expected, check_dtype=False)
+
+
+def track_by_loop(df):
+    # Frame track speed as computed one frame at a time before vectorizing
+    def haversine(lat1, lon1, lat2, lon2):
+        p1 = math.radians(float(lat1))
+        p2 = math.radians(float(lat2))
+        dp = math.radians(float(lat2) - float(lat1))
+        dl = math.radians(float(lon2) - float(lon1))
+        a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+        return 2 * 6371000.0 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    frame_track = (df.groupby('sequence_cnt', sort=True)
+                   .agg(time_s=('time_s', 'mean'), lat=('lat', 'mean'), lon=('lon', 'mean'))
+                   .reset_index())
+
+    distances, speeds, cumulative = [0.0], [np.nan], [0.0]
+    for idx in range(1, len(frame_track)):
+        prev = frame_track.iloc[idx - 1]
+        cur = frame_track.iloc[idx]
+        dist = haversine(prev['lat'], prev['lon'], cur['lat'], cur['lon'])
+        dt = float(cur['time_s'] - prev['time_s'])
+        distances.append(dist)
+        speeds.append(dist / dt if dt > 0 else np.nan)
+        cumulative.append(cumulative[-1] + dist)
+
+    frame_track['dist'] = distances
+    frame_track['speed_ms'] = speeds
+    frame_track['trk_dist'] = cumulative
+    frame_track['speed_ms'] = frame_track['speed_ms'].interpolate().bfill().ffill().round(2)
+
+    df = df.copy()
+    replacements = frame_track.set_index('sequence_cnt')[['dist', 'speed_ms', 'trk_dist']]
+    for column in replacements.columns:
+        df[column] = df['sequence_cnt'].map(replacements[column])
+    return df
+
+
+def test_track_speed_matches_loop(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 1200
+    seq = np.repeat(np.arange(n // 4), 4).astype(float)
+    seq[rng.choice(n, 10, replace=False)] = np.nan
+    time_s = seq / 10 + rng.uniform(0, 0.01, n)
+    # Frames recorded at the same time
+    time_s[seq == 40] = time_s[seq == 39].mean()
+    lat = 35 + np.nan_to_num(seq) * 1e-5 + rng.normal(0, 1e-7, n)
+    lon = -80 + np.nan_to_num(seq) * 2e-5
+    lat[rng.choice(n, 5, replace=False)] = np.nan
+    df = pd.DataFrame({'sequence_cnt': seq, 'time_s': time_s, 'lat': lat, 'lon': lon})
+
+    got = gar(str(tmp_path / 'Log.RSD'))._recomputeTrackSpeedFromWgs(df.copy())
+
+    pd.testing.assert_frame_equal(got, track_by_loop(df), check_exact=True)
+
+
+def test_crc_rejects_corrupt_records(tmp_path):
+    rsd = make_garmin(str(tmp_path / 'Log.RSD'), pings=300)
+
+    pings = parse(rsd, tmp_path / 'clean', verify='full')
+    assert pings['crc_ok'].all()
+
+    # Flip a sample byte in one body and the recording time in another header
+    data = bytearray(open(rsd, 'rb').read())
+    body = pings.iloc[10]
+    data[int(body['index'] + body['son_offset']) + 3] ^= 0xFF
+    head = pings.iloc[200]
+    data[int(head['index'] + head['ping_header_len']) - 6] ^= 0x01
+    corrupt = str(tmp_path / 'Corrupt.RSD')
+    open(corrupt, 'wb').write(bytes(data))
+
+    for verify_jobs in [1, 2]:
+        got = parse(corrupt, tmp_path / 'full{}'.format(verify_jobs), verify='full', verify_jobs=verify_jobs)
+        failed = got.loc[got['crc_ok'] == False, 'index'].tolist()
+        assert failed == [body['index'], head['index']]
+
+    got = parse(corrupt, tmp_path / 'sample', verify='sample')
+    checked = got['crc_ok'].notna().to_numpy()
+    assert checked.sum() == 3 and checked[[0, 100, 200]].all()
+    assert got['crc_ok'].iloc[200] == False
+
+    got = parse(corrupt, tmp_path / 'off')
+    assert 'crc_ok' not in got.columns
+
+
+def test_body_field_projection(tmp_path):
+    rsd = make_garmin(str(tmp_path / 'Log.RSD'))
+
+    full = parse(rsd, tmp_path / 'full')
+    got = parse(rsd, tmp_path / 'pm', fields='pingmapper')
+
+    for col in ['gain', 'sample_status', 'shade_avail', 'interrogation_id']:
+        assert col in full.columns and col not in got.columns
+    pd.testing.assert_frame_equal(got, full[got.columns])
+
+    # Required fields are always decoded
+    got = parse(rsd, tmp_path / 'gain', fields=['gain'])
+    assert 'ping_cnt' in got.columns and 'tempC' not in got.columns
+    pd.testing.assert_frame_equal(got, full[got.columns])
+
+    with pytest.raises(ValueError):
+        gar2pingmapper(rsd, str(tmp_path / 'bad'), fields=['depth'])
+
+
+def test_crc_threads_only_for_several_batches(tmp_path, monkeypatch):
+    rsd = make_garmin(str(tmp_path / 'Log.RSD'), pings=300)
+    sonObj = gar2pingmapper(rsd, str(tmp_path / 'out'), verify='full')
+    buf = np.memmap(rsd, dtype=np.uint8, mode='r')
+    df = sonObj.header_dat
+
+    pools = []
+    def counted(n_jobs, **kwargs):
+        pools.append(n_jobs)
+        return Parallel(n_jobs=n_jobs, **kwargs)
+    monkeypatch.setattr('pingverter.garmin_class.Parallel', counted)
+
+    # One batch is checked without a pool
+    assert sonObj._verifyRecordCRC(buf, df, -1).all()
+    assert pools == []
+
+    # Threads are clamped to the number of batches
+    assert sonObj._verifyRecordCRC(buf, df, 8, batch=100).all()
+    assert pools == [3]
+
+    sonObj.verify = 'sample'
+    assert sonObj._verifyRecordCRC(buf, df, 8, batch=1).sum() == 3
+    assert pools == [3]
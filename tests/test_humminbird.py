@@ -0,0 +1,367 @@
+import datetime
+import glob
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Parallel
+
+from pingverter import export_sonar_data_player_project, hum, hum2pingmapper, low2hum
+from pingverter.converter import _humminbird_sequence_from_time
+from pingverter.humminbird_class import headRegistryFile
+from pingverter.lowrance_class import sl2Struct
+from synthetic import make_humminbird, make_lowrance, read_lowrance_frames
+
+
+def parse(humFile, out_dir, **kwargs):
+    return hum2pingmapper(humFile, str(out_dir), keepPings=True, writeCSV=False, **kwargs).beamPings
+
+
+def copy_recording(humFile, out_dir):
+    os.makedirs(str(out_dir))
+    shutil.copy(humFile, str(out_dir))
+    son_dir = os.path.splitext(humFile)[0]
+    shutil.copytree(son_dir, os.path.join(str(out_dir), os.path.basename(son_dir)))
+    return os.path.join(str(out_dir), os.path.basename(humFile))
+
+
+def test_idx_offsets_match_son_walk(tmp_path, monkeypatch):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+
+    # Pings are located from the IDX files alone
+    with monkeypatch.context() as m:
+        m.setattr('pingverter.humminbird_class.hum._getPingOffsets', None)
+        expected = parse(humFile, tmp_path / 'idx')
+
+    # Without IDX files, pings are found by walking the SON
+    no_idx = copy_recording(humFile, tmp_path / 'no_idx')
+    for idx in glob.glob(os.path.join(os.path.splitext(no_idx)[0], '*.IDX')):
+        os.remove(idx)
+
+    # An IDX that does not match its SON is ignored
+    stale = copy_recording(humFile, tmp_path / 'stale')
+    idx = os.path.join(os.path.splitext(stale)[0], 'B002.IDX')
+    records = np.fromfile(idx, dtype='>u4')
+    records[3] += 1
+    records.tofile(idx)
+
+    for humFile in [no_idx, stale]:
+        got = parse(humFile, tmp_path / 'out')
+        assert set(got) == set(expected)
+        for beam in expected:
+            pd.testing.assert_frame_equal(got[beam], expected[beam])
+
+
+def test_bulk_headers_match_per_ping_reads(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    sonObj = hum2pingmapper(humFile, str(tmp_path / 'out'), writeCSV=False)
+
+    for son in sonObj.chanAvail.values():
+        buf = np.memmap(son, dtype=np.uint8, mode='r')
+        offsets = sonObj._getPingOffsets(buf)
+        got = sonObj._getPingHeaders(buf, offsets)
+
+        rows = []
+        with open(son, 'rb') as file:
+            i = 0
+            while i < len(buf):
+                row, i = sonObj._getPingHeader(file, i)
+                rows.append(row)
+        expected = pd.DataFrame(rows)[got.columns]
+
+        assert len(got) == len(offsets) > 0
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def drop_head_field(sonObj, humFile, spacer):
+    # Rewrite every SON without one spacer and its attribute, a header
+    ## structure none of the known ones match
+    start = sonObj.son_struct.fields['SP{}'.format(spacer)][1]
+    end = sonObj.son_struct.fields['SP{}'.format(spacer+1)][1]
+
+    for son in glob.glob(os.path.join(os.path.splitext(humFile)[0], '*.SON')):
+        buf = np.fromfile(son, dtype=np.uint8)
+        offsets = sonObj._getPingOffsets(buf)
+        keep = np.ones(len(buf), dtype=bool)
+        keep[(offsets[:, None] + np.arange(start, end)).ravel()] = False
+        buf[keep].tofile(son)
+        os.remove(os.path.splitext(son)[0] + '.IDX')
+
+
+def test_new_header_structure_is_learned(tmp_path, monkeypatch):
+    monkeypatch.setenv('PINGVERTER_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr('pingverter.humminbird_class._headRegistries', {})
+
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    sonObj = hum2pingmapper(humFile, str(tmp_path / 'known'), keepPings=True, writeCSV=False)
+    assert sonObj.headBytes == 152
+
+    drop_head_field(sonObj, humFile, 158)
+    got = parse(humFile, tmp_path / 'learn')
+
+    registry = json.load(open(str(tmp_path / 'cache' / headRegistryFile)))
+    assert [e['headBytes'] for e in registry.values()] == [147]
+    for beam, pings in sonObj.beamPings.items():
+        # Each header is 5 bytes shorter
+        assert (got[beam]['index'] == pings['index'] - 5*pings.index).all()
+        assert (got[beam]['son_offset'] == 147).all()
+        moved = ['index', 'son_offset']
+        pd.testing.assert_frame_equal(got[beam].drop(columns=moved), pings.drop(columns=moved))
+
+    # A new process finds the structure in the registry file
+    monkeypatch.setattr('pingverter.humminbird_class._headRegistries', {})
+    monkeypatch.setattr('pingverter.humminbird_class.hum._decodeHeadStruct', None)
+    again = parse(humFile, tmp_path / 'lookup')
+    for beam, pings in got.items():
+        pd.testing.assert_frame_equal(again[beam], pings)
+
+
+def test_low2hum_son_holds_lowrance_returns(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    sl2 = str(tmp_path / 'rec' / 'Log.sl2')
+    frames = read_lowrance_frames(sl2)
+    log = open(sl2, 'rb').read()
+
+    def returns(survey):
+        f = frames[frames['survey_type'] == survey]
+        for offset, size in zip(f['frame_offset'], f['packet_size']):
+            start = offset + sl2Struct.itemsize
+            yield log[start:start + size]
+
+    # Port is the reversed left half of the sidescan, star the right half
+    expected = {
+        'B000': list(returns(0)),
+        'B001': list(returns(1)),
+        'B002': [r[:len(r)//2][::-1] for r in returns(5)],
+        'B003': [r[len(r)//2:2*(len(r)//2)] for r in returns(5)],
+        'B004': list(returns(2)),
+    }
+
+    pings = parse(humFile, tmp_path / 'out')
+    assert sorted(pings) == sorted(expected)
+    for beam, df in pings.items():
+        son = open(os.path.join(os.path.splitext(humFile)[0], beam + '.SON'), 'rb').read()
+        got = [son[i + o:i + o + n] for i, o, n in zip(df['index'], df['son_offset'], df['ping_cnt'])]
+        assert got == expected[beam]
+
+
+def test_low2hum_workers_write_same_files(tmp_path, monkeypatch, capsys):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'), pings=1000, seed=8)
+
+    # low2hum saves its ping table to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    written = []
+    for workers in [1, 3]:
+        out = tmp_path / 'w{}'.format(workers)
+        out.mkdir()
+        low2hum(sl2, str(out / 'R00001.DAT'), workers=workers)
+
+        # Every beam is reported once
+        reported = [line.split(':')[0] for line in capsys.readouterr().out.splitlines() if 'pings,' in line]
+        assert sorted(reported) == ['B000', 'B001', 'B002', 'B003', 'B004']
+        written.append({os.path.relpath(f, str(out)): open(f, 'rb').read()
+                        for f in glob.glob(str(out / '**' / '*.*'), recursive=True)})
+
+    assert len(written[0]) == 11
+    assert written[0] == written[1]
+
+
+def test_head_check_resyncs_over_junk(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    expected = parse(humFile, tmp_path / 'out')['B002']
+
+    # Junk between pings 40 and 41 and after ping 80 of the port SON
+    junk = copy_recording(humFile, tmp_path / 'junk')
+    son = os.path.join(os.path.splitext(junk)[0], 'B002.SON')
+    data = open(son, 'rb').read()
+    cut = expected['index'].iloc[[41, 81]].tolist()
+    gaps = [b'\x07' * 61, np.random.default_rng(0).integers(0, 256, 500, dtype=np.uint8).tobytes()]
+    open(son, 'wb').write(data[:cut[0]] + gaps[0] + data[cut[0]:cut[1]] + gaps[1] + data[cut[1]:])
+
+    got = parse(junk, tmp_path / 'out', headCheck='report')['B002']
+    pd.testing.assert_frame_equal(got, expected.iloc[:41])
+
+    got = parse(junk, tmp_path / 'out', headCheck='resync')['B002']
+    shift = np.select([expected.index >= 81, expected.index >= 41], [561, 61], 0)
+    assert (got['index'] == expected['index'] + shift).all()
+    pd.testing.assert_frame_equal(got.drop(columns='index'), expected.drop(columns='index'))
+
+
+def test_beam_backends_match(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    expected = parse(humFile, tmp_path / 'out', n_jobs=1)
+
+    runs = [parse(humFile, tmp_path / 'out', n_jobs=2, backend='threading'),
+            parse(humFile, tmp_path / 'out', n_jobs=2, backend='loky')]
+    with Parallel(n_jobs=2, backend='threading') as parallel:
+        # One pool shared by two recordings
+        runs += [parse(humFile, tmp_path / 'out', parallel=parallel) for _ in range(2)]
+
+    for got in runs:
+        assert list(got) == list(expected)
+        for beam in expected:
+            pd.testing.assert_frame_equal(got[beam], expected[beam])
+
+
+def test_projection_set_after_workers(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+    sonObj = hum2pingmapper(humFile, str(tmp_path / 'out'), n_jobs=2, backend='loky', keepPings=True)
+
+    pings = sonObj.beamPings['B002']
+    e, n = sonObj.trans(pings['lon'].to_numpy(), pings['lat'].to_numpy())
+    np.testing.assert_allclose(e, pings['e'])
+    np.testing.assert_allclose(n, pings['n'])
+
+
+@pytest.fixture
+def eastern_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_local_time_matches_fromtimestamp(eastern_time):
+    # Around the 2024 spring DST change, with fractions and invalid times
+    rng = np.random.default_rng(0)
+    caltime = 1710052200 + np.sort(rng.uniform(0, 4 * 3600, 500))
+    caltime = np.concatenate([caltime, np.round(caltime[:50]), [1710054000.9999996, np.nan, 1e13]])
+
+    local, valid = hum('R00001.DAT')._getLocalTime(caltime)
+
+    assert valid.tolist() == [True] * (len(caltime) - 2) + [False, False]
+    assert np.isnat(local[~valid]).all()
+    expected = [datetime.datetime.fromtimestamp(t) for t in caltime[valid]]
+    assert local[valid].astype(datetime.datetime).tolist() == expected
+
+
+def test_export_in_memory_matches_csv_hand_off(tmp_path, monkeypatch):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+
+    export_sonar_data_player_project(humFile, str(tmp_path / 'memory'), include_pngs=False)
+    assert not glob.glob(str(tmp_path / 'memory' / '**' / 'B*.csv'), recursive=True)
+
+    # Ping tables read back from the beam csv's
+    def through_csv(*args, **kwargs):
+        kwargs.update(keepPings=False, writeCSV=True)
+        return hum2pingmapper(*args, **kwargs)
+    monkeypatch.setattr('pingverter.converter.hum2pingmapper', through_csv)
+    export_sonar_data_player_project(humFile, str(tmp_path / 'csv'), include_pngs=False)
+    assert glob.glob(str(tmp_path / 'csv' / '**' / 'B*.csv'), recursive=True)
+
+    def read(project):
+        frames = [json.loads(line) for line in open(str(tmp_path / project / 'frames.jsonl'))]
+        samples = open(str(tmp_path / project / 'samples.u16le'), 'rb').read()
+        return frames, samples
+
+    frames, samples = read('memory')
+    expected_frames, expected_samples = read('csv')
+
+    assert samples == expected_samples
+    assert len(frames) == len(expected_frames) > 0
+    for frame, expected in zip(frames, expected_frames):
+        assert [(c['channelId'], c['sampleOffset'], c['sampleCount']) for c in frame['channels']] == \
+               [(c['channelId'], c['sampleOffset'], c['sampleCount']) for c in expected['channels']]
+        # Floats differ from their csv round trip in the last digit at most
+        assert frame['timeSeconds'] == pytest.approx(expected['timeSeconds'])
+        assert frame['lat'] == pytest.approx(expected['lat'])
+
+
+def test_unwritable_cache_dir_uses_known_headers(tmp_path, monkeypatch):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+
+    # A cache directory below a regular file can't be created
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    monkeypatch.setenv('PINGVERTER_CACHE_DIR', str(blocker / 'cache'))
+    monkeypatch.setattr('pingverter.humminbird_class._headRegistries', {})
+
+    sonObj = hum2pingmapper(humFile, str(tmp_path / 'out'))
+
+    assert len(sonObj.beamMeta) > 0
+    for meta in sonObj.beamMeta.values():
+        assert os.path.isfile(meta['metaCSV'])
+    assert not (blocker / 'cache').exists()
+
+
+def test_no_csv_leaves_meta_csv_unset(tmp_path):
+    humFile = make_humminbird(str(tmp_path / 'rec'))
+
+    full = hum2pingmapper(humFile, str(tmp_path / 'full'), keepPings=True)
+    sonObj = hum2pingmapper(humFile, str(tmp_path / 'out'), writeCSV=False, keepPings=True)
+
+    assert set(sonObj.beamMeta) == set(full.beamMeta)
+    for beam, meta in sonObj.beamMeta.items():
+        assert meta['metaCSV'] is None
+        assert os.path.isfile(full.beamMeta[beam]['metaCSV'])
+        pd.testing.assert_frame_equal(sonObj.beamPings[beam], full.beamPings[beam])
+
+    assert os.listdir(tmp_path / 'out' / 'meta') == ['DAT_meta.csv']
+
+
+def sequence_by_loop(df):
+    # Frame clustering as walked one ping at a time before vectorizing
+    times = pd.to_numeric(df.get('time_s'), errors='coerce')
+
+    period_candidates = []
+    if 'channel_id' in df.columns:
+        for _, g in df.groupby('channel_id'):
+            t = pd.to_numeric(g.get('time_s'), errors='coerce').dropna().sort_values()
+            if len(t) < 2:
+                continue
+            dt = np.diff(t.to_numpy())
+            dt = dt[dt > 0]
+            if len(dt) > 0:
+                period_candidates.append(float(np.median(dt)))
+
+    if period_candidates:
+        period = float(np.median(period_candidates))
+    else:
+        dt_all = np.diff(np.sort(times.dropna().to_numpy()))
+        period = float(np.percentile(dt_all[dt_all > 0], 75))
+    threshold = max(0.003, period * 0.2)
+
+    work = pd.DataFrame(index=df.index)
+    work['_time'] = times
+    work['_rn'] = pd.to_numeric(df['record_num'], errors='coerce') if 'record_num' in df.columns else np.arange(len(df))
+    order = work.sort_values(['_time', '_rn'], na_position='last', kind='mergesort').index
+
+    seq = pd.Series(index=df.index, dtype='float64')
+    current_seq = -1
+    prev_time = None
+    for idx in order:
+        t = times.loc[idx]
+        if not np.isfinite(t):
+            continue
+        if prev_time is None or (t - prev_time) > threshold:
+            current_seq += 1
+        seq.loc[idx] = current_seq
+        prev_time = t
+
+    fill_value = int(seq.dropna().max()) + 1 if seq.notna().any() else 0
+    return seq.fillna(fill_value).astype('int64')
+
+
+def test_sequence_matches_loop():
+    rng = np.random.default_rng(0)
+
+    # Four channels pinging together with jitter, a gap and missing times
+    n = 2000
+    time_s = np.repeat(np.cumsum(rng.uniform(0.08, 0.12, n // 4)), 4) + rng.uniform(-0.002, 0.002, n)
+    time_s[700:] += 5
+    time_s[rng.choice(n, 20, replace=False)] = np.nan
+    df = pd.DataFrame({'time_s': time_s, 'channel_id': np.tile([0, 1, 2, 3], n // 4),
+                       'record_num': rng.permutation(n)}, index=rng.permutation(n) + 100)
+    df = df.sample(frac=1, random_state=0)
+
+    pd.testing.assert_series_equal(_humminbird_sequence_from_time(df), sequence_by_loop(df))
+
+    # Period from all times when there are no channels
+    no_channel = df.drop(columns=['channel_id', 'record_num'])
+    pd.testing.assert_series_equal(_humminbird_sequence_from_time(no_channel), sequence_by_loop(no_channel))
@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+from joblib import Parallel
+
+from pingverter import jsf2pingmapper
+from synthetic import make_jsf
+
+
+@pytest.mark.parametrize('n_jobs', [2, 5])
+def test_partitioned_walk_matches_sequential(tmp_path, n_jobs):
+    jsf = make_jsf(str(tmp_path / 'Line001.jsf'), junk=True)
+
+    expected = jsf2pingmapper(jsf, str(tmp_path / 'seq')).header_dat
+    with Parallel(n_jobs=n_jobs, backend='threading') as parallel:
+        got = jsf2pingmapper(jsf, str(tmp_path / 'par'), n_jobs=n_jobs, parallel=parallel).header_dat
+
+    assert len(expected) == 2000
+    pd.testing.assert_frame_equal(got, expected)
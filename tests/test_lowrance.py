@@ -0,0 +1,242 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pingverter import low, low2pingmapper, lowSession2pingmapper
+from synthetic import make_lowrance, read_lowrance_frames
+
+
+def read_headers(path, **kwargs):
+    sonObj = low(path, **kwargs)
+    sonObj._getFileLen()
+    return sonObj._readPingHeaders()
+
+
+@pytest.mark.parametrize('ext', ['sl2', 'sl3'])
+def test_frame_index_matches_sequential_walk(tmp_path, ext):
+    path = make_lowrance(str(tmp_path / 'Log.{}'.format(ext)), pings=300)
+
+    # A frame still being written is not decoded
+    with open(path, 'ab') as f:
+        f.write(b'\x01' * 40)
+
+    expected = read_lowrance_frames(path)
+    got = read_headers(path)
+
+    assert len(got) == 300
+    pd.testing.assert_frame_equal(got[expected.columns], expected, check_dtype=False)
+
+
+def test_beam_chains_match_survey_filter(tmp_path):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'), pings=400, seed=4)
+    expected = read_lowrance_frames(sl2)
+    sidescan = expected.loc[expected['survey_type'] == 5, 'frame_offset'].tolist()
+
+    assert read_headers(sl2, beams=[2, 3])['frame_offset'].tolist() == sidescan
+
+    # A broken back-pointer falls back to the full walk
+    sonObj = low(sl2, beams=[2, 3])
+    data = bytearray(open(sl2, 'rb').read())
+    pos = sidescan[50] + sonObj.son_struct.fields['prev_sidescan_offset'][1]
+    data[pos:pos+4] = (sidescan[50] + 1).to_bytes(4, 'little')
+    broken = str(tmp_path / 'Broken.sl2')
+    open(broken, 'wb').write(bytes(data))
+
+    assert read_headers(broken, beams=[2, 3])['frame_offset'].tolist() == sidescan
+
+
+def test_beam_selection_matches_full_parse(tmp_path):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'), pings=400, seed=4)
+    low2pingmapper(sl2, str(tmp_path / 'full'))
+    low2pingmapper(sl2, str(tmp_path / 'ss'), beams=[2, 3])
+
+    for csv in ['B002_ss_port_meta.csv', 'B003_ss_star_meta.csv']:
+        expected = pd.read_csv(str(tmp_path / 'full' / 'meta' / csv))
+        got = pd.read_csv(str(tmp_path / 'ss' / 'meta' / csv))
+
+        # record_num and trk_dist count the selected frames only
+        counted = ['record_num', 'trk_dist']
+        assert got['record_num'].max() < len(got) * 2
+        assert got['trk_dist'].is_monotonic_increasing
+        pd.testing.assert_frame_equal(got.drop(columns=counted), expected.drop(columns=counted))
+
+    assert not os.path.exists(str(tmp_path / 'ss' / 'meta' / 'B004_ds_vhighfreq_meta.csv'))
+
+
+def test_resume_matches_full_parse(tmp_path):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'), pings=1500, seed=5)
+    full = low2pingmapper(sl2, str(tmp_path / 'full'), nchunk=50)
+
+    # The unit is still writing, the last frame is cut
+    data = open(sl2, 'rb').read()
+    growing = str(tmp_path / 'Growing.sl2')
+    parsed = 0
+    for end in [len(data) // 3 + 7, 2 * len(data) // 3, len(data)]:
+        open(growing, 'wb').write(data[:end])
+        sonObj = low2pingmapper(growing, str(tmp_path / 'resume'), nchunk=50, resume=True)
+        parsed += len(sonObj.header_dat)
+
+    # Each call only decoded the frames added since the last one
+    assert parsed == len(full.header_dat)
+
+    csvs = [f for f in os.listdir(str(tmp_path / 'full' / 'meta')) if f.startswith('B')]
+    assert csvs
+    for csv in csvs:
+        expected = pd.read_csv(str(tmp_path / 'full' / 'meta' / csv))
+        got = pd.read_csv(str(tmp_path / 'resume' / 'meta' / csv))
+        pd.testing.assert_frame_equal(got, expected)
+
+
+def test_session_orders_logs_by_absolute_time(tmp_path):
+    # time_s restarts at zero in both logs, the second log starts 100 s later
+    log_1 = make_lowrance(str(tmp_path / 'Log_1.sl2'), seed=1, hardware_time=1700000000)
+    log_2 = make_lowrance(str(tmp_path / 'Log_2.sl2'), seed=2, hardware_time=1700000100)
+
+    sonObj = lowSession2pingmapper([log_1, log_2], str(tmp_path / 'out'), n_jobs=1)
+    df = sonObj.header_dat
+
+    assert sonObj.hardware_time_starts == [1700000000, 1700000100]
+
+    for beam, group in df.groupby('beam'):
+        # Every frame of the first log comes before the second log
+        assert group['file_num'].is_monotonic_increasing
+        assert group['time_s'].is_monotonic_increasing
+        assert group['trk_dist'].is_monotonic_increasing
+
+    # Each log's frames are timed from its own origin
+    raw = low(log_2)
+    raw._getFileLen()
+    raw = raw._readPingHeaders().set_index('frame_offset')
+
+    second_log = df[df['file_num'] == 1]
+    log_time = raw.loc[second_log['index'], 'time_s'].to_numpy() / 1000
+    assert np.allclose(second_log['time_s'], 100 + log_time)
+
+    expected = datetime.fromtimestamp(1700000100 + log_time[0], tz=timezone.utc).replace(tzinfo=None)
+    caltime = datetime.combine(second_log['date'].iloc[0], second_log['time'].iloc[0])
+    assert abs((caltime - expected).total_seconds()) < 1e-3
+
+    # Every source log is recorded in the beam metadata
+    for meta in sonObj.beamMeta.values():
+        assert meta['sonFiles'] == [log_1, log_2]
+        assert meta['hardware_time_starts'] == [1700000000, 1700000100]
+        assert os.path.isfile(meta['metaCSV'])
+
+
+def parsed_log(path):
+    sonObj = low(path)
+    sonObj.metaDir = os.path.dirname(path)
+    sonObj._ensure_lowrance_metadata()
+    return sonObj
+
+
+def test_frames_match_per_frame_assembly(tmp_path):
+    sonObj = parsed_log(make_lowrance(str(tmp_path / 'Log.sl3'), pings=600, seed=6))
+    df = sonObj.header_dat
+
+    samples_path = str(tmp_path / 'samples.u16le')
+    frames_path = str(tmp_path / 'frames.jsonl')
+    # Small blocks so samples are gathered over several blocks
+    count = sonObj.write_sonar_data_player_frames(samples_path, frames_path, block_samples=1000)
+
+    samples = np.fromfile(samples_path, dtype='<u2')
+    frames = [json.loads(line) for line in open(frames_path)]
+    assert count == len(frames) > 0
+
+    groups = {int(b): g.sort_values('time_s').reset_index(drop=True) for b, g in df.groupby('beam', sort=True)}
+    for f, frame in enumerate(frames):
+        rows = [(b, g.iloc[f]) for b, g in groups.items() if f < len(g)]
+        assert [c['channelId'] for c in frame['channels']] == [b for b, _ in rows]
+        assert frame['timeSeconds'] == pytest.approx(np.mean([row['time_s'] for _, row in rows]))
+
+        for (b, row), channel in zip(rows, frame['channels']):
+            expected = sonObj.extract_raw_sample_arrays(row.to_frame().T, expand_to_uint16=True)[b][0]
+            start = channel['sampleOffset'] // 2
+            np.testing.assert_array_equal(samples[start:start + channel['sampleCount']], expected)
+
+
+def test_sample_csr_matches_arrays(tmp_path):
+    single = parsed_log(make_lowrance(str(tmp_path / 'Log.sl2'), pings=300, seed=7))
+
+    log_1 = make_lowrance(str(tmp_path / 'Log_1.sl2'), seed=1, hardware_time=1700000000)
+    log_2 = make_lowrance(str(tmp_path / 'Log_2.sl2'), seed=2, hardware_time=1700000100)
+    session = lowSession2pingmapper([log_1, log_2], str(tmp_path / 'out'), n_jobs=1)
+
+    for sonObj in [single, session]:
+        df = sonObj.header_dat.copy()
+        # A payload running past its frame is skipped by both
+        df.loc[df.index[3], 'ping_cnt'] = df['frame_size'].iloc[3]
+
+        for expand in [False, True]:
+            expected = sonObj.extract_raw_sample_arrays(df, expand_to_uint16=expand)
+            got = sonObj.extract_raw_sample_csr(df, expand_to_uint16=expand)
+
+            assert sorted(got) == sorted(expected)
+            for beam, pings in expected.items():
+                assert len(got[beam]) == len(pings)
+                np.testing.assert_array_equal(got[beam].lengths(), [len(p) for p in pings])
+                for a, b in zip(got[beam], pings):
+                    assert a.dtype == b.dtype
+                    np.testing.assert_array_equal(a, b)
+
+
+def test_gather_samples_copies_runs(tmp_path):
+    sonObj = low(str(tmp_path / 'Log.sl2'))
+    sources = [np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8)[::-1].copy()]
+
+    # Back to back pings, a gap, a switch of log and an empty ping
+    starts = np.array([10, 13, 20, 20, 5, 9, 9])
+    counts = np.array([3, 4, 5, 2, 4, 0, 6])
+    files = np.array([0, 0, 0, 1, 1, 1, 1])
+
+    expected = np.concatenate([sources[f][s:s+n] for s, n, f in zip(starts, counts, files)])
+    np.testing.assert_array_equal(sonObj._gatherSamples(sources, starts, counts, files), expected)
+    assert len(sonObj._gatherSamples(sources, starts[:0], counts[:0], files[:0])) == 0
+
+
+def test_read_window_matches_full_parse(tmp_path):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'), pings=2000, seed=3)
+    metaDir = str(tmp_path / 'out' / 'meta')
+
+    # The full parse saves the sparse index
+    os.makedirs(metaDir)
+    full = low(sl2)
+    full.metaDir = metaDir
+    full.tempC = 1.0
+    full.index_every = 37
+    full._getFileLen()
+    full._parseFileHeader()
+    full._parsePingHeader()
+    expected = full.header_dat
+
+    window = low(sl2)
+    window.metaDir = metaDir
+    window.tempC = 1.0
+
+    t0, t1 = expected['time_s'].quantile([0.3, 0.6])
+    got = window.read_window(t0, t1)
+    rows = expected[(expected['time_s'] >= t0) & (expected['time_s'] <= t1)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, rows)
+
+    got = window.read_window(id_range=(100, 150))
+    rows = expected[(expected['id'] >= 100) & (expected['id'] <= 150)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, rows)
+
+
+def test_read_window_requires_index(tmp_path):
+    sl2 = make_lowrance(str(tmp_path / 'Log.sl2'))
+
+    sonObj = low(sl2)
+    with pytest.raises(ValueError, match='metaDir'):
+        sonObj.read_window(0, 1)
+
+    sonObj.metaDir = str(tmp_path)
+    with pytest.raises(FileNotFoundError, match='low2pingmapper'):
+        sonObj.read_window(0, 1)
+
+    # Nothing was parsed or written
+    assert os.listdir(tmp_path) == ['Log.sl2']
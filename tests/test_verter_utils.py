@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+from pingverter.verter_utils import takeSidescanSplit, writePalettePNG
+
+
+def test_palette_png_round_trip(tmp_path):
+    rows = np.random.default_rng(0).integers(0, 256, (50, 30), dtype=np.uint8)
+    palette = [v for i in range(256) for v in (i, i, i)]
+
+    path = writePalettePNG(str(tmp_path / 'a.png'), 30, 50, palette, [rows[:20], rows[20:]])
+
+    with Image.open(path) as img:
+        assert img.mode == 'P'
+        np.testing.assert_array_equal(np.asarray(img), rows)
+
+
+def test_palette_png_short_strips_raise(tmp_path):
+    rows = np.zeros((10, 30), dtype=np.uint8)
+
+    with pytest.raises(ValueError, match='Wrote 10 of 50 PNG rows'):
+        writePalettePNG(str(tmp_path / 'a.png'), 30, 50, [0, 0, 0], [rows])
+
+
+def split_by_copy(dfAll):
+    # Port/star split as copied, concatenated and re-sorted before takeSidescanSplit
+    df = dfAll[dfAll['beam'] == 5]
+    port = df.copy()
+    star = df.copy()
+    port['beam'] = 2
+    star['beam'] = 3
+    port['ping_cnt'] = (port['ping_cnt'] / 2).astype(int)
+    star['ping_cnt'] = (star['ping_cnt'] / 2).astype(int)
+    star['son_offset'] += star['ping_cnt']
+    dfAll = pd.concat([dfAll[dfAll['beam'] != 5], port, star], ignore_index=True)
+    return dfAll.sort_values(by=['time_s', 'beam'])
+
+
+def test_sidescan_split_matches_copy():
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({
+        'beam': rng.choice([0, 1, 4, 5], n),
+        # Repeated times so (time_s, beam) ties are broken the same way
+        'time_s': np.sort(rng.integers(0, 200, n)) / 10,
+        'ping_cnt': rng.integers(100, 3000, n),
+        'son_offset': np.full(n, 144),
+        'index': np.arange(n) * 4000,
+    })
+
+    got, split = takeSidescanSplit(df)
+    expected = split_by_copy(df)
+
+    pd.testing.assert_frame_equal(got, expected)
+    assert (split == got['beam'].isin([2, 3]).to_numpy()).all()
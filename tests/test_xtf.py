@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+from joblib import Parallel
+
+from pingverter import xtf2pingmapper
+from synthetic import make_xtf
+
+
+@pytest.mark.parametrize('bps', [1, 2])
+@pytest.mark.parametrize('n_jobs', [2, 5])
+def test_partitioned_walk_matches_sequential(tmp_path, n_jobs, bps):
+    xtf = make_xtf(str(tmp_path / 'Line001.xtf'), bps=bps, junk=True)
+
+    expected = xtf2pingmapper(xtf, str(tmp_path / 'seq')).header_dat
+    with Parallel(n_jobs=n_jobs, backend='threading') as parallel:
+        got = xtf2pingmapper(xtf, str(tmp_path / 'par'), n_jobs=n_jobs, parallel=parallel).header_dat
+
+    # One row per channel of each ping
+    assert len(expected) == 4000
+    pd.testing.assert_frame_equal(got, expected)